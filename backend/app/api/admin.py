@@ -1,6 +1,7 @@
 import csv
 import io
 import json
+import os
 from datetime import datetime
 from typing import Any
 from urllib.parse import quote
@@ -28,6 +29,9 @@ from app.schemas.common import (
     UserUpdate,
 )
 from app.services.audit_service import write_audit
+from app.services.parser_service import invalidate_rule_set
+from core import geoip
+from core.regex import engine_cache_info
 
 router = APIRouter(tags=["admin"])
 DEVICE_ROLES = {"monitor", "block"}
@@ -217,6 +221,7 @@ def delete_device(device_id: int, db: Session = Depends(get_db), user: User = De
     write_audit(db, user, "device.delete", "device", row.id, {"name": row.name, "unlinked_alerts": len(affected_alerts)})
     db.delete(row)
     db.commit()
+    invalidate_rule_set(user.workspace_id)
     return {"ok": True}
 
 
@@ -314,6 +319,7 @@ async def import_device_package(device_id: int, file: UploadFile = File(...), db
         },
     )
     db.commit()
+    invalidate_rule_set(user.workspace_id)
     return {"ok": True, "device_id": device.id, "rules": rule_result, "templates": template_result}
 
 
@@ -395,6 +401,52 @@ def batch_delete_audit_logs(payload: IdsRequest, db: Session = Depends(get_db),
     return {"ok": True, "deleted": deleted}
 
 
+def _geoip_status() -> dict[str, Any]:
+    db = geoip.get_database()
+    if db is None:
+        return {"loaded": False, "path": str(geoip.DEFAULT_PATH)}
+    return {"loaded": True, **db.meta()}
+
+
+@router.get("/geoip")
+def geoip_status(user: User = Depends(require_admin)):
+    return _geoip_status()
+
+
+@router.post("/geoip/import")
+def import_geoip(file: UploadFile = File(...), db: Session = Depends(get_db), user: User = Depends(require_admin)):
+    """
+    导入离线 GeoIP 库：CSV（network 或 start_ip/end_ip 列，以及 country/province/city/carrier/asn）
+    会编译为二进制库；也可直接上传已编译的 .bin 文件。API 与 Worker 进程会在数秒内切换到新库。
+    """
+    head = file.file.read(len(geoip.MAGIC))
+    file.file.seek(0)
+    try:
+        if head == geoip.MAGIC:
+            result = geoip.install_binary(file.file)
+        else:
+            result = geoip.import_file(io.TextIOWrapper(file.file, encoding="utf-8-sig", newline=""))
+    except UnicodeDecodeError as exc:
+        raise HTTPException(status_code=400, detail="GeoIP CSV 必须为 UTF-8 编码") from exc
+    except (ValueError, csv.Error) as exc:
+        raise HTTPException(status_code=400, detail=f"GeoIP 库导入失败: {exc}") from exc
+    write_audit(db, user, "geoip.import", "geoip", "offline", {"filename": file.filename or "", **result})
+    db.commit()
+    return {"ok": True, **result}
+
+
+@router.post("/geoip/reload")
+def reload_geoip(user: User = Depends(require_admin)):
+    geoip.reload()
+    return _geoip_status()
+
+
+@router.get("/regex-cache")
+def regex_cache_status(user: User = Depends(require_admin)):
+    """解析引擎/正则缓存的命中、未命中与累计编译耗时；计数按进程统计，这里是处理本次请求的 API 进程。"""
+    return {"pid": os.getpid(), **engine_cache_info()}
+
+
 def _user_map(db: Session, ids: list[int]) -> dict[int, User]:
     if not ids:
         return {}
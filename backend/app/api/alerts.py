@@ -1,32 +1,39 @@
-from datetime import datetime, timedelta
-import threading
-import time
+import base64
+from datetime import datetime
+import json
 from typing import Any
 from functools import lru_cache
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Response
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Response, UploadFile
+from sqlalchemy.orm import Session, load_only
 
 from app.api.deps import current_user, require_admin, require_not_viewer
 from app.core.timezone import now as app_now
 from app.models.database import get_db
-from app.models.entities import AiRun, Alert, AuditLog, Device, ParseRule, Setting, User, TaskRecord
+from app.models.entities import Alert, AuditLog, Device, Setting, User
 from app.schemas.common import (
     AlertAssignRequest,
     AlertBatchTransitionRequest,
     AlertClaimRequest,
     AlertCreate,
+    AlertListItem,
     AlertOut,
+    AlertTiBatchRequest,
     AlertTransitionRequest,
     AlertUpdate,
     AuditLogOut,
+    ParseBatchItem,
+    ParseBatchRequest,
+    ParseBatchResponse,
     ParseRequest,
     ParseResponse,
 )
-from app.services.ai_service import investigate_threat, render_v220_alert_analysis
+from app.services.alert_task_service import TASK_AI_ANALYSIS, TASK_TI_QUERY, TASK_TI_QUERY_BATCH, TASK_WEBHOOK_SEND
 from app.services.alert_service import create_alert, find_duplicate_alert, normalize_alert_fields
 from app.services.audit_service import write_audit
-from app.services.task_service import create_task, fail_task, finish_task
+from app.services.cache_service import ALERT_LIST_NAMESPACE, cache_get, cache_key, cache_set
+from app.services.search_service import search_alerts
+from app.services.task_service import dispatch_task, enqueue_task, find_active_task
 from app.services.workflow_constants import STATUS_ANALYSIS, STATUS_LABELS
 from app.services.workflow_service import (
     assign_alert,
@@ -35,25 +42,29 @@ from app.services.workflow_service import (
     release_claim,
     transition_alert,
 )
-from output.formatter import render_chat
-from integration.webhook import send_record
-from app.services.parser_service import parse_text_for_user
+from app.services.parser_service import parse_text_for_user, parse_texts_for_user
 from app.models.bootstrap import get_effective_setting
 from app.core.utils import parse_day
 
 router = APIRouter(prefix="/alerts", tags=["alerts"])
 parse_router = APIRouter(prefix="/logs", tags=["logs"])
 
-# 简单的内存缓存，用于缓存告警列表查询结果（多 worker 不共享，仅防止单进程内重复查询）
-_alert_list_cache: dict[str, tuple[float, Any]] = {}
-_alert_cache_lock = threading.Lock()
-_ALERT_CACHE_TTL = 2  # 缓存 2 秒
+# 告警列表缓存时长（秒）；Redis 后端下告警写入提交后按工作区代数立即失效，TTL 只兜底其他来源的变化。
+# 进程内后端无法感知其他进程的写入，实际有效期被截断为 cache_service.MEMORY_CACHE_MAX_TTL
+ALERT_LIST_CACHE_TTL = 30
+# 列表视图只加载的列，其余大字段（原文、解析字段、情报、研判结果等）留给详情接口
+_LIST_COLUMNS = list(AlertListItem.model_fields)
 
+# 批量解析单次请求的最大条数
+PARSE_BATCH_LIMIT = 1000
+# 批量威胁情报查询单次请求的最大告警数
+TI_BATCH_LIMIT = 1000
 
-def _alert_to_dict(alert: Alert, code: str = "") -> dict[str, Any]:
+
+def _alert_to_dict(alert: Alert) -> dict[str, Any]:
     return {
         "id": alert.id,
-        "alert_code": code,
+        "alert_code": alert.alert_code,
         "alert_hash": alert.alert_hash,
         "project_id": alert.project_id,
         "device_id": alert.device_id,
@@ -96,37 +107,8 @@ def _alert_to_dict(alert: Alert, code: str = "") -> dict[str, Any]:
     }
 
 
-def _alert_code_map(db: Session, user: User, alerts: list[Alert]) -> dict[int, str]:
-    if not alerts:
-        return {}
-    days = {alert.created_at.date() for alert in alerts if alert.created_at}
-    if not days:
-        return {}
-    # 单次查询覆盖所有需要的日期范围
-    min_day = min(days)
-    max_day = max(days)
-    start = datetime.combine(min_day, datetime.min.time())
-    end = datetime.combine(max_day + timedelta(days=1), datetime.min.time())
-    rows = (
-        db.query(Alert.id, Alert.created_at)
-        .filter(Alert.workspace_id == user.workspace_id, Alert.created_at >= start, Alert.created_at < end)
-        .order_by(Alert.created_at.asc(), Alert.id.asc())
-        .all()
-    )
-    codes: dict[int, str] = {}
-    # 按日分组生成编码
-    day_counters: dict[str, int] = {}
-    for row in rows:
-        day = row.created_at.date()
-        prefix = day.strftime("%Y%m%d")
-        day_counters[prefix] = day_counters.get(prefix, 0) + 1
-        codes[row.id] = f"{prefix}{day_counters[prefix]:04d}"
-    return codes
-
-
 def _enrich_alert(db: Session, user: User, alert: Alert) -> dict[str, Any]:
-    codes = _alert_code_map(db, user, [alert])
-    return _alert_to_dict(alert, codes.get(alert.id, ""))
+    return _alert_to_dict(alert)
 
 
 def _get_rendering_data(db: Session, user: User, alert: Alert) -> dict[str, Any]:
@@ -134,8 +116,7 @@ def _get_rendering_data(db: Session, user: User, alert: Alert) -> dict[str, Any]
     data = (alert.parsed_fields or {}).copy()
     
     # 注入告警编码
-    codes = _alert_code_map(db, user, [alert])
-    data["alert_code"] = codes.get(alert.id, "")
+    data["alert_code"] = alert.alert_code
     
     # 注入 TI 虚拟字段
     ti = alert.ti_result or {}
@@ -169,6 +150,76 @@ def parse_log(payload: ParseRequest, db: Session = Depends(get_db), user: User =
     return ParseResponse(**result)
 
 
+def _parse_batch(
+    db: Session,
+    user: User,
+    entries: list[tuple[str, str]],
+    device_id: int | None,
+    message_template_id: int | None,
+    excel_template_id: int | None,
+) -> ParseBatchResponse:
+    """entries 为 (日志文本, 预检错误)；有错误或文本为空的条目不参与解析。"""
+    if not entries:
+        raise HTTPException(status_code=400, detail="请至少提供一条日志")
+    if len(entries) > PARSE_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"单次最多解析 {PARSE_BATCH_LIMIT} 条日志")
+    items: list[ParseBatchItem | None] = [None] * len(entries)
+    valid: list[tuple[int, str]] = []
+    for index, (text, error) in enumerate(entries):
+        if error or not text.strip():
+            items[index] = ParseBatchItem(index=index, ok=False, error=error or "日志文本不能为空")
+        else:
+            valid.append((index, text))
+    results = parse_texts_for_user(db, user, [text for _, text in valid], device_id, message_template_id, excel_template_id)
+    for (index, _text), result in zip(valid, results):
+        items[index] = ParseBatchItem(index=index, result=ParseResponse(**result))
+    return ParseBatchResponse(total=len(entries), succeeded=len(valid), failed=len(entries) - len(valid), items=items)
+
+
+@parse_router.post("/parse/batch", response_model=ParseBatchResponse)
+def parse_log_batch(payload: ParseBatchRequest, db: Session = Depends(get_db), user: User = Depends(current_user)):
+    return _parse_batch(
+        db,
+        user,
+        [(text, "") for text in payload.texts],
+        payload.device_id,
+        payload.message_template_id or payload.template_id,
+        payload.excel_template_id,
+    )
+
+
+@parse_router.post("/parse/batch/ndjson", response_model=ParseBatchResponse)
+async def parse_log_batch_ndjson(
+    file: UploadFile = File(...),
+    device_id: int | None = None,
+    message_template_id: int | None = None,
+    excel_template_id: int | None = None,
+    db: Session = Depends(get_db),
+    user: User = Depends(current_user),
+):
+    # 每行一个 JSON：字符串本身即日志，或含 text / raw_text 字段的对象
+    try:
+        content = (await file.read()).decode("utf-8-sig")
+    except UnicodeDecodeError as exc:
+        raise HTTPException(status_code=400, detail="NDJSON 文件必须是 UTF-8 编码") from exc
+    entries: list[tuple[str, str]] = []
+    for line_no, line in enumerate(content.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            entries.append(("", f"第 {line_no} 行不是有效 JSON"))
+            continue
+        if isinstance(item, dict):
+            item = item.get("text") or item.get("raw_text") or ""
+        if not isinstance(item, str):
+            entries.append(("", f"第 {line_no} 行缺少日志文本"))
+            continue
+        entries.append((item, ""))
+    return _parse_batch(db, user, entries, device_id, message_template_id, excel_template_id)
+
+
 @parse_router.post("/reformat", response_model=ParseResponse)
 def reformat_log(payload: dict[str, Any], db: Session = Depends(get_db), user: User = Depends(current_user)):
     # 允许手动修正解析结果后重新渲染模板
@@ -177,21 +228,18 @@ def reformat_log(payload: dict[str, Any], db: Session = Depends(get_db), user: U
     message_template_id = payload.get("message_template_id")
     excel_template_id = payload.get("excel_template_id")
 
-    from app.services.parser_service import _base_config, _get_compatible_template, _get_workspace_device
-    from app.models.entities import ParseRule
+    from app.services.parser_service import _base_config, _get_compatible_template, _get_workspace_device, get_rule_set
     from app.services.template_service import render_template
     from output.formatter import render_chat, render_excel
 
     _get_workspace_device(db, user, device_id)
 
     # 获取字段标签映射以保持格式化一致
-    query = db.query(ParseRule).filter(ParseRule.workspace_id == user.workspace_id, ParseRule.enabled.is_(True))
-    if device_id:
-        query = query.filter((ParseRule.device_id == device_id) | (ParseRule.device_id.is_(None)))
-    rules = query.all()
+    rule_set = get_rule_set(db, user.workspace_id, device_id)
+    rules = rule_set.rules
     
     cfg = _base_config()
-    cfg["fields"] = {r.field_key: r.field_label for r in rules if r.field_label}
+    cfg["fields"] = dict(rule_set.field_labels)
 
     message_template = _get_compatible_template(db, user, message_template_id, device_id)
     excel_template = _get_compatible_template(db, user, excel_template_id, device_id)
@@ -251,12 +299,11 @@ def reformat_log(payload: dict[str, Any], db: Session = Depends(get_db), user: U
 def create(payload: AlertCreate, db: Session = Depends(get_db), user: User = Depends(require_not_viewer)):
     duplicate = find_duplicate_alert(db, user, payload.parsed_fields, payload.device_id)
     if duplicate:
-        duplicate_codes = _alert_code_map(db, user, [duplicate])
         raise HTTPException(
             status_code=409,
             detail={
                 "message": "该解析结果已进入告警工作台，请勿重复添加",
-                "alert_id": duplicate_codes.get(duplicate.id) or duplicate.id,
+                "alert_id": duplicate.alert_code or duplicate.id,
                 "alert_hash": duplicate.alert_hash,
                 "event_type": duplicate.event_type,
                 "created_at": duplicate.created_at.isoformat() if duplicate.created_at else "",
@@ -271,7 +318,25 @@ def create(payload: AlertCreate, db: Session = Depends(get_db), user: User = Dep
     return _enrich_alert(db, user, alert)
 
 
-@router.get("", response_model=list[AlertOut])
+def _encode_cursor(alert: Alert) -> str:
+    raw = f"{alert.created_at.isoformat()}|{alert.id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, alert_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(alert_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise HTTPException(status_code=400, detail="分页游标无效") from exc
+
+
+def _alert_list_item(alert: Alert) -> dict[str, Any]:
+    return {name: getattr(alert, name) for name in _LIST_COLUMNS}
+
+
+@router.get("", response_model=list[AlertListItem])
 def list_alerts(
     response: Response,
     db: Session = Depends(get_db),
@@ -285,19 +350,24 @@ def list_alerts(
     q: str | None = None,
     limit: int = Query(50, ge=1, le=1000),
     offset: int = Query(0, ge=0),
+    cursor: str | None = None,
+    with_total: bool = True,
 ):
-    # 生成缓存键
-    cache_key = f"{user.workspace_id}:{status}:{project_id}:{assignee_id}:{current_group}:{start_date}:{end_date}:{q}:{limit}:{offset}"
-    current_time = time.time()
-
-    # 检查缓存
-    with _alert_cache_lock:
-        if cache_key in _alert_list_cache:
-            cached_time, cached_data = _alert_list_cache[cache_key]
-            if current_time - cached_time < _ALERT_CACHE_TTL:
-                response.headers["X-Total-Count"] = str(cached_data["total"])
-                response.headers["Access-Control-Expose-Headers"] = "X-Total-Count"
-                return cached_data["rows"]
+    """
+    告警列表（精简列）。传入上一页响应头 X-Next-Cursor 中的 cursor 时按 (created_at, id) 键集翻页，
+    忽略 offset；with_total=false 时不统计总数。
+    """
+    filters = [status, project_id, assignee_id, current_group, start_date, end_date, q]
+    response.headers["Access-Control-Expose-Headers"] = "X-Total-Count, X-Next-Cursor"
+    # 生成缓存键（含工作区代数，告警写入后自动失效）
+    key = cache_key(ALERT_LIST_NAMESPACE, user.workspace_id, [*filters, limit, offset, cursor, with_total])
+    cached_data = cache_get(key)
+    if cached_data is not None:
+        if cached_data.get("total") is not None:
+            response.headers["X-Total-Count"] = str(cached_data["total"])
+        if cached_data.get("next_cursor"):
+            response.headers["X-Next-Cursor"] = cached_data["next_cursor"]
+        return cached_data["rows"]
 
     query = db.query(Alert).filter(Alert.workspace_id == user.workspace_id)
     if status:
@@ -313,26 +383,35 @@ def list_alerts(
     if end_date:
         query = query.filter(Alert.created_at < parse_day(end_date, end_of_day=True))
     if q:
-        like = f"%{q}%"
-        query = query.filter(
-            (Alert.alert_hash.like(like)) | (Alert.source_ip.like(like)) | (Alert.destination_ip.like(like)) | (Alert.event_type.like(like))
+        query, _ = search_alerts(query, q)
+
+    total = None
+    if with_total:
+        # 总数与翻页无关，按筛选条件单独缓存，翻页时不重复 COUNT
+        count_key = cache_key(ALERT_LIST_NAMESPACE, user.workspace_id, ["count", *filters])
+        total = cache_get(count_key)
+        if total is None:
+            total = query.order_by(None).count()
+            cache_set(count_key, total, ALERT_LIST_CACHE_TTL)
+        response.headers["X-Total-Count"] = str(total)
+
+    page = query.options(load_only(*(getattr(Alert, name) for name in _LIST_COLUMNS)))
+    if cursor:
+        cursor_created_at, cursor_id = _decode_cursor(cursor)
+        page = page.filter(
+            (Alert.created_at < cursor_created_at) | ((Alert.created_at == cursor_created_at) & (Alert.id < cursor_id))
         )
-    total = query.count()
-    response.headers["X-Total-Count"] = str(total)
-    response.headers["Access-Control-Expose-Headers"] = "X-Total-Count"
-    rows = query.order_by(Alert.created_at.desc()).offset(offset).limit(limit).all()
-    codes = _alert_code_map(db, user, rows)
-    result = [_alert_to_dict(row, codes.get(row.id, "")) for row in rows]
-
-    # 缓存结果
-    with _alert_cache_lock:
-        _alert_list_cache[cache_key] = (current_time, {"rows": result, "total": total})
-        # 清理过期缓存
-        if len(_alert_list_cache) > 100:
-            expired_keys = [k for k, (t, _) in _alert_list_cache.items() if current_time - t > _ALERT_CACHE_TTL]
-            for k in expired_keys[:50]:
-                del _alert_list_cache[k]
-
+    # ORDER BY 必须在 OFFSET/LIMIT 之前追加，否则 SQLAlchemy 拒绝执行
+    page = page.order_by(Alert.created_at.desc(), Alert.id.desc())
+    if not cursor:
+        page = page.offset(offset)
+    rows = page.limit(limit).all()
+    next_cursor = _encode_cursor(rows[-1]) if len(rows) == limit else ""
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    result = [_alert_list_item(row) for row in rows]
+
+    cache_set(key, {"rows": result, "total": total, "next_cursor": next_cursor}, ALERT_LIST_CACHE_TTL)
     return result
 
 
@@ -558,154 +637,74 @@ def delete_alert(alert_id: int, db: Session = Depends(get_db), user: User = Depe
     return {"ok": True}
 
 
-@router.post("/{alert_id}/ai-analysis", response_model=AlertOut)
+def _enqueue_alert_task(db: Session, user: User, alert: Alert, task_type: str, busy_detail: str, input_data: dict[str, Any]) -> dict[str, Any]:
+    # 防止并发冲突：同一告警已有排队或执行中的同类任务时拒绝重复提交
+    if find_active_task(db, user.workspace_id, task_type, "alert", alert.id):
+        raise HTTPException(status_code=409, detail=busy_detail)
+    task = enqueue_task(db, user, task_type, "alert", alert.id, input_data)
+    db.commit()
+    dispatch_task(task.id)
+    return {"ok": True, "task_id": task.id, "status": task.status, "alert_id": alert.id}
+
+
+@router.post("/{alert_id}/ai-analysis", status_code=202)
 def run_ai(alert_id: int, db: Session = Depends(get_db), user: User = Depends(require_not_viewer)):
+    """提交 AI 研判任务，立即返回任务 ID；完成情况通过 GET /tasks/{task_id} 查询。"""
     alert = db.get(Alert, alert_id)
     if not alert or alert.workspace_id != user.workspace_id:
         raise HTTPException(status_code=404, detail="告警不存在")
-    
-    # 防止并发冲突：检查是否有正在运行的相同类型任务
-    existing_task = db.query(TaskRecord).filter_by(
-        workspace_id=user.workspace_id,
-        target_type="alert",
-        target_id=str(alert_id),
-        task_type="alert.ai_analysis",
-        status="running"
-    ).first()
-    if existing_task:
-        raise HTTPException(status_code=409, detail="AI 研判任务正在运行中，请稍后再试")
-
     ai_settings = get_effective_setting(db, user.workspace_id, user.id, "ai")
-    
-    # 预先构建语义化数据用于 AI 研判上下文
-    rules = db.query(ParseRule).filter_by(workspace_id=user.workspace_id, enabled=True).all()
-    semantic_data = {}
-    alert_code = _alert_code_map(db, user, [alert]).get(alert.id, "")
-    # 系统字段
-    semantic_data.update({
-        "告警ID": alert_code,
-        "告警Hash": alert.alert_hash,
-        "状态": STATUS_LABELS.get(alert.status, alert.status),
-        "所属组": alert.current_group,
-        "设备名称": db.get(Device, alert.device_id).name if alert.device_id else "通用设备",
-        "当前日期": alert.created_at.strftime("%Y-%m-%d"),
-        "当前时间": alert.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-    })
-    # 解析字段映射
-    for r in rules:
-        if not r.device_id or r.device_id == alert.device_id:
-            val = alert.parsed_fields.get(r.field_key)
-            if val:
-                semantic_data[r.name] = val
-    # 资产字段
-    src_ctx = alert.src_asset_context or {}
-    dst_ctx = alert.dst_asset_context or {}
-    semantic_data.update({
-        "源资产": f"{src_ctx.get('name', '')} ({src_ctx.get('area', '')})",
-        "目的资产": f"{dst_ctx.get('name', '')} ({dst_ctx.get('area', '')})",
-        "目的资产重要性": dst_ctx.get('criticality', ''),
-    })
-
-    task = create_task(db, user, "alert.ai_analysis", "alert", alert.id, {"alert_hash": alert.alert_hash, "model": ai_settings.get("model")})
-    run = AiRun(
-        workspace_id=user.workspace_id,
-        actor_id=user.id,
-        source="alert_workbench",
-        agent="alert_investigation",
-        reasoning_mode="smart",
-        status="running",
-        model=str(ai_settings.get("model") or ""),
-        target_type="alert",
-        target_id=str(alert.id),
-        input={"alert_hash": alert.alert_hash},
+    return _enqueue_alert_task(
+        db, user, alert, TASK_AI_ANALYSIS, "AI 研判任务正在运行中，请稍后再试",
+        {"alert_hash": alert.alert_hash, "model": ai_settings.get("model")},
     )
-    db.add(run)
-    db.flush()
-    started = time.monotonic()
-    try:
-        result, matched_ids = investigate_threat(db, user, source="alert", alert=alert, include_recommended_actions=True)
-        alert.ai_result = render_v220_alert_analysis(result)
-        alert.last_updated_by_id = user.id
-        run.status = "success"
-        run.result = result
-        run.timing_ms = int((time.monotonic() - started) * 1000)
-        finish_task(db, task, {"ai_result_length": len(alert.ai_result or ""), "matched_experiences": matched_ids})
-    except Exception as exc:
-        run.status = "failed"
-        run.error = str(exc)
-        run.timing_ms = int((time.monotonic() - started) * 1000)
-        fail_task(db, task, exc)
-        raise
-    write_audit(db, user, "alert.ai_analysis", "alert", alert.id, {"alert_hash": alert.alert_hash, "task_id": task.id})
-    db.commit()
-    db.refresh(alert)
-    return _enrich_alert(db, user, alert)
 
 
-@router.post("/{alert_id}/ti-query", response_model=AlertOut)
+@router.post("/{alert_id}/ti-query", status_code=202)
 def run_ti(alert_id: int, db: Session = Depends(get_db), user: User = Depends(require_not_viewer)):
-    from core.ti_service import query_pair
-
+    """提交威胁情报查询任务，立即返回任务 ID。"""
     alert = db.get(Alert, alert_id)
     if not alert or alert.workspace_id != user.workspace_id:
         raise HTTPException(status_code=404, detail="告警不存在")
-    
-    # 防止并发冲突
-    existing_task = db.query(TaskRecord).filter_by(
-        workspace_id=user.workspace_id,
-        target_type="alert",
-        target_id=str(alert_id),
-        task_type="alert.ti_query",
-        status="running"
-    ).first()
-    if existing_task:
-        raise HTTPException(status_code=409, detail="威胁情报查询任务正在运行中，请稍后再试")
-
-    ti_config = get_effective_setting(db, user.workspace_id, user.id, "ti")
-    # 直接将 ti_config 作为 providers 传给 query_pair，它包含了 active_provider 和各厂商 Key
-    cfg = {"providers": ti_config or {}}
-    
-    task = create_task(db, user, "alert.ti_query", "alert", alert.id, {"alert_hash": alert.alert_hash, "src_ip": alert.source_ip, "dst_ip": alert.destination_ip})
-    try:
-        alert.ti_result = query_pair(alert.source_ip, alert.destination_ip, cfg)
-        alert.last_updated_by_id = user.id
-        finish_task(db, task, {"has_result": bool(alert.ti_result)})
-    except Exception as exc:
-        fail_task(db, task, exc)
-        raise
-    write_audit(db, user, "alert.ti_query", "alert", alert.id, {"alert_hash": alert.alert_hash, "task_id": task.id})
+    return _enqueue_alert_task(
+        db, user, alert, TASK_TI_QUERY, "威胁情报查询任务正在运行中，请稍后再试",
+        {"alert_hash": alert.alert_hash, "src_ip": alert.source_ip, "dst_ip": alert.destination_ip},
+    )
+
+
+@router.post("/ti-query/batch", status_code=202)
+def run_ti_batch(payload: AlertTiBatchRequest, db: Session = Depends(get_db), user: User = Depends(require_not_viewer)):
+    """提交批量威胁情报查询任务，立即返回任务 ID；查询统计在任务 output.report 中。"""
+    ids = list(dict.fromkeys(int(item) for item in payload.ids if item))
+    if not ids:
+        raise HTTPException(status_code=400, detail="请选择告警")
+    if len(ids) > TI_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"单次最多查询 {TI_BATCH_LIMIT} 条告警")
+
+    providers_cfg = get_effective_setting(db, user.workspace_id, user.id, "ti") or {}
+    if not providers_cfg.get("enabled", True):
+        raise HTTPException(status_code=400, detail="威胁情报查询已关闭")
+
+    alert_ids = [row_id for (row_id,) in db.query(Alert.id).filter(Alert.workspace_id == user.workspace_id, Alert.id.in_(ids))]
+    if not alert_ids:
+        raise HTTPException(status_code=404, detail="告警不存在")
+    task = enqueue_task(db, user, TASK_TI_QUERY_BATCH, "alert", "batch", {"alert_ids": alert_ids, "requested": len(ids)})
     db.commit()
-    db.refresh(alert)
-    return _enrich_alert(db, user, alert)
+    dispatch_task(task.id)
+    return {"ok": True, "task_id": task.id, "status": task.status, "total": len(ids), "missing": len(ids) - len(alert_ids)}
 
 
-@router.post("/{alert_id}/send-webhook")
+@router.post("/{alert_id}/send-webhook", status_code=202)
 def send_alert_webhook(alert_id: int, db: Session = Depends(get_db), user: User = Depends(require_not_viewer)):
+    """提交 Webhook 通报任务，立即返回任务 ID。"""
     alert = db.get(Alert, alert_id)
     if not alert or alert.workspace_id != user.workspace_id:
         raise HTTPException(status_code=404, detail="告警不存在")
-    
+
     webhook_cfg = get_effective_setting(db, user.workspace_id, user.id, "webhook")
     if not webhook_cfg or webhook_cfg.get("enabled") is False:
         raise HTTPException(status_code=400, detail="Webhook 未配置或已禁用")
-        
-    task = create_task(db, user, "alert.webhook_send", "alert", alert.id, {"alert_hash": alert.alert_hash})
-    
-    # 使用增强后的渲染数据
-    data = _get_rendering_data(db, user, alert)
-    text = render_chat(data, {"fields": {"order": list(data.keys()), "auto_append_extra": True}})
-    
-    try:
-        result = send_record(text, {"webhook": webhook_cfg})
-        if not result.get("success"):
-            raise HTTPException(status_code=502, detail=result)
-        finish_task(db, task, {"result": result})
-    except Exception as exc:
-        fail_task(db, task, exc)
-        raise
-    write_audit(db, user, "alert.webhook_send", "alert", alert.id, {"alert_hash": alert.alert_hash, "result": result, "task_id": task.id})
-    db.commit()
-    return result
+    return _enqueue_alert_task(db, user, alert, TASK_WEBHOOK_SEND, "通报消息正在发送中，请稍后再试", {"alert_hash": alert.alert_hash})
 
 
 @router.get("/{alert_id}/history", response_model=list[AuditLogOut])
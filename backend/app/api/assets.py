@@ -1,10 +1,8 @@
-import io
-import json
 from typing import Any
 
 from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
-from fastapi.responses import StreamingResponse
-from openpyxl import Workbook, load_workbook
+from fastapi.responses import JSONResponse
+from openpyxl import Workbook
 from sqlalchemy import String, or_
 from sqlalchemy.orm import Session
 
@@ -13,17 +11,32 @@ from app.models.database import get_db
 from app.models.entities import Asset, AssetSegment, User
 from app.schemas.common import AssetCreate, AssetImportResult, AssetLookupRequest, AssetOut, AssetUpdate, AssetSegmentCreate, AssetSegmentOut, AssetSegmentUpdate
 from app.services.asset_service import (
-    build_asset_context,
     find_duplicate_asset,
-    lookup_asset_by_domain,
-    lookup_asset_by_ip,
+    invalidate_asset_cache,
+    invalidate_segment_index,
     make_asset_key,
     normalize_asset_payload,
+    resolve_many,
+)
+from app.services.asset_import_service import (
+    IMPORT_ASYNC_BYTES,
+    TASK_ASSET_IMPORT,
+    TASK_SEGMENT_IMPORT,
+    finish_import,
+    import_workbook,
+    invalidate_import_cache,
+    open_import_sheet,
+    stage_import_file,
 )
 from app.services.audit_service import write_audit
+from app.services.task_service import dispatch_task, enqueue_task
+from app.services.xlsx_service import cell_value, save_workbook, write_only_workbook, xlsx_response
 
 router = APIRouter(prefix="/assets", tags=["assets"])
 
+# 导出时每批从数据库读取的行数
+EXPORT_BATCH_SIZE = 1000
+
 FIXED_HEADERS = [
     ("IP", "ip"),
     ("域名", "domain"),
@@ -37,32 +50,11 @@ FIXED_HEADERS = [
     ("备注", "description"),
 ]
 TEMPLATE_HEADERS = ["IP", "域名", "资产名称", "资产所属区域", "负责人", "部门", "重要性", "环境", "标签", "操作系统", "中间件", "数据库", "开放端口", "业务系统", "备注"]
-HEADER_ALIASES = {
-    "IP": "ip",
-    "ip": "ip",
-    "域名": "domain",
-    "domain": "domain",
-    "资产名称": "name",
-    "name": "name",
-    "资产所属区域": "area",
-    "area": "area",
-    "负责人": "owner",
-    "owner": "owner",
-    "部门": "department",
-    "department": "department",
-    "重要性": "criticality",
-    "criticality": "criticality",
-    "环境": "environment",
-    "environment": "environment",
-    "标签": "tags",
-    "tags": "tags",
-    "备注": "description",
-    "description": "description",
-}
 
 
-@router.get("", response_model=list[AssetOut])
-def list_assets(
+def _asset_query(
+    db: Session,
+    workspace_id: int,
     q: str | None = None,
     ip: str | None = None,
     domain: str | None = None,
@@ -70,12 +62,8 @@ def list_assets(
     owner: str | None = None,
     criticality: str | None = None,
     environment: str | None = None,
-    limit: int = Query(100, ge=1, le=500),
-    offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db),
-    user: User = Depends(current_user),
 ):
-    query = db.query(Asset).filter(Asset.workspace_id == user.workspace_id)
+    query = db.query(Asset).filter(Asset.workspace_id == workspace_id)
     if ip:
         query = query.filter(Asset.ip.like(f"%{ip.strip()}%"))
     if domain:
@@ -101,6 +89,24 @@ def list_assets(
                 Asset.fingerprints.cast(String).like(like),
             )
         )
+    return query
+
+
+@router.get("", response_model=list[AssetOut])
+def list_assets(
+    q: str | None = None,
+    ip: str | None = None,
+    domain: str | None = None,
+    area: str | None = None,
+    owner: str | None = None,
+    criticality: str | None = None,
+    environment: str | None = None,
+    limit: int = Query(100, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    user: User = Depends(current_user),
+):
+    query = _asset_query(db, user.workspace_id, q=q, ip=ip, domain=domain, area=area, owner=owner, criticality=criticality, environment=environment)
     return query.order_by(Asset.updated_at.desc()).offset(offset).limit(limit).all()
 
 
@@ -115,6 +121,7 @@ def create_asset(payload: AssetCreate, db: Session = Depends(get_db), user: User
     db.flush()
     write_audit(db, user, "asset.create", "asset", row.id, {"asset_id": row.id, "ip": row.ip, "domain": row.domain, "name": row.name})
     db.commit()
+    invalidate_asset_cache(user.workspace_id)
     db.refresh(row)
     return row
 
@@ -155,6 +162,7 @@ def update_asset(asset_id: int, payload: AssetUpdate, db: Session = Depends(get_
             setattr(row, key, value)
     write_audit(db, user, "asset.update", "asset", row.id, {"asset_id": row.id, "ip": row.ip, "domain": row.domain, "name": row.name, "changes": changes})
     db.commit()
+    invalidate_asset_cache(user.workspace_id)
     db.refresh(row)
     return row
 
@@ -168,6 +176,7 @@ def delete_asset(asset_id: int, db: Session = Depends(get_db), user: User = Depe
     write_audit(db, user, "asset.delete", "asset", row.id, detail)
     db.delete(row)
     db.commit()
+    invalidate_asset_cache(user.workspace_id)
     return {"ok": True}
 
 
@@ -179,63 +188,20 @@ def export_asset_template(db: Session = Depends(get_db), user: User = Depends(cu
     ws.append(TEMPLATE_HEADERS)
     ws.append(["10.10.2.15", "portal.example.com", "门户系统", "生产区", "张三", "安全部", "critical", "production", "核心资产,外网暴露", "Ubuntu 22.04", "Nginx", "MySQL", "80,443", "门户业务", "可删除示例行"])
     _add_instruction_sheet(wb, "individual")
-    output = _workbook_bytes(wb)
+    output = save_workbook(wb)
     write_audit(db, user, "asset.export_template", "asset", "template", {"headers": TEMPLATE_HEADERS})
     db.commit()
-    return _xlsx_response(output, "asset_template.xlsx")
+    return xlsx_response(output, "asset_template.xlsx")
 
 
 @router.post("/import", response_model=AssetImportResult)
-async def import_assets(
+def import_assets(
     file: UploadFile = File(...),
     strategy: str = Query("skip", pattern="^(skip|overwrite|append)$"),
     db: Session = Depends(get_db),
     user: User = Depends(require_admin),
 ):
-    if not (file.filename or "").lower().endswith(".xlsx"):
-        raise HTTPException(status_code=400, detail="仅支持 .xlsx 文件")
-    content = await file.read()
-    wb = load_workbook(io.BytesIO(content), data_only=True)
-    ws = wb.active
-    headers = [_cell_text(cell.value) for cell in next(ws.iter_rows(min_row=1, max_row=1))]
-    if not any(headers):
-        raise HTTPException(status_code=400, detail="Excel 第一行必须是字段名")
-
-    stats = {"created": 0, "updated": 0, "skipped": 0, "errors": []}
-    for row_index, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        try:
-            data = _row_to_asset(headers, row)
-            normalized = normalize_asset_payload(data)
-        except Exception as exc:
-            stats["skipped"] += 1
-            stats["errors"].append({"row": row_index, "error": str(getattr(exc, "detail", exc))})
-            continue
-
-        duplicate = find_duplicate_asset(db, user.workspace_id, normalized.get("ip", ""), normalized.get("domain", ""))
-        if duplicate and strategy == "skip":
-            stats["skipped"] += 1
-            continue
-        if duplicate and strategy == "overwrite":
-            for key, value in normalized.items():
-                setattr(duplicate, key, value)
-            stats["updated"] += 1
-            continue
-
-        db.add(Asset(workspace_id=user.workspace_id, asset_key=make_asset_key(user.workspace_id), **normalized))
-        savepoint = db.begin_nested()
-        try:
-            db.flush()
-            savepoint.commit()
-            stats["created"] += 1
-        except Exception:
-            savepoint.rollback()
-            stats["skipped"] += 1
-            stats["errors"].append({"row": row_index, "error": "资产冲突（可能是并发导入了相同 IP/域名）"})
-            continue
-
-    write_audit(db, user, "asset.import", "asset", "import", {"filename": file.filename, "strategy": strategy, "stats": stats})
-    db.commit()
-    return stats
+    return _import_upload(db, user, file, strategy, "asset", TASK_ASSET_IMPORT)
 
 
 @router.get("/export.xlsx")
@@ -248,14 +214,17 @@ def export_assets(
     db: Session = Depends(get_db),
     user: User = Depends(current_user),
 ):
-    rows = list_assets(q=q, area=area, owner=owner, criticality=criticality, environment=environment, limit=500, offset=0, db=db, user=user)
-    fingerprint_keys = sorted({key for row in rows for key in (row.fingerprints or {}).keys()})
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "资产库"
+    """导出全部匹配资产：先只读指纹列收集表头，再分批读取逐行写入 write-only 工作簿。"""
+    query = _asset_query(db, user.workspace_id, q=q, area=area, owner=owner, criticality=criticality, environment=environment)
+    fingerprint_keys = sorted(
+        {key for (fingerprints,) in query.with_entities(Asset.fingerprints).yield_per(EXPORT_BATCH_SIZE) for key in (fingerprints or {})}
+    )
+    wb = write_only_workbook()
+    ws = wb.create_sheet("资产库")
     fixed_headers = [label for label, _ in FIXED_HEADERS]
     ws.append(fixed_headers + fingerprint_keys)
-    for row in rows:
+    count = 0
+    for row in query.order_by(Asset.updated_at.desc(), Asset.id.desc()).yield_per(EXPORT_BATCH_SIZE):
         base = [
             row.ip,
             row.domain,
@@ -268,37 +237,28 @@ def export_assets(
             ",".join(row.tags or []),
             row.description,
         ]
-        ws.append(base + [row.fingerprints.get(key, "") if row.fingerprints else "" for key in fingerprint_keys])
-    output = _workbook_bytes(wb)
-    write_audit(db, user, "asset.export", "asset", "export", {"count": len(rows), "fingerprint_columns": fingerprint_keys})
+        fingerprints = row.fingerprints or {}
+        ws.append([cell_value(value) for value in base + [fingerprints.get(key, "") for key in fingerprint_keys]])
+        count += 1
+    output = save_workbook(wb)
+    write_audit(db, user, "asset.export", "asset", "export", {"count": count, "fingerprint_columns": fingerprint_keys})
     db.commit()
-    return _xlsx_response(output, "assets.xlsx")
+    return xlsx_response(output, "assets.xlsx")
 
 
 @router.post("/lookup")
 def lookup_assets(payload: AssetLookupRequest, db: Session = Depends(get_db), user: User = Depends(current_user)):
-    by_ip = {}
-    by_domain = {}
-    for ip in payload.ips:
-        ctx = build_asset_context(lookup_asset_by_ip(db, user.workspace_id, ip))
-        if ctx:
-            by_ip[ip] = ctx
-    for domain in payload.domains:
-        ctx = build_asset_context(lookup_asset_by_domain(db, user.workspace_id, domain))
-        if ctx:
-            by_domain[domain] = ctx
+    ip_contexts = resolve_many(db, user.workspace_id, "ip", payload.ips)
+    domain_contexts = resolve_many(db, user.workspace_id, "domain", payload.domains)
+    by_ip = {ip: ip_contexts[ip.strip()] for ip in payload.ips if ip_contexts.get(ip.strip())}
+    by_domain = {domain: domain_contexts[domain.strip()] for domain in payload.domains if domain_contexts.get(domain.strip())}
     return {"ips": by_ip, "domains": by_domain}
 
 
 # --- Asset Segments (网段资产) ---
 
-@router.get("/segments", response_model=list[AssetSegmentOut])
-def list_segments(
-    q: str | None = None,
-    db: Session = Depends(get_db),
-    user: User = Depends(current_user),
-):
-    query = db.query(AssetSegment).filter(AssetSegment.workspace_id == user.workspace_id)
+def _segment_query(db: Session, workspace_id: int, q: str | None = None):
+    query = db.query(AssetSegment).filter(AssetSegment.workspace_id == workspace_id)
     if q:
         like = f"%{q.strip()}%"
         query = query.filter(
@@ -309,7 +269,16 @@ def list_segments(
                 AssetSegment.area.like(like),
             )
         )
-    return query.order_by(AssetSegment.updated_at.desc()).all()
+    return query
+
+
+@router.get("/segments", response_model=list[AssetSegmentOut])
+def list_segments(
+    q: str | None = None,
+    db: Session = Depends(get_db),
+    user: User = Depends(current_user),
+):
+    return _segment_query(db, user.workspace_id, q).order_by(AssetSegment.updated_at.desc()).all()
 
 
 @router.post("/segments", response_model=AssetSegmentOut)
@@ -324,6 +293,7 @@ def create_segment(payload: AssetSegmentCreate, db: Session = Depends(get_db), u
     db.flush()
     write_audit(db, user, "asset_segment.create", "asset_segment", row.id, {"segment": row.segment, "name": row.name})
     db.commit()
+    invalidate_segment_index(user.workspace_id)
     db.refresh(row)
     return row
 
@@ -354,6 +324,7 @@ def update_segment(segment_id: int, payload: AssetSegmentUpdate, db: Session = D
             
     write_audit(db, user, "asset_segment.update", "asset_segment", row.id, {"segment": row.segment, "changes": changes})
     db.commit()
+    invalidate_segment_index(user.workspace_id)
     db.refresh(row)
     return row
 
@@ -366,6 +337,7 @@ def delete_segment(segment_id: int, db: Session = Depends(get_db), user: User =
     write_audit(db, user, "asset_segment.delete", "asset_segment", row.id, {"segment": row.segment})
     db.delete(row)
     db.commit()
+    invalidate_segment_index(user.workspace_id)
     return {"ok": True}
 
 
@@ -380,6 +352,7 @@ def batch_delete_assets(payload: dict[str, Any], db: Session = Depends(get_db),
         db.delete(row)
     write_audit(db, user, "asset.batch_delete", "asset", ",".join(str(i) for i in ids), {"count": count})
     db.commit()
+    invalidate_asset_cache(user.workspace_id)
     return {"ok": True, "deleted": count}
 
 
@@ -394,21 +367,13 @@ def batch_delete_segments(payload: dict[str, Any], db: Session = Depends(get_db)
         db.delete(row)
     write_audit(db, user, "asset_segment.batch_delete", "asset_segment", ",".join(str(i) for i in ids), {"count": count})
     db.commit()
+    invalidate_segment_index(user.workspace_id)
     return {"ok": True, "deleted": count}
 
 
 # --- Asset Segments (网段资产) Excel Support ---
 
 SEGMENT_HEADERS = ["网段范围", "网段名称", "所属区域", "负责人", "重要性", "环境", "备注说明"]
-SEGMENT_HEADER_MAP = {
-    "网段范围": "segment",
-    "网段名称": "name",
-    "所属区域": "area",
-    "负责人": "owner",
-    "重要性": "criticality",
-    "环境": "environment",
-    "备注说明": "description",
-}
 
 def _add_instruction_sheet(wb: Workbook, type_name: str):
     """
@@ -480,8 +445,7 @@ def export_segment_template(db: Session = Depends(get_db), user: User = Depends(
     ws.append(SEGMENT_HEADERS)
     ws.append(["192.168.1.0/24", "测试网段", "测试区", "张三", "medium", "test", "示例行"])
     _add_instruction_sheet(wb, "segment")
-    output = _workbook_bytes(wb)
-    return _xlsx_response(output, "asset_segment_template.xlsx")
+    return xlsx_response(save_workbook(wb), "asset_segment_template.xlsx")
 
 
 @router.get("/segments/export.xlsx")
@@ -490,114 +454,52 @@ def export_segments_xlsx(
     db: Session = Depends(get_db),
     user: User = Depends(current_user),
 ):
-    rows = list_segments(q=q, db=db, user=user)
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "网段资产库"
+    query = _segment_query(db, user.workspace_id, q).order_by(AssetSegment.updated_at.desc(), AssetSegment.id.desc())
+    wb = write_only_workbook()
+    ws = wb.create_sheet("网段资产库")
     ws.append(SEGMENT_HEADERS)
-    for row in rows:
+    for row in query.yield_per(EXPORT_BATCH_SIZE):
         ws.append([
-            row.segment,
-            row.name,
-            row.area,
-            row.owner,
-            row.criticality,
-            row.environment,
-            row.description,
+            cell_value(row.segment),
+            cell_value(row.name),
+            cell_value(row.area),
+            cell_value(row.owner),
+            cell_value(row.criticality),
+            cell_value(row.environment),
+            cell_value(row.description),
         ])
-    output = _workbook_bytes(wb)
-    return _xlsx_response(output, "asset_segments.xlsx")
+    return xlsx_response(save_workbook(wb), "asset_segments.xlsx")
 
 
 @router.post("/segments/import", response_model=AssetImportResult)
-async def import_segments(
+def import_segments(
     file: UploadFile = File(...),
     strategy: str = Query("skip", pattern="^(skip|overwrite|append)$"),
     db: Session = Depends(get_db),
     user: User = Depends(require_admin),
 ):
+    return _import_upload(db, user, file, strategy, "segment", TASK_SEGMENT_IMPORT)
+
+
+def _import_upload(db: Session, user: User, file: UploadFile, strategy: str, kind: str, task_type: str):
+    """小文件直接导入并返回结果；大文件落盘后转后台任务，返回 202 与 task_id。"""
     if not (file.filename or "").lower().endswith(".xlsx"):
         raise HTTPException(status_code=400, detail="仅支持 .xlsx 文件")
-    content = await file.read()
-    wb = load_workbook(io.BytesIO(content), data_only=True)
-    ws = wb.active
-    headers = [_cell_text(cell.value) for cell in next(ws.iter_rows(min_row=1, max_row=1))]
-    
-    stats = {"created": 0, "updated": 0, "skipped": 0, "errors": []}
-    for row_index, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        try:
-            data = {}
-            for header, val in zip(headers, row):
-                key = SEGMENT_HEADER_MAP.get(header)
-                if key:
-                    data[key] = _cell_text(val)
-            
-            if not data.get("segment"):
-                continue
-                
-            duplicate = db.query(AssetSegment).filter_by(workspace_id=user.workspace_id, segment=data["segment"]).first()
-            if duplicate and strategy == "skip":
-                stats["skipped"] += 1
-                continue
-            if duplicate and strategy == "overwrite":
-                for k, v in data.items():
-                    setattr(duplicate, k, v)
-                stats["updated"] += 1
-                continue
-            
-            db.add(AssetSegment(workspace_id=user.workspace_id, **data))
-            savepoint = db.begin_nested()
-            try:
-                db.flush()
-                savepoint.commit()
-                stats["created"] += 1
-            except Exception:
-                savepoint.rollback()
-                stats["skipped"] += 1
-                stats["errors"].append({"row": row_index, "error": "网段冲突（可能是并发导入了相同网段）"})
-                continue
-        except Exception as exc:
-            stats["skipped"] += 1
-            stats["errors"].append({"row": row_index, "error": str(exc)})
-            
+    size = file.file.seek(0, 2)
+    file.file.seek(0)
+    if size <= IMPORT_ASYNC_BYTES:
+        stats = import_workbook(db, user.workspace_id, kind, file.file, strategy)
+        finish_import(db, user, kind, file.filename or "", strategy, stats)
+        db.commit()
+        invalidate_import_cache(kind, user.workspace_id)
+        return stats
+
+    # 先校验表头，格式错误直接返回 400 而不是排队后失败
+    with open_import_sheet(file.file):
+        pass
+    path = stage_import_file(file.file)
+    input_data = {"file": path.name, "filename": file.filename or "", "strategy": strategy, "size": size}
+    task = enqueue_task(db, user, task_type, "asset" if kind == "asset" else "asset_segment", "import", input_data)
     db.commit()
-    return stats
-
-
-def _row_to_asset(headers: list[str], row: tuple[Any, ...]) -> dict[str, Any]:
-    data: dict[str, Any] = {"fingerprints": {}}
-    for header, raw_value in zip(headers, row):
-        if not header:
-            continue
-        value = _cell_text(raw_value)
-        key = HEADER_ALIASES.get(header.strip())
-        if key == "tags":
-            data["tags"] = [item.strip() for item in value.replace("，", ",").split(",") if item.strip()]
-        elif key:
-            data[key] = value
-        elif value:
-            data["fingerprints"][header.strip()] = value
-    return data
-
-
-def _cell_text(value: Any) -> str:
-    if value is None:
-        return ""
-    if isinstance(value, (dict, list)):
-        return json.dumps(value, ensure_ascii=False)
-    return str(value).strip()
-
-
-def _workbook_bytes(wb: Workbook) -> bytes:
-    buffer = io.BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    return buffer.getvalue()
-
-
-def _xlsx_response(content: bytes, filename: str) -> StreamingResponse:
-    return StreamingResponse(
-        iter([content]),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename={filename}"},
-    )
+    dispatch_task(task.id)
+    return JSONResponse(status_code=202, content={"ok": True, "task_id": task.id, "status": task.status})
@@ -1,6 +1,8 @@
+import io
 import json
+import zipfile
 from datetime import datetime
-from typing import Any
+from typing import Any, Iterator
 
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
 from fastapi.responses import StreamingResponse
@@ -10,7 +12,7 @@ from sqlalchemy.orm import Session
 from app.api.deps import require_admin
 from app.core.settings import get_settings
 from app.core.timezone import now
-from app.models.database import get_db
+from app.models.database import SessionLocal, get_db
 from app.models.entities import (
     AiConversation,
     AiExperience,
@@ -34,11 +36,16 @@ from app.models.entities import (
     User,
     Workspace,
 )
+from app.services.alert_service import backfill_alert_codes, sync_alert_code_counters
 from app.services.audit_service import write_audit
 
 router = APIRouter(prefix="/backup", tags=["backup"])
 
 BACKUP_FORMAT = "eff-monitoring.backup.v1"
+# 导出为 zip 归档：每张表按 BACKUP_CHUNK_SIZE 行切成 NDJSON 分片，最后写入 manifest.json
+BACKUP_LAYOUT = "ndjson-zip"
+BACKUP_MANIFEST = "manifest.json"
+BACKUP_CHUNK_SIZE = 1000
 
 # Parent tables first. Restore uses this order; replace deletion uses reverse order.
 BACKUP_MODELS = [
@@ -111,55 +118,154 @@ def _coerce_row(model, row: dict[str, Any], workspace_id: int) -> dict[str, Any]
     return cleaned
 
 
-def _workspace_rows(db: Session, model, workspace_id: int) -> list[Any]:
+def _table_batches(db: Session, model, workspace_id: int) -> Iterator[list[Any]]:
+    """按主键键集分批读取工作区数据，每批一次查询。"""
     if model is Workspace:
         row = db.get(Workspace, workspace_id)
-        return [row] if row else []
-    columns = _columns(model)
-    if "workspace_id" not in columns:
-        return []
-    return db.query(model).filter(getattr(model, "workspace_id") == workspace_id).order_by(getattr(model, "id").asc()).all()
-
-
-def _backup_payload(db: Session, user: User) -> dict[str, Any]:
+        if row:
+            yield [row]
+        return
+    if "workspace_id" not in _columns(model):
+        return
+    query = db.query(model).filter(getattr(model, "workspace_id") == workspace_id)
+    last_id = None
+    while True:
+        page = query if last_id is None else query.filter(getattr(model, "id") > last_id)
+        rows = page.order_by(getattr(model, "id").asc()).limit(BACKUP_CHUNK_SIZE).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < BACKUP_CHUNK_SIZE:
+            return
+        last_id = rows[-1].id
+
+
+def _backup_manifest(db: Session, user: User) -> dict[str, Any]:
     cfg = get_settings()
-    tables: dict[str, list[dict[str, Any]]] = {}
-    schema: dict[str, list[str]] = {}
-    for model in BACKUP_MODELS:
-        table_name = model.__tablename__
-        schema[table_name] = list(_columns(model).keys())
-        tables[table_name] = [_row_out(row) for row in _workspace_rows(db, model, user.workspace_id)]
     return {
         "format": BACKUP_FORMAT,
+        "layout": BACKUP_LAYOUT,
         "app": cfg.app_name,
         "exported_at": now().isoformat(),
         "exported_by": {"id": user.id, "username": user.username, "display_name": user.display_name},
         "workspace": _row_out(db.get(Workspace, user.workspace_id)),
-        "schema": schema,
-        "tables": tables,
+        "schema": {model.__tablename__: list(_columns(model).keys()) for model in BACKUP_MODELS},
     }
 
 
-def _load_backup(data: bytes) -> dict[str, Any]:
+class _ArchiveSink:
+    """zipfile 的只写目标：写入的字节暂存，由生成器按分片取走，不支持 seek 时 zipfile 自动改用数据描述符。"""
+
+    def __init__(self) -> None:
+        self._parts: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _stream_backup(workspace_id: int, manifest: dict[str, Any]):
+    # 响应体在接口返回后才开始生成，使用独立会话，不依赖请求级会话的生命周期
+    stream_db = SessionLocal()
+    sink = _ArchiveSink()
     try:
-        payload = json.loads(data.decode("utf-8"))
+        if stream_db.bind is not None and stream_db.bind.dialect.name == "postgresql":
+            # 各表分批查询跨越整个下载过程，可重复读保证看到同一份快照
+            stream_db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        counts: dict[str, int] = {}
+        chunks: dict[str, list[str]] = {}
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for model in BACKUP_MODELS:
+                table_name = model.__tablename__
+                counts[table_name] = 0
+                chunks[table_name] = []
+                for index, rows in enumerate(_table_batches(stream_db, model, workspace_id), start=1):
+                    member = f"tables/{table_name}/{index:06d}.ndjson"
+                    archive.writestr(member, "".join(json.dumps(_row_out(row), ensure_ascii=False) + "\n" for row in rows))
+                    counts[table_name] += len(rows)
+                    chunks[table_name].append(member)
+                    # 已写出的行不再需要，释放会话中的对象
+                    stream_db.expunge_all()
+                    data = sink.drain()
+                    if data:
+                        yield data
+            manifest = {**manifest, "counts": counts, "chunks": chunks}
+            archive.writestr(BACKUP_MANIFEST, json.dumps(manifest, ensure_ascii=False, indent=2))
+        yield sink.drain()
+    finally:
+        stream_db.close()
+
+
+class _JsonBackup:
+    """旧版单文件 JSON 备份，全部行都在 tables 中。"""
+
+    def __init__(self, payload: dict[str, Any]) -> None:
+        self.manifest = payload
+        self._tables = payload.get("tables") or {}
+
+    def count(self, table_name: str) -> int:
+        return len(self._tables.get(table_name) or [])
+
+    def batches(self, table_name: str) -> Iterator[list[Any]]:
+        rows = self._tables.get(table_name) or []
+        if rows:
+            yield rows
+
+
+class _ArchiveBackup:
+    """NDJSON 分片归档，按 manifest 中的分片顺序逐片读取。"""
+
+    def __init__(self, archive: zipfile.ZipFile, manifest: dict[str, Any]) -> None:
+        self.manifest = manifest
+        self._archive = archive
+
+    def count(self, table_name: str) -> int:
+        return int((self.manifest.get("counts") or {}).get(table_name) or 0)
+
+    def batches(self, table_name: str) -> Iterator[list[Any]]:
+        for member in (self.manifest.get("chunks") or {}).get(table_name) or []:
+            with self._archive.open(member) as handle:
+                yield [json.loads(line) for line in io.TextIOWrapper(handle, encoding="utf-8") if line.strip()]
+
+
+def _load_backup(fileobj) -> _JsonBackup | _ArchiveBackup:
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        try:
+            archive = zipfile.ZipFile(fileobj)
+            manifest = json.loads(archive.read(BACKUP_MANIFEST).decode("utf-8"))
+        except Exception as exc:
+            raise HTTPException(status_code=400, detail="备份归档已损坏或缺少 manifest.json") from exc
+        if manifest.get("format") != BACKUP_FORMAT or not isinstance(manifest.get("chunks"), dict):
+            raise HTTPException(status_code=400, detail="备份文件格式不匹配或版本过旧")
+        return _ArchiveBackup(archive, manifest)
+    fileobj.seek(0)
+    try:
+        payload = json.loads(fileobj.read().decode("utf-8"))
     except Exception as exc:
         raise HTTPException(status_code=400, detail="备份文件不是有效 JSON") from exc
     if payload.get("format") != BACKUP_FORMAT or not isinstance(payload.get("tables"), dict):
         raise HTTPException(status_code=400, detail="备份文件格式不匹配或版本过旧")
-    return payload
+    return _JsonBackup(payload)
 
 
-def _table_summary(payload: dict[str, Any]) -> list[dict[str, Any]]:
-    tables = payload.get("tables") or {}
+def _table_summary(backup: _JsonBackup | _ArchiveBackup) -> list[dict[str, Any]]:
     summary = []
     for model in BACKUP_MODELS:
         name = model.__tablename__
-        backup_fields = set((payload.get("schema") or {}).get(name) or [])
+        backup_fields = set((backup.manifest.get("schema") or {}).get(name) or [])
         current_fields = set(_columns(model).keys())
         summary.append({
             "table": name,
-            "count": len(tables.get(name) or []),
+            "count": backup.count(name),
             "accepted_fields": len(backup_fields.intersection(current_fields)) if backup_fields else len(current_fields),
             "skipped_fields": sorted(backup_fields - current_fields),
             "new_fields": sorted(current_fields - backup_fields) if backup_fields else [],
@@ -290,32 +396,33 @@ def _restore_model_rows(db: Session, model, rows: list[dict[str, Any]], user: Us
 
 @router.get("/export")
 def export_backup(db: Session = Depends(get_db), user: User = Depends(require_admin)):
-    payload = _backup_payload(db, user)
-    content = json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
-    filename = f"eff-monitoring-backup-{now().strftime('%Y%m%d-%H%M%S')}.json"
-    write_audit(db, user, "backup.export", "backup", "workspace", {"tables": {k: len(v) for k, v in payload["tables"].items()}})
+    """以 NDJSON 分片 zip 归档流式导出当前工作区，各表分批查询、逐片压缩写出，内存占用与数据量无关。"""
+    manifest = _backup_manifest(db, user)
+    filename = f"eff-monitoring-backup-{now().strftime('%Y%m%d-%H%M%S')}.zip"
+    # 行数在归档生成完成后才确定，写入 manifest；审计在开始下载时记录
+    write_audit(db, user, "backup.export", "backup", "workspace", {"format": BACKUP_FORMAT, "layout": BACKUP_LAYOUT})
     db.commit()
     return StreamingResponse(
-        iter([content]),
-        media_type="application/json",
+        _stream_backup(user.workspace_id, manifest),
+        media_type="application/zip",
         headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
 
 @router.post("/inspect")
-async def inspect_backup(file: UploadFile = File(...), user: User = Depends(require_admin)):
-    payload = _load_backup(await file.read())
+def inspect_backup(file: UploadFile = File(...), user: User = Depends(require_admin)):
+    backup = _load_backup(file.file)
     return {
-        "format": payload.get("format"),
-        "app": payload.get("app"),
-        "exported_at": payload.get("exported_at"),
-        "workspace": payload.get("workspace") or {},
-        "tables": _table_summary(payload),
+        "format": backup.manifest.get("format"),
+        "app": backup.manifest.get("app"),
+        "exported_at": backup.manifest.get("exported_at"),
+        "workspace": backup.manifest.get("workspace") or {},
+        "tables": _table_summary(backup),
     }
 
 
 @router.post("/restore")
-async def restore_backup(
+def restore_backup(
     file: UploadFile = File(...),
     mode: str = Form("merge"),
     db: Session = Depends(get_db),
@@ -323,20 +430,27 @@ async def restore_backup(
 ):
     if mode not in {"merge", "replace"}:
         raise HTTPException(status_code=400, detail="还原模式仅支持 merge 或 replace")
-    payload = _load_backup(await file.read())
+    backup = _load_backup(file.file)
     if mode == "replace":
         _clear_workspace(db, user)
         db.flush()
     stats: dict[str, dict[str, int]] = {}
-    tables = payload.get("tables") or {}
     for model in BACKUP_MODELS:
+        table_stats = {"created": 0, "updated": 0, "skipped": 0}
         try:
-            stats[model.__tablename__] = _restore_model_rows(db, model, tables.get(model.__tablename__) or [], user)
-            db.flush()
+            # 归档备份逐个分片还原，旧版 JSON 备份整表作为一批
+            for rows in backup.batches(model.__tablename__):
+                for key, value in _restore_model_rows(db, model, rows, user).items():
+                    table_stats[key] += value
+                db.flush()
         except Exception as exc:
             import traceback
             traceback.print_exc()
             raise HTTPException(status_code=500, detail=f"还原表 {model.__tablename__} 失败: {str(exc)}")
+        stats[model.__tablename__] = table_stats
+    # 还原的告警保留原编号，计数器随之推进；旧版备份中没有编号的告警补齐编号
+    sync_alert_code_counters(db, user.workspace_id)
+    backfill_alert_codes(db)
     write_audit(db, user, "backup.restore", "backup", "workspace", {"mode": mode, "stats": stats})
     db.commit()
-    return {"ok": True, "mode": mode, "stats": stats, "compatibility": _table_summary(payload)}
+    return {"ok": True, "mode": mode, "stats": stats, "compatibility": _table_summary(backup)}
@@ -1,5 +1,5 @@
 import json
-from fastapi import APIRouter, Depends, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, UploadFile
 from sqlalchemy.orm import Session
 
 from app.api.deps import require_admin, require_not_viewer
@@ -7,6 +7,7 @@ from app.models.database import get_db
 from app.models.entities import ParseRule, Setting, User
 from app.services.alert_service import create_alert, find_duplicate_alert
 from app.services.audit_service import write_audit
+from app.services.parser_service import ParseSession, invalidate_rule_set
 
 router = APIRouter(prefix="/import", tags=["import"])
 
@@ -27,17 +28,34 @@ async def import_config(file: UploadFile, db: Session = Depends(get_db), user: U
             db.add(ParseRule(workspace_id=user.workspace_id, name=f"导入-{field}", field_key=field, pattern=str(pattern)))
     write_audit(db, user, "config.import", "setting", "import", {"keys": list(data.keys())})
     db.commit()
+    invalidate_rule_set(user.workspace_id)
     return {"ok": True}
 
 
+def _history_session(db: Session, user: User, sessions: dict[int | None, ParseSession], device_id: int | None) -> ParseSession:
+    if device_id not in sessions:
+        try:
+            sessions[device_id] = ParseSession(db, user, device_id)
+        except HTTPException:
+            # 历史记录中的设备已删除或不属于当前工作区时按通用规则解析，不中断整批导入
+            if None not in sessions:
+                sessions[None] = ParseSession(db, user, None)
+            sessions[device_id] = sessions[None]
+    return sessions[device_id]
+
+
 @router.post("/history")
 async def import_history(file: UploadFile, db: Session = Depends(get_db), user: User = Depends(require_not_viewer)):
     data = json.loads((await file.read()).decode("utf-8"))
     count = 0
     skipped = 0
     alert_hashes = []
+    sessions: dict[int | None, ParseSession] = {}
     for entry in data if isinstance(data, list) else []:
         parsed_fields = entry.get("parsed_data") or {}
+        if not parsed_fields and entry.get("raw_text"):
+            # 旧记录缺少解析结果时按当前规则重新解析，每个设备的解析上下文只加载一次
+            parsed_fields = _history_session(db, user, sessions, entry.get("device_id")).parse(entry["raw_text"])["parsed_fields"]
         if find_duplicate_alert(db, user, parsed_fields, entry.get("device_id")):
             skipped += 1
             continue
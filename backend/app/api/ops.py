@@ -7,38 +7,35 @@ from typing import Any
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy import func
+from sqlalchemy import String, cast, func
 from sqlalchemy.orm import Session
 
-from app.api.deps import current_user, require_admin, require_not_viewer
+from app.api.deps import current_user, has_role, require_admin, require_not_viewer
 from app.core.timezone import today_end, today_start
-from app.models.database import get_db
-from app.models.entities import Alert, AuditLog, Device, ParseRule, Project, Setting, TaskRecord, Template, User
+from app.models.database import SessionLocal, get_db
+from app.models.entities import Alert, AuditLog, ParseRule, Setting, TaskRecord, Template, User
 from app.schemas.common import TaskRecordOut, WebhookTestRequest
 from app.services.audit_service import write_audit
+from app.services.export_service import AlertExportPlan, alert_export_query, export_batch_lookups, iter_alert_batches
 from app.services.ip_list_service import (
     add_ip_list_item,
     delete_ip_list_items,
-    detect_value_type,
+    get_ip_list_index,
     get_ip_list_setting,
-    normalize_value,
+    import_ip_list_values,
     save_ip_lists,
     set_ip_list_value,
     update_ip_list_item,
 )
 from app.services.template_service import render_template
-from app.services.stats_service import get_aggregate_stats
+from app.services.stats_service import TERMINAL_STATUS_VALUES, duration_seconds, get_aggregate_stats, time_bucket
 from app.services.task_service import create_task, fail_task, finish_task
+from app.services.xlsx_service import cell_value, save_workbook, write_only_workbook, xlsx_response
 from app.services.workflow_constants import (
-    CLOSURE_ACTION_LABELS,
-    DISPOSAL_ACTION_LABELS,
-    DISPOSAL_TARGET_LABELS,
-    GROUP_LABELS,
     STATUS_LABELS,
     TERMINAL_STATUSES,
     normalize_status,
 )
-from core.lists import is_ip_in_list
 from integration.webhook import send_record
 
 router = APIRouter(tags=["operations"])
@@ -57,16 +54,6 @@ def _compact_status(status: str | None) -> str:
     return normalize_status(status)
 
 
-def _audit_new_status(detail: dict[str, Any] | None) -> str | None:
-    changes = (detail or {}).get("changes", {})
-    status_change = changes.get("status") if isinstance(changes, dict) else None
-    if isinstance(status_change, dict):
-        return status_change.get("new")
-    if isinstance(status_change, str):
-        return status_change
-    return None
-
-
 def _setting(db: Session, workspace_id: int, key: str, default: dict[str, Any] | None = None) -> Setting:
     row = db.query(Setting).filter_by(workspace_id=workspace_id, key=key).first()
     if row:
@@ -110,96 +97,86 @@ def dashboard_summary(
     base = db.query(Alert).filter(Alert.workspace_id == user.workspace_id)
     filtered = base.filter(Alert.created_at >= start_dt, Alert.created_at < end_dt)
 
-    total = filtered.count()
-    # 获取审计日志用于计算 MTTR，仅当前处于终态的告警参与统计。
-    all_alerts = filtered.all()
-    pending = sum(1 for a in all_alerts if _compact_status(a.status) not in TERMINAL_STATUSES)
-    confirmed = sum(1 for a in all_alerts if _compact_status(a.status) in TERMINAL_STATUSES)
-    alert_ids = [a.id for a in all_alerts]
-    
-    terminal_logs = {}
-    if alert_ids:
-        # 批量查询涉及这些告警的状态变更审计日志
-        audit_rows = db.query(AuditLog).filter(
-            AuditLog.workspace_id == user.workspace_id,
-            AuditLog.target_type == "alert",
-            AuditLog.target_id.in_([str(id) for id in alert_ids]),
-            AuditLog.action.in_(["alert.update", "alert.batch_update", "alert.transition"])
-        ).order_by(AuditLog.created_at.asc()).all()
-        
-        for row in audit_rows:
-            new_status = _audit_new_status(row.detail)
-            new_status = _compact_status(new_status)
-            if new_status in TERMINAL_STATUSES and row.target_id not in terminal_logs:
-                terminal_logs[row.target_id] = row.created_at
-
-    # 计算整体 MTTR (秒)
-    mttr_samples = []
-    
-    for a in all_alerts:
-        if _compact_status(a.status) not in TERMINAL_STATUSES:
-            continue
-        # MTTR: terminal_time - created_at
-        t_time = terminal_logs.get(str(a.id))
-        if not t_time:
-            t_time = a.updated_at
-        if t_time:
-            diff = (t_time - a.created_at).total_seconds()
-            if diff >= 0:
-                mttr_samples.append(diff)
-
-    avg_mttr = sum(mttr_samples) / len(mttr_samples) if mttr_samples else None
-
-    by_status = dict(filtered.with_entities(Alert.status, func.count(Alert.id)).group_by(Alert.status).all())
-
     # 增长趋势图逻辑
     days_diff = (end_dt - start_dt).days
-    if days_diff <= 2:
+    hourly = days_diff <= 2
+    if hourly:
         fmt = "%Y-%m-%d %H:00"
         delta = timedelta(hours=1)
     else:
         fmt = "%Y-%m-%d"
         delta = timedelta(days=1)
 
+    # 1. 按 (时间桶, 状态) 聚合告警数，总数、状态分布与待办/办结数均由聚合行推算
+    created_bucket = time_bucket(db, Alert.created_at, hourly)
+    status_rows = (
+        filtered.with_entities(created_bucket, Alert.status, func.count(Alert.id))
+        .group_by(created_bucket, Alert.status)
+        .all()
+    )
+    by_status: dict[str, int] = {}
+    bucket_counts: dict[str, dict[str, int]] = {}
+    for label, status, count in status_rows:
+        by_status[status] = by_status.get(status, 0) + count
+        counts = bucket_counts.setdefault(label, {"total": 0})
+        counts["total"] += count
+        compact = _compact_status(status)
+        counts[compact] = counts.get(compact, 0) + count
+    total = sum(by_status.values())
+    confirmed = sum(count for status, count in by_status.items() if _compact_status(status) in TERMINAL_STATUSES)
+    pending = total - confirmed
+
+    # 2. MTTR：仅当前处于终态的告警参与统计。终态时间取首次流转到终态的审计时间，
+    # 无审计记录时退回 updated_at；按完成处置时间归桶，而不是按告警创建时间归桶。
+    audit_status = func.coalesce(
+        AuditLog.detail[("changes", "status", "new")].as_string(),
+        AuditLog.detail[("changes", "status")].as_string(),
+    )
+    terminal_logs = (
+        db.query(AuditLog.target_id.label("target_id"), func.min(AuditLog.created_at).label("terminal_at"))
+        .filter(
+            AuditLog.workspace_id == user.workspace_id,
+            AuditLog.target_type == "alert",
+            AuditLog.action.in_(["alert.update", "alert.batch_update", "alert.transition"]),
+            AuditLog.created_at >= start_dt,
+            audit_status.in_(TERMINAL_STATUS_VALUES),
+        )
+        .group_by(AuditLog.target_id)
+        .subquery()
+    )
+    terminal_at = func.coalesce(terminal_logs.c.terminal_at, Alert.updated_at)
+    elapsed = duration_seconds(db, Alert.created_at, terminal_at)
+    terminal_bucket = time_bucket(db, terminal_at, hourly)
+    mttr_rows = (
+        filtered.outerjoin(terminal_logs, terminal_logs.c.target_id == cast(Alert.id, String))
+        .filter(Alert.status.in_(TERMINAL_STATUS_VALUES), elapsed >= 0)
+        .with_entities(terminal_bucket, func.sum(elapsed), func.count(Alert.id))
+        .group_by(terminal_bucket)
+        .all()
+    )
+    bucket_mttr = {label: (float(seconds or 0), count) for label, seconds, count in mttr_rows}
+    mttr_count = sum(count for _, count in bucket_mttr.values())
+    avg_mttr = sum(seconds for seconds, _ in bucket_mttr.values()) / mttr_count if mttr_count else None
+
     trend_data = []
     curr = start_dt
     while curr < end_dt:
-        step_end = curr + delta
         step_label = curr.strftime(fmt)
-        
-        step_alerts = [a for a in all_alerts if curr <= a.created_at < step_end]
-        
-        counts = {s: 0 for s in COMPACT_STATUS_LABELS.keys()}
-        for a in step_alerts:
-            status = _compact_status(a.status)
-            if status in counts:
-                counts[status] += 1
-        
-        # 该步长内的效能指标：按完成处置时间归桶，而不是按告警创建时间归桶。
-        s_mttr = []
-        for a in all_alerts:
-            if _compact_status(a.status) not in TERMINAL_STATUSES:
-                continue
-            tt = terminal_logs.get(str(a.id))
-            if not tt:
-                tt = a.updated_at
-            if tt and curr <= tt < step_end:
-                diff = (tt - a.created_at).total_seconds()
-                if diff >= 0: s_mttr.append(diff)
-        
+        counts = bucket_counts.get(step_label, {})
+        seconds, count = bucket_mttr.get(step_label, (0.0, 0))
         trend_data.append({
             "time": step_label,
-            "total": len(step_alerts),
-            **{s: counts[s] for s in COMPACT_STATUS_LABELS.keys()},
-            "mttr": sum(s_mttr) / len(s_mttr) if s_mttr else None,
-            "mttr_count": len(s_mttr),
+            "total": counts.get("total", 0),
+            **{s: counts.get(s, 0) for s in COMPACT_STATUS_LABELS.keys()},
+            "mttr": seconds / count if count else None,
+            "mttr_count": count,
         })
-        curr = step_end
+        curr += delta
 
     latest = [
         {
             "id": row.id,
-            "alert_code": _alert_code_map(db, user, [row]).get(row.id, ""),
+            "alert_code": row.alert_code,
             "alert_hash": row.alert_hash,
             "source_ip": row.source_ip,
             "destination_ip": row.destination_ip,
@@ -215,7 +192,7 @@ def dashboard_summary(
         "pending": pending,
         "confirmed": confirmed,
         "avg_mttr": avg_mttr,
-        "mttr_count": len(mttr_samples),
+        "mttr_count": mttr_count,
         "by_status": by_status,
         "trend": trend_data,
         "latest": latest,
@@ -393,34 +370,7 @@ def import_ip_list_items(payload: dict[str, Any], db: Session = Depends(get_db),
     if not values:
         raise HTTPException(status_code=400, detail="请输入要导入的 IP")
 
-    row = get_ip_list_setting(db, user.workspace_id)
-    current = normalize_value(row.value)
-    existing = {(item["list_type"], item["value"]) for item in current["items"]}
-    added = 0
-    skipped = 0
-    invalid: list[dict[str, str]] = []
-
-    for value in values:
-        try:
-            value_type = detect_value_type(value)
-            key = (list_type, value)
-            if key in existing:
-                skipped += 1
-                continue
-            item = {
-                "list_type": list_type,
-                "value": value,
-                "value_type": value_type,
-                "description": description,
-                "source": "import",
-            }
-            _, created_item, _ = add_ip_list_item(db, user, item)
-            existing.add(key)
-            added += 1
-        except ValueError as exc:
-            invalid.append({"value": value, "error": str(exc)})
-
-    row = get_ip_list_setting(db, user.workspace_id)
+    row, added, skipped, invalid = import_ip_list_values(db, user, list_type, values, description=description)
     write_audit(
         db,
         user,
@@ -443,12 +393,11 @@ def check_ip_list(payload: dict[str, str], db: Session = Depends(get_db), user:
     if not ip:
         raise HTTPException(status_code=400, detail="请输入 IP")
     row = get_ip_list_setting(db, user.workspace_id)
-    value = row.value or {"whitelist": [], "blacklist": []}
+    indexes = get_ip_list_index(db, user.workspace_id, row)
     matches = []
     for list_name, label in (("whitelist", "白名单"), ("blacklist", "黑名单")):
-        for item in value.get(list_name, []):
-            if is_ip_in_list(ip, [item]):
-                matches.append({"list": list_name, "label": label, "range": item})
+        for item in indexes[list_name].match(ip):
+            matches.append({"list": list_name, "label": label, "range": item})
     return {"ip": ip, "matched": bool(matches), "matches": matches}
 
 
@@ -479,25 +428,7 @@ def export_ip_lists(type: str = "all", db: Session = Depends(get_db), user: User
     )
 
 
-def _alert_code_map(db: Session, user: User, alerts: list[Alert]) -> dict[int, str]:
-    days = {alert.created_at.date() for alert in alerts if alert.created_at}
-    codes: dict[int, str] = {}
-    for day in days:
-        start = datetime.combine(day, datetime.min.time())
-        end = start + timedelta(days=1)
-        rows = (
-            db.query(Alert.id, Alert.created_at)
-            .filter(Alert.workspace_id == user.workspace_id, Alert.created_at >= start, Alert.created_at < end)
-            .order_by(Alert.created_at.asc(), Alert.id.asc())
-            .all()
-        )
-        prefix = day.strftime("%Y%m%d")
-        for index, row in enumerate(rows, start=1):
-            codes[row.id] = f"{prefix}{index:04d}"
-    return codes
-
-
-def _csv_columns(template: Template | None) -> list[tuple[str, str]]:
+def _export_columns(template: Template | None) -> list[tuple[str, str]]:
     if not template:
         return [
             ("创建时间", "created_at"),
@@ -535,162 +466,57 @@ def re_template_column(part: str) -> tuple[str, str] | None:
     return None
 
 
-def _alert_export_context(
-    db: Session,
-    alert: Alert,
-    alert_code: str,
-    users: dict[int, User],
-    projects: dict[int, Project],
-    devices: dict[int, Device],
-    all_rules: list[ParseRule],
-) -> dict[str, Any]:
-    data = dict(alert.parsed_fields or {})
-    block_device_names = [devices[item].name for item in (alert.block_device_ids or []) if item in devices]
-    response_owner_name = users.get(alert.response_owner_id).display_name if users.get(alert.response_owner_id) else ""
-    reported_by_name = alert.reported_by_name or (users.get(alert.created_by_id).display_name if users.get(alert.created_by_id) else "")
-    alert_time = str(data.get("告警时间") or data.get("alert_time") or (alert.created_at.isoformat(sep=" ", timespec="seconds") if alert.created_at else ""))
-    device_name = devices.get(alert.device_id).name if devices.get(alert.device_id) else "通用设备"
-    device_ip = str(data.get("告警设备IP地址") or data.get("device_ip") or "")
-    alert_name = str(data.get("告警名称") or data.get("event_name") or alert.event_type or "")
-    analysis_owner_name = users.get(alert.analysis_owner_id).display_name if users.get(alert.analysis_owner_id) else ""
-    disposal_owner_name = users.get(alert.disposal_owner_id).display_name if users.get(alert.disposal_owner_id) else ""
-    event_id = str(data.get("事件ID") or data.get("isop_event_id") or data.get("event_id") or alert.alert_hash or "")
-    source_ip = str(alert.source_ip or data.get("攻击源IP") or data.get("源IP") or data.get("src_ip") or "")
-    destination_ip = str(alert.destination_ip or data.get("攻击目的IP") or data.get("目的IP") or data.get("dst_ip") or "")
-    
-    # 建立语义化映射
-    semantic_data = {}
-    for rule in all_rules:
-        # 只处理与该告警设备匹配或通用的规则
-        if not rule.device_id or rule.device_id == alert.device_id:
-            val = data.get(rule.field_key)
-            if val is not None:
-                semantic_data[rule.name] = val
-
-    data.update(
-        {
-            "id": alert.id,
-            "alert_code": alert_code or alert.alert_code or alert.id,
-            "告警ID": alert_code or alert.alert_code or alert.id,
-            "alert_hash": alert.alert_hash,
-            "告警Hash": alert.alert_hash,
-            "created_at": alert.created_at.isoformat(sep=" ", timespec="seconds") if alert.created_at else "",
-            "创建时间": alert.created_at.isoformat(sep=" ", timespec="seconds") if alert.created_at else "",
-            "updated_at": alert.updated_at.isoformat(sep=" ", timespec="seconds") if alert.updated_at else "",
-            "更新时间": alert.updated_at.isoformat(sep=" ", timespec="seconds") if alert.updated_at else "",
-            "source_ip": source_ip,
-            "源IP": source_ip,
-            "destination_ip": destination_ip,
-            "目的IP": destination_ip,
-            "event_type": alert.event_type,
-            "事件类型": alert.event_type,
-            "status": alert.status,
-            "current_group": alert.current_group,
-            "所属组": GROUP_LABELS.get(alert.current_group, alert.current_group),
-            "created_by": users.get(alert.created_by_id).display_name if users.get(alert.created_by_id) else "",
-            "created_by_name": users.get(alert.created_by_id).display_name if users.get(alert.created_by_id) else "",
-            "last_updated_by": users.get(alert.last_updated_by_id).display_name if users.get(alert.last_updated_by_id) else "",
-            "last_updated_by_name": users.get(alert.last_updated_by_id).display_name if users.get(alert.last_updated_by_id) else "",
-            "assignee": users.get(alert.assignee_id).display_name if users.get(alert.assignee_id) else "",
-            "assignee_name": users.get(alert.assignee_id).display_name if users.get(alert.assignee_id) else "",
-            "负责人": users.get(alert.assignee_id).display_name if users.get(alert.assignee_id) else "未分配",
-            "analysis_owner": analysis_owner_name,
-            "研判负责人": analysis_owner_name,
-            "研判人员": analysis_owner_name,
-            "disposal_owner": disposal_owner_name,
-            "处置负责人": disposal_owner_name,
-            "封禁人员": disposal_owner_name,
-            "reported_by_name": reported_by_name,
-            "监测上报人员": reported_by_name,
-            "analysis_result": alert.analysis_result,
-            "研判结果": alert.analysis_result,
-            "is_emergency": "是" if alert.is_emergency else "否",
-            "是否应急": "是" if alert.is_emergency else "否",
-            "block_device_names": block_device_names,
-            "封禁位置": "、".join(block_device_names),
-            "block_at": alert.block_at.isoformat(sep=" ", timespec="seconds") if alert.block_at else "",
-            "封禁时间": alert.block_at.isoformat(sep=" ", timespec="seconds") if alert.block_at else "",
-            "response_note": alert.response_note if alert.disposal_action == "emergency" else "",
-            "处置描述": alert.response_note if alert.disposal_action == "emergency" else "",
-            "response_owner": response_owner_name if alert.disposal_action == "emergency" else "",
-            "应急人员": response_owner_name if alert.disposal_action == "emergency" else "",
-            "disposal_target": alert.disposal_target,
-            "处置对象": DISPOSAL_TARGET_LABELS.get(alert.disposal_target, alert.disposal_target),
-            "disposal_action": alert.disposal_action,
-            "处置动作": DISPOSAL_ACTION_LABELS.get(alert.disposal_action, alert.disposal_action),
-            "disposal_ip": alert.disposal_ip,
-            "处置IP": alert.disposal_ip,
-            "closure_target": alert.closure_target,
-            "闭环对象": DISPOSAL_TARGET_LABELS.get(alert.closure_target, alert.closure_target),
-            "closure_action": alert.closure_action,
-            "闭环动作": CLOSURE_ACTION_LABELS.get(alert.closure_action, alert.closure_action),
-            "false_positive_reason": alert.false_positive_reason,
-            "误报原因": alert.false_positive_reason,
-            "project_name": projects.get(alert.project_id).name if projects.get(alert.project_id) else "",
-            "项目名称": projects.get(alert.project_id).name if projects.get(alert.project_id) else "",
-            "device_name": device_name,
-            "设备名称": device_name,
-            "status_label": STATUS_LABELS.get(alert.status, alert.status),
-            "状态": STATUS_LABELS.get(alert.status, alert.status),
-            "当前日期": alert.created_at.strftime("%Y-%m-%d") if alert.created_at else "",
-            "当前时间": alert.created_at.strftime("%Y-%m-%d %H:%M:%S") if alert.created_at else "",
-            "ai_result": alert.ai_result,
-            "AI 研判结果": alert.ai_result,
-            "raw_text": alert.raw_text,
-            "原始日志": alert.raw_text,
-            "告警编号": alert_code or alert.id,
-            "事件ID": event_id,
-            "告警时间": alert_time,
-            "告警设备": device_name,
-            "告警设备IP地址": device_ip,
-            "告警名称": alert_name,
-            "攻击源IP": source_ip,
-            "攻击目的IP": destination_ip,
-        }
-    )
-    # 合并语义化数据
-    data.update(semantic_data)
-    data.update(
-        {
-            "告警编号": alert_code or alert.id,
-            "事件ID": event_id,
-            "告警时间": alert_time,
-            "告警设备": device_name,
-            "告警设备IP地址": device_ip,
-            "告警名称": alert_name,
-            "攻击源IP": source_ip,
-            "攻击目的IP": destination_ip,
-        }
-    )
-    
-    # 注入全局统计信息
+def _export_filters(start_date, end_date, status, current_group, project_id, assignee_id, q) -> dict[str, Any]:
+    return {
+        "status": status,
+        "current_group": current_group,
+        "project_id": project_id,
+        "assignee_id": assignee_id,
+        "start_dt": parse_day(start_date) if start_date else None,
+        "end_dt": parse_day(end_date, end_of_day=True) if end_date else None,
+        "q": q,
+    }
+
+
+def _export_template_columns(db: Session, user: User, template_id: int | None, template_type: str, label: str) -> list[tuple[str, str]]:
+    template = db.get(Template, template_id) if template_id else None
+    if template and (template.workspace_id != user.workspace_id or template.type != template_type):
+        raise HTTPException(status_code=400, detail=f"{label}模板不存在")
+    if template is None:
+        template = db.query(Template).filter_by(workspace_id=user.workspace_id, type=template_type, is_default=True).first()
+    return _export_columns(template)
+
+
+def _alert_export_plan(db: Session, workspace_id: int, columns: list[tuple[str, str]]) -> AlertExportPlan:
+    # 规则与统计对整次导出只取一次，编入列计划
+    rules = db.query(ParseRule).filter_by(workspace_id=workspace_id, enabled=True).all()
     try:
-        stats = get_aggregate_stats(db, alert.workspace_id)
-        data.update(stats)
+        stats = get_aggregate_stats(db, workspace_id)
     except Exception:
-        pass
-    
-    src_asset = alert.src_asset_context or data.get("src_asset_context") or {}
-    dst_asset = alert.dst_asset_context or data.get("dst_asset_context") or {}
-    data.update(
-        {
-            "src_asset_name": src_asset.get("name", ""),
-            "源资产名称": src_asset.get("name", ""),
-            "src_asset_area": src_asset.get("area", ""),
-            "源资产区域": src_asset.get("area", ""),
-            "src_asset_owner": src_asset.get("owner", ""),
-            "源资产负责人": src_asset.get("owner", ""),
-            "dst_asset_name": dst_asset.get("name", ""),
-            "目的资产名称": dst_asset.get("name", ""),
-            "dst_asset_area": dst_asset.get("area", ""),
-            "目的资产区域": dst_asset.get("area", ""),
-            "dst_asset_owner": dst_asset.get("owner", ""),
-            "目的资产负责人": dst_asset.get("owner", ""),
-            "dst_asset_criticality": dst_asset.get("criticality", ""),
-            "目的资产重要性": dst_asset.get("criticality", ""),
-        }
-    )
-    return data
+        stats = {}
+    return AlertExportPlan(columns, rules, stats)
+
+
+def _stream_alerts_csv(workspace_id: int, filters: dict[str, Any], columns: list[tuple[str, str]]):
+    # 响应体在接口返回后才开始生成，使用独立会话，不依赖请求级会话的生命周期
+    stream_db = SessionLocal()
+    try:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([label for label, _ in columns])
+        yield buffer.getvalue().encode("utf-8-sig")
+
+        plan = _alert_export_plan(stream_db, workspace_id, columns)
+        for rows in iter_alert_batches(alert_export_query(stream_db, workspace_id, filters)):
+            batch = export_batch_lookups(stream_db, workspace_id, rows)
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(plan.row(row, batch) for row in rows)
+            yield buffer.getvalue().encode("utf-8")
+            # 已写出的告警不再需要，释放会话中的对象
+            stream_db.expunge_all()
+    finally:
+        stream_db.close()
 
 
 @router.get("/exports/alerts.csv")
@@ -706,63 +532,43 @@ def export_alerts_csv(
     db: Session = Depends(get_db),
     user: User = Depends(current_user),
 ):
-    query = db.query(Alert).filter(Alert.workspace_id == user.workspace_id)
-    if status:
-        query = query.filter(Alert.status == status)
-    if current_group:
-        query = query.filter(Alert.current_group == current_group)
-    if project_id:
-        query = query.filter(Alert.project_id == project_id)
-    if assignee_id:
-        query = query.filter(Alert.assignee_id == assignee_id)
-    if start_date:
-        query = query.filter(Alert.created_at >= parse_day(start_date))
-    if end_date:
-        query = query.filter(Alert.created_at < parse_day(end_date, end_of_day=True))
-    if q:
-        like = f"%{q}%"
-        query = query.filter(
-            (Alert.alert_hash.like(like)) | (Alert.source_ip.like(like)) | (Alert.destination_ip.like(like)) | (Alert.event_type.like(like))
-        )
-    rows = query.order_by(Alert.created_at.desc()).limit(5000).all()
-    template = db.get(Template, template_id) if template_id else None
-    if template and (template.workspace_id != user.workspace_id or template.type != "csv"):
-        raise HTTPException(status_code=400, detail="CSV 模板不存在")
-    if template is None:
-        template = db.query(Template).filter_by(workspace_id=user.workspace_id, type="csv", is_default=True).first()
-    columns = _csv_columns(template)
-    codes = _alert_code_map(db, user, rows)
-    user_ids = (
-        {row.created_by_id for row in rows if row.created_by_id}
-        | {row.last_updated_by_id for row in rows if row.last_updated_by_id}
-        | {row.assignee_id for row in rows if row.assignee_id}
-        | {row.analysis_owner_id for row in rows if row.analysis_owner_id}
-        | {row.disposal_owner_id for row in rows if row.disposal_owner_id}
-        | {row.response_owner_id for row in rows if row.response_owner_id}
-    )
-    users = {row.id: row for row in db.query(User).filter(User.id.in_(user_ids)).all()} if user_ids else {}
-    project_ids = {row.project_id for row in rows if row.project_id}
-    projects = {row.id: row for row in db.query(Project).filter(Project.id.in_(project_ids)).all()} if project_ids else {}
-    device_ids = {row.device_id for row in rows if row.device_id} | {device_id for row in rows for device_id in (row.block_device_ids or []) if device_id}
-    devices = {row.id: row for row in db.query(Device).filter(Device.id.in_(device_ids)).all()} if device_ids else {}
-    
-    # 预先获取所有规则，用于语义化映射
-    all_workspace_rules = db.query(ParseRule).filter_by(workspace_id=user.workspace_id, enabled=True).all()
-    
-    buffer = io.StringIO()
-    writer = csv.writer(buffer)
-    writer.writerow([label for label, _ in columns])
-    for row in rows:
-        context = _alert_export_context(db, row, codes.get(row.id, ""), users, projects, devices, all_workspace_rules)
-        writer.writerow([render_template(f"{{{{{key}}}}}", context) for _, key in columns])
-    buffer.seek(0)
+    """按筛选条件流式导出全部告警（不设条数上限），分批查询、逐批写出，内存占用恒定。"""
+    filters = _export_filters(start_date, end_date, status, current_group, project_id, assignee_id, q)
+    columns = _export_template_columns(db, user, template_id, "csv", "CSV ")
     return StreamingResponse(
-        iter([buffer.getvalue().encode("utf-8-sig")]),
+        _stream_alerts_csv(user.workspace_id, filters, columns),
         media_type="text/csv",
         headers={"Content-Disposition": "attachment; filename=alerts.csv"},
     )
 
 
+@router.get("/exports/alerts.xlsx")
+def export_alerts_xlsx(
+    start_date: str | None = None,
+    end_date: str | None = None,
+    status: str | None = None,
+    current_group: str | None = None,
+    project_id: int | None = None,
+    assignee_id: int | None = None,
+    q: str | None = None,
+    template_id: int | None = None,
+    db: Session = Depends(get_db),
+    user: User = Depends(current_user),
+):
+    """按 Excel 模板导出告警：分批读取，逐行写入 write-only 工作簿，成品经临时文件分块返回。"""
+    filters = _export_filters(start_date, end_date, status, current_group, project_id, assignee_id, q)
+    columns = _export_template_columns(db, user, template_id, "excel", "Excel ")
+    plan = _alert_export_plan(db, user.workspace_id, columns)
+    wb = write_only_workbook()
+    ws = wb.create_sheet("告警")
+    ws.append(plan.labels)
+    for rows in iter_alert_batches(alert_export_query(db, user.workspace_id, filters)):
+        batch = export_batch_lookups(db, user.workspace_id, rows)
+        for row in rows:
+            ws.append([cell_value(value) for value in plan.row(row, batch)])
+    return xlsx_response(save_workbook(wb), "alerts.xlsx")
+
+
 @router.post("/webhook/test")
 def test_webhook(payload: WebhookTestRequest, db: Session = Depends(get_db), user: User = Depends(require_not_viewer)):
     return _send_webhook_text(payload, db, user, "webhook.test")
@@ -828,6 +634,16 @@ def list_tasks(
     return [_task_out(row, users) for row in rows]
 
 
+@router.get("/tasks/{task_id}", response_model=TaskRecordOut)
+def get_task(task_id: int, db: Session = Depends(get_db), user: User = Depends(current_user)):
+    """查询异步任务状态，供前端轮询 queued → running → success/failed。"""
+    row = db.get(TaskRecord, task_id)
+    if not row or row.workspace_id != user.workspace_id or (row.actor_id != user.id and not has_role(user, "admin")):
+        raise HTTPException(status_code=404, detail="任务记录不存在")
+    users = _task_user_map(db, [row.actor_id] if row.actor_id else [])
+    return _task_out(row, users)
+
+
 @router.get("/exports/tasks.csv")
 def export_tasks_csv(
     status: str | None = None,
@@ -17,7 +17,7 @@ from app.models.bootstrap import get_effective_setting
 from app.models.database import get_db
 from app.models.entities import AiRun, Alert, Device, PluginAccessToken, Template, User
 from app.services.ai_service import investigate_threat
-from app.services.alert_service import create_alert, normalize_alert_fields
+from app.services.alert_service import assign_alert_code, create_alert, normalize_alert_fields
 from app.services.parser_service import parse_text_for_user
 from app.services.task_service import create_task, fail_task, finish_task
 from app.services.audit_service import write_audit
@@ -328,6 +328,7 @@ def plugin_investigate(payload: dict[str, Any], db: Session = Depends(get_db), u
     normalize_alert_fields(alert)
     if not alert.alert_hash:
         alert.alert_hash = f"plugin-{alert.id}"
+    assign_alert_code(db, alert)
     run = AiRun(
         workspace_id=user.workspace_id,
         actor_id=user.id,
@@ -9,7 +9,7 @@ import re
 from app.models.entities import Setting
 from app.schemas.common import RegexTestRequest, RuleCreate, RuleGenerateRequest, RuleOut, RuleTestRequest, RuleUpdate
 from app.services.ai_gateway import generate_regex, generate_match_regex
-from app.services.parser_service import generate_candidate_rules, parse_text_for_user
+from app.services.parser_service import generate_candidate_rules, invalidate_rule_set, parse_text_for_user
 
 router = APIRouter(prefix="/rules", tags=["rules"])
 
@@ -27,6 +27,7 @@ def create_rule(payload: RuleCreate, db: Session = Depends(get_db), user: User =
     rule = ParseRule(workspace_id=user.workspace_id, **payload.model_dump())
     db.add(rule)
     db.commit()
+    invalidate_rule_set(user.workspace_id)
     db.refresh(rule)
     return rule
 
@@ -53,6 +54,7 @@ def update_rule(rule_id: int, payload: RuleUpdate, db: Session = Depends(get_db)
     for key, value in data.items():
         setattr(rule, key, value)
     db.commit()
+    invalidate_rule_set(user.workspace_id)
     db.refresh(rule)
     return rule
 
@@ -66,6 +68,7 @@ def delete_rule(rule_id: int, db: Session = Depends(get_db), user: User = Depend
         raise HTTPException(status_code=400, detail="元规则不可删除")
     db.delete(rule)
     db.commit()
+    invalidate_rule_set(user.workspace_id)
     return {"ok": True}
 
 
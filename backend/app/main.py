@@ -68,6 +68,10 @@ def create_app() -> FastAPI:
         finally:
             db.close()
 
+        # inline 模式下由 API 进程续约、回收过期租约并领取遗留的排队任务
+        from app.services.task_service import start_inline_supervisor
+        start_inline_supervisor()
+
     @app.get("/healthz")
     def healthz():
         from app.core.startup import check_database_connectivity
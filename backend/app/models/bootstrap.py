@@ -28,7 +28,7 @@ def _ensure_alert_columns(db: Session) -> None:
     
     if dialect == "sqlite":
         table_columns = {}
-        for table in ("alerts", "templates", "parse_rules", "settings", "devices", "users"):
+        for table in ("alerts", "templates", "parse_rules", "settings", "devices", "users", "task_records"):
             rows = db.execute(text(f"PRAGMA table_info({table})")).fetchall()
             table_columns[table] = {row[1] for row in rows}
         
@@ -64,6 +64,7 @@ def _ensure_alert_columns(db: Session) -> None:
             ("closure_action", "VARCHAR(60) DEFAULT '' NOT NULL"),
             ("false_positive_reason", "TEXT DEFAULT '' NOT NULL"),
             ("version", "INTEGER DEFAULT 1 NOT NULL"),
+            ("alert_code", "VARCHAR(20) DEFAULT '' NOT NULL"),
         ]:
             if col not in alert_columns:
                 db.execute(text(f"ALTER TABLE alerts ADD COLUMN {col} {col_type}"))
@@ -83,6 +84,14 @@ def _ensure_alert_columns(db: Session) -> None:
             db.execute(text("ALTER TABLE settings ADD COLUMN user_id INTEGER"))
         if "roles" not in table_columns.get("users", {}):
             db.execute(text("ALTER TABLE users ADD COLUMN roles JSON DEFAULT '[]' NOT NULL"))
+        task_columns = table_columns.get("task_records", {})
+        for col, col_type in [
+            ("locked_by", "VARCHAR(120) DEFAULT '' NOT NULL"),
+            ("lease_expires_at", "DATETIME"),
+            ("attempts", "INTEGER DEFAULT 0 NOT NULL"),
+        ]:
+            if col not in task_columns:
+                db.execute(text(f"ALTER TABLE task_records ADD COLUMN {col} {col_type}"))
     else:
         # PostgreSQL
         for table, col, col_type in [
@@ -110,6 +119,7 @@ def _ensure_alert_columns(db: Session) -> None:
             ("alerts", "closure_action", "VARCHAR(40) DEFAULT '' NOT NULL"),
             ("alerts", "false_positive_reason", "TEXT DEFAULT '' NOT NULL"),
             ("alerts", "version", "INTEGER DEFAULT 1 NOT NULL"),
+            ("alerts", "alert_code", "VARCHAR(20) DEFAULT '' NOT NULL"),
             ("devices", "device_role", "VARCHAR(40) DEFAULT 'monitor' NOT NULL"),
             ("devices", "browser_assistant_enabled", "BOOLEAN DEFAULT TRUE NOT NULL"),
             ("devices", "browser_url_patterns", "JSON DEFAULT '[\"http://*/*\",\"https://*/*\"]'::json NOT NULL"),
@@ -117,7 +127,10 @@ def _ensure_alert_columns(db: Session) -> None:
             ("parse_rules", "is_meta", "BOOLEAN DEFAULT FALSE NOT NULL"),
             ("parse_rules", "match_all", "BOOLEAN DEFAULT FALSE NOT NULL"),
             ("settings", "user_id", "INTEGER"),
-            ("users", "roles", "JSON DEFAULT '[]'::json NOT NULL")
+            ("users", "roles", "JSON DEFAULT '[]'::json NOT NULL"),
+            ("task_records", "locked_by", "VARCHAR(120) DEFAULT '' NOT NULL"),
+            ("task_records", "lease_expires_at", "TIMESTAMP"),
+            ("task_records", "attempts", "INTEGER DEFAULT 0 NOT NULL"),
         ]:
             check_sql = text(f"""
                 SELECT count(*) FROM information_schema.columns 
@@ -176,6 +189,12 @@ def _backfill_alert_dedup_hashes(db: Session) -> None:
             row.alert_hash = generate_unique_alert_hash(db, row.workspace_id, row.id)
 
 
+def _backfill_alert_codes(db: Session) -> None:
+    from app.services.alert_service import backfill_alert_codes
+
+    backfill_alert_codes(db)
+
+
 def _backfill_alert_workflow_fields(db: Session) -> None:
     rows = db.query(Alert).all()
     for row in rows:
@@ -1136,8 +1155,25 @@ def _ensure_message_columns(db: Session) -> None:
                     pass
 
 
+def _ensure_alert_indexes(db: Session) -> None:
+    # create_all 不会给已存在的表补索引；SQLite 与 PostgreSQL 均支持 IF NOT EXISTS
+    for name, cols in [
+        ("ix_alerts_workspace_created_id", "workspace_id, created_at, id"),
+        ("ix_alerts_workspace_code", "workspace_id, alert_code"),
+    ]:
+        db.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON alerts ({cols})"))
+
+
+def _ensure_search_indexes(db: Session) -> None:
+    from app.services.search_service import ensure_search_indexes
+
+    ensure_search_indexes(db)
+
+
 def bootstrap_defaults(db: Session) -> None:
     _ensure_alert_columns(db)
+    _ensure_alert_indexes(db)
+    _ensure_search_indexes(db)
     _ensure_message_columns(db)
     _ensure_asset_constraints(db)
     settings = get_settings()
@@ -1208,9 +1244,11 @@ def bootstrap_defaults(db: Session) -> None:
     _ensure_security_tracking_template(db, workspace)
     _backfill_alert_dedup_hashes(db)
     _backfill_alert_workflow_fields(db)
+    _backfill_alert_codes(db)
     if settings.enable_demo_data:
         _ensure_demo_data(db, workspace, user, settings)
         _backfill_alert_dedup_hashes(db)
         _backfill_alert_workflow_fields(db)
+        _backfill_alert_codes(db)
 
     db.commit()
@@ -120,6 +120,8 @@ class Alert(Base, TimestampMixin):
         Index("ix_alerts_workspace_group", "workspace_id", "current_group"),
         Index("ix_alerts_workspace_assignee", "workspace_id", "assignee_id"),
         Index("ix_alerts_workspace_created", "workspace_id", "created_at"),
+        Index("ix_alerts_workspace_created_id", "workspace_id", "created_at", "id"),
+        Index("ix_alerts_workspace_code", "workspace_id", "alert_code"),
         Index("ix_alerts_workspace_status_group", "workspace_id", "status", "current_group"),
     )
 
@@ -133,6 +135,8 @@ class Alert(Base, TimestampMixin):
     dst_asset_context: Mapped[dict] = mapped_column(JSON, default=dict, nullable=False)
     source_context: Mapped[dict] = mapped_column(JSON, default=dict, nullable=False)
     alert_hash: Mapped[str] = mapped_column(String(64), default="", nullable=False, index=True)
+    # 告警编号：创建日期 + 当日序号（如 202610170001），入库时由 alert_code_counters 分配
+    alert_code: Mapped[str] = mapped_column(String(20), default="", nullable=False)
     ti_result: Mapped[dict] = mapped_column(JSON, default=dict, nullable=False)
     ai_result: Mapped[str] = mapped_column(Text, default="", nullable=False)
     source_ip: Mapped[str] = mapped_column(String(80), default="", nullable=False, index=True)
@@ -264,6 +268,10 @@ class TaskRecord(Base, TimestampMixin):
     input: Mapped[dict] = mapped_column(JSON, default=dict, nullable=False)
     output: Mapped[dict] = mapped_column(JSON, default=dict, nullable=False)
     error: Mapped[str] = mapped_column(Text, default="", nullable=False)
+    # Worker 领取信息：执行者标识、租约到期时间（UTC）与已尝试次数，租约过期的任务会被重新排队
+    locked_by: Mapped[str] = mapped_column(String(120), default="", nullable=False)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, index=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
 
 
 class AiPrompt(Base, TimestampMixin):
@@ -372,3 +380,27 @@ class PluginAccessToken(Base, TimestampMixin):
     expires_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     revoked_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     last_used_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class AlertCodeCounter(Base):
+    """每个工作区每天的告警编号计数器，以单条 UPSERT 自增保证并发入库不重号。"""
+    __tablename__ = "alert_code_counters"
+    __table_args__ = (UniqueConstraint("workspace_id", "day", name="uq_alert_code_counter_workspace_day"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    workspace_id: Mapped[int] = mapped_column(ForeignKey("workspaces.id"), nullable=False)
+    day: Mapped[str] = mapped_column(String(8), nullable=False)
+    value: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class ThreatIntelCache(Base, TimestampMixin):
+    __tablename__ = "threat_intel_cache"
+    __table_args__ = (UniqueConstraint("provider", "ip", name="uq_threat_intel_cache_provider_ip"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    provider: Mapped[str] = mapped_column(String(40), nullable=False, index=True)
+    ip: Mapped[str] = mapped_column(String(80), nullable=False, index=True)
+    verdict: Mapped[str] = mapped_column(String(20), default="clean", nullable=False, index=True)
+    result: Mapped[dict] = mapped_column(JSON, default=dict, nullable=False)
+    fetched_at: Mapped[datetime] = mapped_column(DateTime, default=now, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, default=now, nullable=False, index=True)
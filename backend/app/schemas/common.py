@@ -234,6 +234,28 @@ class ParseResponse(BaseModel):
     asset_context: dict[str, Any] = {}
 
 
+class ParseBatchRequest(BaseModel):
+    texts: list[str]
+    device_id: int | None = None
+    template_id: int | None = None
+    message_template_id: int | None = None
+    excel_template_id: int | None = None
+
+
+class ParseBatchItem(BaseModel):
+    index: int
+    ok: bool = True
+    error: str = ""
+    result: ParseResponse | None = None
+
+
+class ParseBatchResponse(BaseModel):
+    total: int
+    succeeded: int
+    failed: int
+    items: list[ParseBatchItem]
+
+
 class AlertCreate(BaseModel):
     raw_text: str
     parsed_fields: dict[str, Any] = {}
@@ -253,6 +275,37 @@ class AlertUpdate(BaseModel):
     version: int | None = None
 
 
+class AlertListItem(OrmModel):
+    """告警列表项：只含列表视图所需的列，原文、解析字段、情报与研判结果从详情接口获取。"""
+    id: int
+    alert_code: str = ""
+    alert_hash: str = ""
+    project_id: int | None
+    device_id: int | None
+    source_ip: str
+    destination_ip: str
+    event_type: str
+    severity: str
+    status: str
+    current_group: str = "analysis"
+    assignee_id: int | None
+    claimed_at: datetime | None = None
+    analysis_owner_id: int | None = None
+    disposal_owner_id: int | None = None
+    reported_by_name: str = ""
+    analysis_result: str = ""
+    is_emergency: bool = False
+    disposal_target: str = ""
+    disposal_action: str = ""
+    closure_target: str = ""
+    closure_action: str = ""
+    version: int = 1
+    created_by_id: int | None
+    last_updated_by_id: int | None
+    created_at: datetime
+    updated_at: datetime
+
+
 class AlertOut(OrmModel):
     id: int
     alert_code: str = ""
@@ -324,6 +377,10 @@ class AlertTransitionRequest(BaseModel):
     version: int | None = None
 
 
+class AlertTiBatchRequest(BaseModel):
+    ids: list[int]
+
+
 class AlertBatchTransitionRequest(BaseModel):
     ids: list[int]
     status: str
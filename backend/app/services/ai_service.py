@@ -1322,7 +1322,7 @@ def _alert_payload(row: Alert | None) -> dict[str, Any] | None:
     if not row:
         return None
     return {
-        "alert_code": getattr(row, "alert_code", row.id),
+        "alert_code": row.alert_code or row.id,
         "alert_hash": row.alert_hash,
         "event_type": row.event_type,
         "src_ip": row.source_ip,
@@ -1491,13 +1491,15 @@ def run_chat_tools(db: Session, user: User, question: str, plan: dict[str, Any]
             rows = query.order_by(AssetSegment.updated_at.desc()).limit(20).all()
             results.append({"tool": tool, "params": params, "data": [{"segment": r.segment, "name": r.name, "area": r.area, "owner": r.owner, "criticality": r.criticality} for r in rows]})
         elif tool == "lookup_assets_batch":
-            from app.services.asset_service import build_asset_context, lookup_asset_by_ip, lookup_asset_by_domain
+            from app.services.asset_service import resolve_many
             ips = params.get("ips") or []
             if isinstance(ips, str): ips = [ips]
             domains = params.get("domains") or []
             if isinstance(domains, str): domains = [domains]
-            by_ip = {ip: build_asset_context(lookup_asset_by_ip(db, user.workspace_id, ip)) for ip in ips[:20]}
-            by_domain = {dom: build_asset_context(lookup_asset_by_domain(db, user.workspace_id, dom)) for dom in domains[:20]}
+            ip_contexts = resolve_many(db, user.workspace_id, "ip", [str(ip) for ip in ips[:20]])
+            domain_contexts = resolve_many(db, user.workspace_id, "domain", [str(dom) for dom in domains[:20]])
+            by_ip = {ip: ip_contexts.get(str(ip).strip(), {}) for ip in ips[:20]}
+            by_domain = {dom: domain_contexts.get(str(dom).strip(), {}) for dom in domains[:20]}
             results.append({"tool": tool, "params": params, "data": {"ips": {k: v for k, v in by_ip.items() if v}, "domains": {k: v for k, v in by_domain.items() if v}}})
         elif tool == "get_alert_history":
             alert_id = params.get("alert_id")
@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import ipaddress
 import json
 import re
 from datetime import datetime, timedelta
@@ -27,7 +26,8 @@ from app.models.entities import (
     Template,
     User,
 )
-from app.services.asset_service import lookup_asset_by_segment
+from app.services.asset_service import lookup_asset_by_segment, resolve_asset_row
+from app.services.search_service import relevance_order, search_alerts
 from app.services.workflow_constants import GROUP_LABELS, ROLE_LABELS, STATUS_LABELS, DISPOSAL_ACTION_LABELS, DISPOSAL_TARGET_LABELS, CLOSURE_ACTION_LABELS
 
 
@@ -223,7 +223,7 @@ def _alert_payload(db: Session, row: Alert | None, detail: bool = False) -> dict
     if not row:
         return None
     data = {
-        "alert_code": getattr(row, "alert_code", row.id),
+        "alert_code": row.alert_code or row.id,
         "alert_hash": row.alert_hash,
         "event_type": row.event_type,
         "src_ip": row.source_ip,
@@ -259,46 +259,22 @@ def _alert_payload(db: Session, row: Alert | None, detail: bool = False) -> dict
 
 
 def _query_alerts(db: Session, workspace_id: int, q: str | None = None):
-    rows = db.query(Alert).filter(Alert.workspace_id == workspace_id)
-    if q:
-        # 检查 q 是否看起来像 IP 地址
-        is_ip = False
-        try:
-            ipaddress.ip_address(q)
-            is_ip = True
-        except ValueError:
-            pass
-
-        if is_ip:
-            rows = rows.filter(
-                or_(
-                    Alert.source_ip == q,
-                    Alert.destination_ip == q,
-                )
-            )
-        else:
-            rows = rows.filter(
-                or_(
-                    _like(Alert.alert_hash, q),
-                    _like(Alert.event_type, q),
-                    _like(Alert.source_ip, q),
-                    _like(Alert.destination_ip, q),
-                    _like(Alert.status, q),
-                    _like(Alert.severity, q),
-                )
-            )
-    return rows
+    # 返回 (查询, 相关度)；完整 IP 精确匹配源/目的 IP，其余走全文检索。
+    # 模型常直接用状态或级别取值（如 high、analysis）搜索，这些词另按 status/severity 精确匹配，可走 B-tree 索引
+    term = (q or "").strip().lower()
+    extra = or_(Alert.status == term, Alert.severity == term) if term else None
+    return search_alerts(db.query(Alert).filter(Alert.workspace_id == workspace_id), q, extra=extra)
 
 
 def asset_get_by_ip(db: Session, user: User, params: dict[str, Any]) -> dict[str, Any]:
     ip = str(params.get("ip") or "").strip()
-    row = db.query(Asset).filter(Asset.workspace_id == user.workspace_id, Asset.ip == ip).order_by(Asset.updated_at.desc()).first()
+    row = resolve_asset_row(db, user.workspace_id, "ip", ip)
     return _evidence("asset.get_by_ip", "L1", "success" if row else "empty", "命中资产 1 条" if row else f"未命中资产：{ip}", _asset_payload(db, row))
 
 
 def asset_get_by_domain(db: Session, user: User, params: dict[str, Any]) -> dict[str, Any]:
     domain = str(params.get("domain") or "").strip()
-    row = db.query(Asset).filter(Asset.workspace_id == user.workspace_id, Asset.domain == domain).order_by(Asset.updated_at.desc()).first()
+    row = resolve_asset_row(db, user.workspace_id, "domain", domain)
     return _evidence("asset.get_by_domain", "L1", "success" if row else "empty", "命中资产 1 条" if row else f"未命中资产：{domain}", _asset_payload(db, row))
 
 
@@ -387,7 +363,7 @@ def alert_search(db: Session, user: User, params: dict[str, Any]) -> dict[str, A
     event_type = str(params.get("event_type") or "").strip()
     date_from = _parse_dt(params.get("date_from"))
     date_to = _parse_dt(params.get("date_to"), end_of_day=True)
-    rows = _query_alerts(db, user.workspace_id, q)
+    rows, rank = _query_alerts(db, user.workspace_id, q)
     if ip:
         if ip_match == "source":
             rows = rows.filter(Alert.source_ip == ip)
@@ -409,7 +385,7 @@ def alert_search(db: Session, user: User, params: dict[str, Any]) -> dict[str, A
         rows = rows.filter(Alert.created_at >= date_from)
     if date_to:
         rows = rows.filter(Alert.created_at < date_to)
-    results = rows.order_by(Alert.updated_at.desc()).limit(20).all()
+    results = rows.order_by(*relevance_order(rank, Alert.updated_at.desc())).limit(20).all()
     filters = {k: v for k, v in {"q": q, "src_ip": src_ip, "dst_ip": dst_ip, "ip": ip, "ip_match": ip_match, "status": status, "severity": severity, "event_type": event_type, "date_from": params.get("date_from"), "date_to": params.get("date_to")}.items() if v}
     total = rows.count()
     
@@ -647,9 +623,9 @@ def ti_lookup_ip(db: Session, user: User, params: dict[str, Any]) -> dict[str, A
     if not cfg:
         return _evidence("ti.lookup_ip", "L2", "empty", "威胁情报未配置", {"ip": ip, "ip_role": ip_role})
     try:
-        from core.ti_service import _query_ip
+        from app.services.ti_cache_service import query_ip_cached
 
-        result = _query_ip(ip, cfg)
+        result = query_ip_cached(db, ip, cfg)
         return _evidence("ti.lookup_ip", "L2", "success" if result else "empty", f"完成 {ip_role} ({ip}) 威胁情报查询", {"ip": ip, "ip_role": ip_role, "result": result or {}})
     except Exception as exc:
         return _evidence("ti.lookup_ip", "L2", "error", f"威胁情报查询失败：{exc}", {"ip": ip, "ip_role": ip_role})
@@ -662,7 +638,7 @@ def intel_ip_report(db: Session, user: User, params: dict[str, Any]) -> dict[str
         return _evidence("intel.ip_report", "L2", "error", "请提供 IP 地址", {"ip_role": ip_role})
     
     # 1. 资产信息
-    asset = db.query(Asset).filter(Asset.workspace_id == user.workspace_id, Asset.ip == ip).first()
+    asset = resolve_asset_row(db, user.workspace_id, "ip", ip)
     # 2. 最近告警 (5条)
     alerts = db.query(Alert).filter(Alert.workspace_id == user.workspace_id, or_(Alert.source_ip == ip, Alert.destination_ip == ip)).order_by(Alert.created_at.desc()).limit(5).all()
     # 3. 最近审计 (5条)
@@ -672,8 +648,8 @@ def intel_ip_report(db: Session, user: User, params: dict[str, Any]) -> dict[str
     cfg = get_effective_setting(db, user.workspace_id, user.id, "ti")
     if cfg:
         try:
-            from core.ti_service import _query_ip
-            ti = _query_ip(ip, cfg) or {}
+            from app.services.ti_cache_service import query_ip_cached
+            ti = query_ip_cached(db, ip, cfg) or {}
         except Exception: pass
 
     report = {
@@ -724,7 +700,8 @@ def log_raw_grep(db: Session, user: User, params: dict[str, Any]) -> dict[str, A
     if not q or len(q) < 3:
         return _evidence("log.raw_grep", "L2", "error", "搜索词过短（至少3个字符）", {})
     
-    rows = db.query(Alert).filter(Alert.workspace_id == user.workspace_id, Alert.raw_text.ilike(f"%{q}%")).order_by(Alert.created_at.desc()).limit(10).all()
+    query, rank = search_alerts(db.query(Alert).filter(Alert.workspace_id == user.workspace_id), q, group="raw")
+    rows = query.order_by(*relevance_order(rank, Alert.created_at.desc())).limit(10).all()
     items = []
     for r in rows:
         items.append({
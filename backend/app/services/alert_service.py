@@ -1,12 +1,15 @@
 import hashlib
 import json
 import secrets
+from datetime import datetime
 from typing import Any
 
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
 
 from app.core.timezone import now
-from app.models.entities import Alert, User
+from app.models.entities import Alert, AlertCodeCounter, User
 from app.services.workflow_constants import GROUP_ANALYSIS, STATUS_ANALYSIS
 
 DEDUP_IGNORED_FIELDS = {
@@ -55,6 +58,101 @@ def generate_unique_alert_hash(db: Session, workspace_id: int, alert_id: int) ->
     return hashlib.sha256(f"{workspace_id}:{alert_id}:{secrets.token_hex(32)}".encode("utf-8")).hexdigest()
 
 
+def _counter_insert(db: Session):
+    dialect = db.bind.dialect.name if db.bind else "sqlite"
+    return (postgresql if dialect == "postgresql" else sqlite).insert(AlertCodeCounter)
+
+
+def next_alert_code(db: Session, workspace_id: int, created_at: datetime) -> str:
+    """
+    分配告警编号（日期 + 4 位当日序号）。计数器以单条 INSERT ... ON CONFLICT DO UPDATE 自增，
+    并发入库时由数据库行锁串行化；事务回滚时序号一并回滚。
+    """
+    day = created_at.strftime("%Y%m%d")
+    stmt = _counter_insert(db).values(workspace_id=workspace_id, day=day, value=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AlertCodeCounter.workspace_id, AlertCodeCounter.day],
+        set_={"value": AlertCodeCounter.value + 1},
+    ).returning(AlertCodeCounter.value)
+    value = db.execute(stmt).scalar_one()
+    return f"{day}{value:04d}"
+
+
+def assign_alert_code(db: Session, alert: Alert) -> str:
+    if not alert.alert_code:
+        alert.alert_code = next_alert_code(db, alert.workspace_id, alert.created_at or now(db, alert.workspace_id))
+    return alert.alert_code
+
+
+def backfill_alert_codes(db: Session, batch_size: int = 5000) -> int:
+    """
+    为尚无编号的告警补齐编号：按工作区、日期内 (created_at, id) 顺序续接当日计数器，
+    与旧版按当日排名计算的编号保持一致。返回补齐条数。
+    """
+    pending = (
+        db.query(Alert.id, Alert.workspace_id, Alert.created_at)
+        .filter(Alert.alert_code == "")
+        .order_by(Alert.workspace_id.asc(), Alert.created_at.asc(), Alert.id.asc())
+        .all()
+    )
+    if not pending:
+        return 0
+    counters: dict[tuple[int, str], int] = {}
+    for row in db.query(AlertCodeCounter).all():
+        counters[(row.workspace_id, row.day)] = row.value
+    mappings = []
+    for row in pending:
+        day = row.created_at.strftime("%Y%m%d")
+        key = (row.workspace_id, day)
+        if key not in counters:
+            # 当日已有编号（如计数器表缺失）时从已用最大序号之后继续
+            used = (
+                db.query(func.max(Alert.alert_code))
+                .filter(Alert.workspace_id == row.workspace_id, Alert.alert_code.like(f"{day}%"))
+                .scalar()
+            )
+            counters[key] = int(used[len(day):]) if used else 0
+        counters[key] += 1
+        mappings.append({"id": row.id, "alert_code": f"{day}{counters[key]:04d}"})
+    for start in range(0, len(mappings), batch_size):
+        db.bulk_update_mappings(Alert, mappings[start:start + batch_size])
+    touched = {(row.workspace_id, row.created_at.strftime("%Y%m%d")) for row in pending}
+    for workspace_id, day in touched:
+        value = counters[(workspace_id, day)]
+        stmt = _counter_insert(db).values(workspace_id=workspace_id, day=day, value=value)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[AlertCodeCounter.workspace_id, AlertCodeCounter.day],
+                set_={"value": stmt.excluded.value},
+            )
+        )
+    db.flush()
+    return len(mappings)
+
+
+def sync_alert_code_counters(db: Session, workspace_id: int) -> None:
+    """按已有告警编号把计数器推进到当日最大序号（如还原备份后），避免新编号与还原的编号重复。"""
+    day_col = func.substr(Alert.alert_code, 1, 8)
+    rows = (
+        db.query(day_col, func.max(Alert.alert_code))
+        .filter(Alert.workspace_id == workspace_id, Alert.alert_code != "")
+        .group_by(day_col)
+        .all()
+    )
+    existing = {row.day: row for row in db.query(AlertCodeCounter).filter_by(workspace_id=workspace_id).all()}
+    for day, max_code in rows:
+        try:
+            value = int(max_code[len(day):])
+        except (TypeError, ValueError):
+            continue
+        counter = existing.get(day)
+        if counter is None:
+            db.add(AlertCodeCounter(workspace_id=workspace_id, day=day, value=value))
+        elif counter.value < value:
+            counter.value = value
+    db.flush()
+
+
 def find_duplicate_alert(db: Session, user: User, parsed_fields: dict | None, device_id: int | None = None) -> Alert | None:
     dedup_hash = alert_dedup_hash(parsed_fields, device_id)
     return (
@@ -110,6 +208,7 @@ def create_alert(db: Session, user: User, raw_text: str, parsed_fields: dict, pr
     db.flush()
     if not alert.alert_hash:
         alert.alert_hash = generate_unique_alert_hash(db, alert.workspace_id, alert.id)
+    assign_alert_code(db, alert)
     if commit:
         db.commit()
         db.refresh(alert)
@@ -0,0 +1,124 @@
+"""
+告警相关的异步任务：AI 研判、威胁情报查询（单条与批量）、Webhook 通报。
+
+接口只负责校验并入队，耗时的模型调用与外部请求由 Worker（或 inline 模式下的后台线程）执行。
+"""
+import time
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+from app.models.bootstrap import get_effective_setting
+from app.models.entities import AiRun, Alert, TaskRecord, User
+from app.services.ai_service import investigate_threat, render_v220_alert_analysis
+from app.services.audit_service import write_audit
+from app.services.task_service import register_task_handler
+
+TASK_AI_ANALYSIS = "alert.ai_analysis"
+TASK_TI_QUERY = "alert.ti_query"
+TASK_TI_QUERY_BATCH = "alert.ti_query_batch"
+TASK_WEBHOOK_SEND = "alert.webhook_send"
+
+
+def _task_alert(db: Session, task: TaskRecord) -> Alert:
+    alert = db.get(Alert, int(task.target_id)) if str(task.target_id).isdigit() else None
+    if not alert or alert.workspace_id != task.workspace_id:
+        raise RuntimeError("告警不存在")
+    return alert
+
+
+@register_task_handler(TASK_AI_ANALYSIS)
+def run_ai_analysis(db: Session, task: TaskRecord, user: User) -> dict[str, Any]:
+    alert = _task_alert(db, task)
+    ai_settings = get_effective_setting(db, user.workspace_id, user.id, "ai")
+    run = AiRun(
+        workspace_id=user.workspace_id,
+        actor_id=user.id,
+        source="alert_workbench",
+        agent="alert_investigation",
+        reasoning_mode="smart",
+        status="running",
+        model=str(ai_settings.get("model") or ""),
+        target_type="alert",
+        target_id=str(alert.id),
+        input={"alert_hash": alert.alert_hash, "task_id": task.id},
+    )
+    db.add(run)
+    db.flush()
+    started = time.monotonic()
+    try:
+        result, matched_ids = investigate_threat(db, user, source="alert", alert=alert, include_recommended_actions=True)
+    except Exception as exc:
+        # 失败的研判记录单独提交，任务本身由执行端标记失败
+        run.status = "failed"
+        run.error = str(exc)
+        run.timing_ms = int((time.monotonic() - started) * 1000)
+        db.commit()
+        raise
+    alert.ai_result = render_v220_alert_analysis(result)
+    alert.last_updated_by_id = user.id
+    run.status = "success"
+    run.result = result
+    run.timing_ms = int((time.monotonic() - started) * 1000)
+    write_audit(db, user, "alert.ai_analysis", "alert", alert.id, {"alert_hash": alert.alert_hash, "task_id": task.id})
+    return {"alert_id": alert.id, "ai_result_length": len(alert.ai_result or ""), "matched_experiences": matched_ids}
+
+
+@register_task_handler(TASK_TI_QUERY)
+def run_ti_query(db: Session, task: TaskRecord, user: User) -> dict[str, Any]:
+    from app.services.ti_cache_service import query_pair_cached
+
+    alert = _task_alert(db, task)
+    ti_config = get_effective_setting(db, user.workspace_id, user.id, "ti")
+    # 直接将 ti_config 作为 providers 传给 query_pair_cached，它包含了 active_provider、各厂商 Key 与缓存配置
+    alert.ti_result = query_pair_cached(db, alert.source_ip, alert.destination_ip, {"providers": ti_config or {}})
+    alert.last_updated_by_id = user.id
+    write_audit(db, user, "alert.ti_query", "alert", alert.id, {"alert_hash": alert.alert_hash, "task_id": task.id})
+    return {
+        "alert_id": alert.id,
+        "has_result": bool(alert.ti_result),
+        "partial": bool((alert.ti_result or {}).get("partial")),
+        "latency_ms": (alert.ti_result or {}).get("latency_ms", {}),
+        "cache": (alert.ti_result or {}).get("cache", {}),
+    }
+
+
+@register_task_handler(TASK_TI_QUERY_BATCH)
+def run_ti_query_batch(db: Session, task: TaskRecord, user: User) -> dict[str, Any]:
+    from app.services.ti_cache_service import pair_result, query_ips_cached
+
+    alert_ids = [int(item) for item in (task.input or {}).get("alert_ids") or []]
+    providers_cfg = get_effective_setting(db, user.workspace_id, user.id, "ti") or {}
+    if not providers_cfg.get("enabled", True):
+        raise RuntimeError("威胁情报查询已关闭")
+    rows = db.query(Alert).filter(Alert.workspace_id == task.workspace_id, Alert.id.in_(alert_ids)).all()
+    mode = providers_cfg.get("mode", "both")
+    ips = [row.source_ip for row in rows if mode in ("both", "src")] + [row.destination_ip for row in rows if mode in ("both", "dst")]
+    # 多条告警共用的 IP 只查一次，批量接口按块请求；整体耗时受 batch_deadline_seconds 限制
+    resolved, report = query_ips_cached(db, ips, providers_cfg)
+    for row in rows:
+        row.ti_result = pair_result(row.source_ip, row.destination_ip, resolved, providers_cfg)
+        row.last_updated_by_id = user.id
+    updated_ids = [row.id for row in rows]
+    write_audit(db, user, "alert.ti_query_batch", "alert", "batch", {"alert_ids": updated_ids, "task_id": task.id, "report": report})
+    return {"updated": len(rows), "missing": len(alert_ids) - len(rows), "total": len(alert_ids), "report": report}
+
+
+@register_task_handler(TASK_WEBHOOK_SEND)
+def run_webhook_send(db: Session, task: TaskRecord, user: User) -> dict[str, Any]:
+    from app.api.alerts import _get_rendering_data
+    from integration.webhook import send_record
+    from output.formatter import render_chat
+
+    alert = _task_alert(db, task)
+    webhook_cfg = get_effective_setting(db, user.workspace_id, user.id, "webhook")
+    if not webhook_cfg or webhook_cfg.get("enabled") is False:
+        raise RuntimeError("Webhook 未配置或已禁用")
+    # 使用增强后的渲染数据
+    data = _get_rendering_data(db, user, alert)
+    text = render_chat(data, {"fields": {"order": list(data.keys()), "auto_append_extra": True}})
+    result = send_record(text, {"webhook": webhook_cfg})
+    if not result.get("success"):
+        raise RuntimeError(f"Webhook 发送失败: {result}")
+    write_audit(db, user, "alert.webhook_send", "alert", alert.id, {"alert_hash": alert.alert_hash, "result": result, "task_id": task.id})
+    return {"alert_id": alert.id, "result": result}
@@ -0,0 +1,373 @@
+"""
+资产 / 网段 Excel 导入。
+
+以 openpyxl 只读模式逐行读取上传文件，不在内存中构建完整工作簿；每 IMPORT_CHUNK_SIZE 行为一批：
+先逐行校验，再一次查询本批已存在的 (ip, domain) / 网段，最后批量插入与按主键批量更新。
+文件超过 IMPORT_ASYNC_BYTES 时由接口落盘到 IMPORT_DIR 并转为后台任务，执行中按批写回进度。
+"""
+import itertools
+import json
+import os
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+
+from fastapi import HTTPException
+from openpyxl import load_workbook
+from sqlalchemy import insert, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.entities import Asset, AssetSegment, TaskRecord, User
+from app.services.asset_service import invalidate_asset_cache, invalidate_segment_index, make_asset_key, normalize_asset_payload
+from app.services.audit_service import write_audit
+from app.services.task_service import register_task_handler
+
+ROOT = Path(__file__).resolve().parents[3]
+# 每批校验与写库的行数
+IMPORT_CHUNK_SIZE = 1000
+# 结果中最多保留的错误明细条数，其余只计入 skipped
+IMPORT_ERROR_LIMIT = 500
+# 上传文件超过该大小时转为后台任务
+IMPORT_ASYNC_BYTES = max(int(os.getenv("EFF_ASSET_IMPORT_ASYNC_BYTES", str(2 * 1024 * 1024)) or 0), 0)
+# 待导入文件的暂存目录，接口与 worker 需共享
+IMPORT_DIR = Path(os.getenv("EFF_IMPORT_DIR", "") or ROOT / "data" / "imports")
+
+TASK_ASSET_IMPORT = "asset.import"
+TASK_SEGMENT_IMPORT = "asset_segment.import"
+
+ASSET_CONFLICT_ERROR = "资产冲突（可能是并发导入了相同 IP/域名）"
+SEGMENT_CONFLICT_ERROR = "网段冲突（可能是并发导入了相同网段）"
+
+HEADER_ALIASES = {
+    "IP": "ip",
+    "ip": "ip",
+    "域名": "domain",
+    "domain": "domain",
+    "资产名称": "name",
+    "name": "name",
+    "资产所属区域": "area",
+    "area": "area",
+    "负责人": "owner",
+    "owner": "owner",
+    "部门": "department",
+    "department": "department",
+    "重要性": "criticality",
+    "criticality": "criticality",
+    "环境": "environment",
+    "environment": "environment",
+    "标签": "tags",
+    "tags": "tags",
+    "备注": "description",
+    "description": "description",
+}
+SEGMENT_HEADER_MAP = {
+    "网段范围": "segment",
+    "网段名称": "name",
+    "所属区域": "area",
+    "负责人": "owner",
+    "重要性": "criticality",
+    "环境": "environment",
+    "备注说明": "description",
+}
+
+ProgressCallback = Callable[[dict[str, Any]], None]
+
+
+def new_stats() -> dict[str, Any]:
+    return {"created": 0, "updated": 0, "skipped": 0, "errors": [], "processed": 0}
+
+
+def _skip(stats: dict[str, Any], row_index: int, error: str | None = None) -> None:
+    stats["skipped"] += 1
+    if error and len(stats["errors"]) < IMPORT_ERROR_LIMIT:
+        stats["errors"].append({"row": row_index, "error": error})
+
+
+# ---- 读取 ----
+
+
+def cell_text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value).strip()
+
+
+def row_to_asset(headers: list[str], row: tuple[Any, ...]) -> dict[str, Any]:
+    data: dict[str, Any] = {"fingerprints": {}}
+    for header, raw_value in zip(headers, row):
+        if not header:
+            continue
+        value = cell_text(raw_value)
+        key = HEADER_ALIASES.get(header.strip())
+        if key == "tags":
+            data["tags"] = [item.strip() for item in value.replace("，", ",").split(",") if item.strip()]
+        elif key:
+            data[key] = value
+        elif value:
+            data["fingerprints"][header.strip()] = value
+    return data
+
+
+def row_to_segment(headers: list[str], row: tuple[Any, ...]) -> dict[str, Any]:
+    data: dict[str, Any] = {}
+    for header, raw_value in zip(headers, row):
+        key = SEGMENT_HEADER_MAP.get(header)
+        if key:
+            data[key] = cell_text(raw_value)
+    return data
+
+
+def _data_rows(rows: Iterable[tuple[Any, ...]]) -> Iterator[tuple[int, tuple[Any, ...]]]:
+    # 只读模式会带出格式残留的空行，整行为空的直接略过
+    for row_index, row in enumerate(rows, start=2):
+        if any(value is not None and str(value).strip() for value in row):
+            yield row_index, row
+
+
+@contextmanager
+def open_import_sheet(source) -> Iterator[tuple[list[str], Iterator[tuple[int, tuple[Any, ...]]], int | None]]:
+    """只读打开第一个工作表，产出 (表头, (行号, 行值) 迭代器, 预估数据行数)。"""
+    try:
+        wb = load_workbook(source, read_only=True, data_only=True)
+    except Exception as exc:
+        raise HTTPException(status_code=400, detail="无法读取 Excel 文件，请确认是有效的 .xlsx") from exc
+    try:
+        ws = wb.active
+        rows = ws.iter_rows(values_only=True)
+        headers = [cell_text(value) for value in next(rows, ())]
+        if not any(headers):
+            raise HTTPException(status_code=400, detail="Excel 第一行必须是字段名")
+        # 只读模式的 max_row 来自文件内的 dimension 声明，仅作进度参考
+        total = ws.max_row - 1 if ws.max_row else None
+        yield headers, _data_rows(rows), total
+    finally:
+        wb.close()
+
+
+def _chunks(rows: Iterator[tuple[int, tuple[Any, ...]]], size: int) -> Iterator[list[tuple[int, tuple[Any, ...]]]]:
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# ---- 批量写入 ----
+
+
+def _bulk_insert(db: Session, model, pending: list[tuple[int, dict[str, Any]]], stats: dict[str, Any], conflict_error: str) -> None:
+    if not pending:
+        return
+    try:
+        with db.begin_nested():
+            db.execute(insert(model), [values for _, values in pending])
+        stats["created"] += len(pending)
+        return
+    except IntegrityError:
+        pass
+    # 整批插入撞上并发写入的唯一约束时逐行重试，定位冲突行
+    for row_index, values in pending:
+        try:
+            with db.begin_nested():
+                db.execute(insert(model), [values])
+            stats["created"] += 1
+        except IntegrityError:
+            _skip(stats, row_index, conflict_error)
+
+
+def _asset_identity(data: dict[str, Any]) -> tuple[str, str]:
+    return data.get("ip", ""), data.get("domain", "")
+
+
+def _import_asset_chunk(
+    db: Session,
+    workspace_id: int,
+    strategy: str,
+    headers: list[str],
+    chunk: list[tuple[int, tuple[Any, ...]]],
+    stats: dict[str, Any],
+) -> None:
+    valid: list[tuple[int, dict[str, Any]]] = []
+    for row_index, row in chunk:
+        try:
+            valid.append((row_index, normalize_asset_payload(row_to_asset(headers, row))))
+        except Exception as exc:
+            _skip(stats, row_index, str(getattr(exc, "detail", exc)))
+    if not valid:
+        return
+
+    keys = {_asset_identity(normalized) for _, normalized in valid}
+    existing = {
+        (ip, domain): asset_id
+        for asset_id, ip, domain in db.execute(
+            select(Asset.id, Asset.ip, Asset.domain).where(Asset.workspace_id == workspace_id, tuple_(Asset.ip, Asset.domain).in_(keys))
+        )
+    }
+    updates: dict[int, dict[str, Any]] = {}
+    inserts: dict[tuple[str, str], tuple[int, dict[str, Any]]] = {}
+    for row_index, normalized in valid:
+        key = _asset_identity(normalized)
+        asset_id = existing.get(key)
+        pending = inserts.get(key)
+        if asset_id is None and pending is None:
+            inserts[key] = (row_index, {**normalized, "workspace_id": workspace_id, "asset_key": make_asset_key(workspace_id)})
+        elif strategy == "skip":
+            _skip(stats, row_index)
+        elif strategy == "overwrite":
+            # 文件内重复的行与库内已有资产一样，以后出现的行为准
+            target = updates.setdefault(asset_id, {"id": asset_id}) if asset_id is not None else pending[1]
+            target.update(normalized)
+            stats["updated"] += 1
+        else:
+            _skip(stats, row_index, ASSET_CONFLICT_ERROR)
+
+    if updates:
+        db.execute(update(Asset), list(updates.values()))
+    _bulk_insert(db, Asset, list(inserts.values()), stats, ASSET_CONFLICT_ERROR)
+
+
+def _import_segment_chunk(
+    db: Session,
+    workspace_id: int,
+    strategy: str,
+    headers: list[str],
+    chunk: list[tuple[int, tuple[Any, ...]]],
+    stats: dict[str, Any],
+) -> None:
+    valid = []
+    for row_index, row in chunk:
+        data = row_to_segment(headers, row)
+        # 未填写网段范围的行不计入结果
+        if data.get("segment"):
+            valid.append((row_index, data))
+    if not valid:
+        return
+
+    existing = dict(
+        db.execute(
+            select(AssetSegment.segment, AssetSegment.id).where(
+                AssetSegment.workspace_id == workspace_id,
+                AssetSegment.segment.in_({data["segment"] for _, data in valid}),
+            )
+        ).all()
+    )
+    updates: dict[int, dict[str, Any]] = {}
+    inserts: dict[str, tuple[int, dict[str, Any]]] = {}
+    for row_index, data in valid:
+        segment_id = existing.get(data["segment"])
+        pending = inserts.get(data["segment"])
+        if segment_id is None and pending is None:
+            inserts[data["segment"]] = (row_index, {**data, "workspace_id": workspace_id})
+        elif strategy == "skip":
+            _skip(stats, row_index)
+        elif strategy == "overwrite":
+            target = updates.setdefault(segment_id, {"id": segment_id}) if segment_id is not None else pending[1]
+            target.update(data)
+            stats["updated"] += 1
+        else:
+            _skip(stats, row_index, SEGMENT_CONFLICT_ERROR)
+
+    if updates:
+        db.execute(update(AssetSegment), list(updates.values()))
+    _bulk_insert(db, AssetSegment, list(inserts.values()), stats, SEGMENT_CONFLICT_ERROR)
+
+
+_CHUNK_IMPORTERS = {
+    "asset": _import_asset_chunk,
+    "segment": _import_segment_chunk,
+}
+
+
+def import_workbook(
+    db: Session,
+    workspace_id: int,
+    kind: str,
+    source,
+    strategy: str,
+    progress: ProgressCallback | None = None,
+) -> dict[str, Any]:
+    """
+    按批导入资产 (kind="asset") 或网段 (kind="segment")。每批写入后刷新到数据库；
+    传入 progress 时每批结束调用一次，调用方可借此提交事务并上报进度。
+    """
+    importer = _CHUNK_IMPORTERS[kind]
+    stats = new_stats()
+    with open_import_sheet(source) as (headers, rows, total):
+        stats["total"] = total
+        for chunk in _chunks(rows, IMPORT_CHUNK_SIZE):
+            importer(db, workspace_id, strategy, headers, chunk, stats)
+            db.flush()
+            stats["processed"] += len(chunk)
+            if progress:
+                progress(stats)
+    return stats
+
+
+def finish_import(db: Session, user: User, kind: str, filename: str, strategy: str, stats: dict[str, Any]) -> None:
+    """导入结束后的审计；缓存在调用方提交事务后通过 invalidate_import_cache 失效。"""
+    if kind == "asset":
+        write_audit(db, user, "asset.import", "asset", "import", {"filename": filename, "strategy": strategy, "stats": stats})
+
+
+def invalidate_import_cache(kind: str, workspace_id: int) -> None:
+    if kind == "asset":
+        invalidate_asset_cache(workspace_id)
+    else:
+        invalidate_segment_index(workspace_id)
+
+
+# ---- 后台任务 ----
+
+
+def stage_import_file(fileobj) -> Path:
+    """把上传内容复制到共享暂存目录，返回文件路径供后台任务读取。"""
+    IMPORT_DIR.mkdir(parents=True, exist_ok=True)
+    path = IMPORT_DIR / f"{uuid.uuid4().hex}.xlsx"
+    fileobj.seek(0)
+    with path.open("wb") as output:
+        while True:
+            chunk = fileobj.read(1024 * 1024)
+            if not chunk:
+                break
+            output.write(chunk)
+    return path
+
+
+def _run_import_task(db: Session, task: TaskRecord, user: User, kind: str) -> dict[str, Any]:
+    params = task.input or {}
+    path = IMPORT_DIR / Path(str(params.get("file") or "")).name
+    if not path.is_file():
+        raise RuntimeError("待导入文件不存在或已被清理")
+    strategy = params.get("strategy") or "skip"
+
+    def report(stats: dict[str, Any]) -> None:
+        # 每批连同已写入的数据一起提交，前端轮询任务即可看到进度
+        task.output = {**stats, "errors": list(stats["errors"]), "running": True}
+        db.commit()
+
+    try:
+        try:
+            stats = import_workbook(db, user.workspace_id, kind, path, strategy, report)
+        except HTTPException as exc:
+            raise RuntimeError(exc.detail) from exc
+        finish_import(db, user, kind, params.get("filename") or "", strategy, stats)
+        db.commit()
+    finally:
+        # 中途失败时已提交的批次保留，同样需要失效缓存
+        invalidate_import_cache(kind, user.workspace_id)
+        path.unlink(missing_ok=True)
+    return stats
+
+
+@register_task_handler(TASK_ASSET_IMPORT)
+def run_asset_import(db: Session, task: TaskRecord, user: User) -> dict[str, Any]:
+    return _run_import_task(db, task, user, "asset")
+
+
+@register_task_handler(TASK_SEGMENT_IMPORT)
+def run_segment_import(db: Session, task: TaskRecord, user: User) -> dict[str, Any]:
+    return _run_import_task(db, task, user, "segment")
@@ -1,10 +1,15 @@
 from __future__ import annotations
 
+import copy
 import json
+import threading
+import time
 import uuid
+from collections import OrderedDict
 from typing import Any
 
 from fastapi import HTTPException
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.models.entities import Asset, AssetSegment
@@ -12,19 +17,67 @@ from app.models.entities import Asset, AssetSegment
 VALID_CRITICALITIES = {"low", "medium", "high", "critical"}
 
 
+class SegmentIndex:
+    """工作区网段的区间索引快照：按最长前缀（覆盖范围最小）匹配网段。"""
+
+    def __init__(self, segments: list[AssetSegment]):
+        from core.lists import IPListIndex
+
+        self.index = IPListIndex(seg.segment for seg in segments)
+        # 网段文本 -> (网段 ID, 资产上下文)；上下文是快照，不持有 ORM 对象
+        self.by_segment: dict[str, tuple[int, dict[str, Any]]] = {}
+        for seg in segments:
+            self.by_segment.setdefault((seg.segment or "").strip(), (seg.id, build_segment_context(seg)))
+
+    def lookup(self, ip: str | None) -> tuple[int, dict[str, Any]] | None:
+        item = self.index.most_specific((ip or "").strip())
+        return self.by_segment.get(item) if item else None
+
+
+_segment_index_cache: dict[int, tuple[tuple, SegmentIndex]] = {}
+_segment_index_lock = threading.Lock()
+
+
+def _segment_signature(db: Session, workspace_id: int) -> tuple:
+    row = (
+        db.query(func.count(AssetSegment.id), func.max(AssetSegment.id), func.max(AssetSegment.updated_at))
+        .filter(AssetSegment.workspace_id == workspace_id)
+        .one()
+    )
+    return tuple(row)
+
+
+def get_segment_index(db: Session, workspace_id: int) -> SegmentIndex:
+    """
+    返回工作区网段索引。每次只做一次聚合查询校验签名（数量、最大 ID、最近更新时间），
+    签名变化才重新加载网段，因此其它进程的增删改也会生效。
+    """
+    signature = _segment_signature(db, workspace_id)
+    with _segment_index_lock:
+        cached = _segment_index_cache.get(workspace_id)
+    if cached and cached[0] == signature:
+        return cached[1]
+    segments = db.query(AssetSegment).filter(AssetSegment.workspace_id == workspace_id).order_by(AssetSegment.id).all()
+    index = SegmentIndex(segments)
+    with _segment_index_lock:
+        _segment_index_cache[workspace_id] = (signature, index)
+    return index
+
+
+def invalidate_segment_index(workspace_id: int | None = None) -> None:
+    with _segment_index_lock:
+        if workspace_id is None:
+            _segment_index_cache.clear()
+        else:
+            _segment_index_cache.pop(workspace_id, None)
+
+
 def lookup_asset_by_segment(db: Session, workspace_id: int, ip: str | None) -> AssetSegment | None:
-    from core.lists import is_ip_in_list
     value = (ip or "").strip()
     if not value:
         return None
-    
-    # 获取该工作区所有的网段定义
-    segments = db.query(AssetSegment).filter(AssetSegment.workspace_id == workspace_id).all()
-    for seg in segments:
-        # 复用 core.lists 中的范围检测逻辑
-        if is_ip_in_list(value, [seg.segment]):
-            return seg
-    return None
+    hit = get_segment_index(db, workspace_id).lookup(value)
+    return db.get(AssetSegment, hit[0]) if hit else None
 
 
 def build_segment_context(seg: AssetSegment | None) -> dict[str, Any]:
@@ -124,6 +177,129 @@ def lookup_asset_by_domain(db: Session, workspace_id: int, domain: str | None) -
     return db.query(Asset).filter(Asset.workspace_id == workspace_id, Asset.domain == value).order_by(Asset.updated_at.desc()).first()
 
 
+_IN_CLAUSE_CHUNK = 500
+
+
+def _assets_by_column(db: Session, workspace_id: int, column, values: set[str]) -> dict[str, Asset]:
+    """按 IP/域名批量取资产，同值多条时与单条查询一致取最近更新的一条。"""
+    found: dict[str, Asset] = {}
+    ordered = sorted(values)
+    for start in range(0, len(ordered), _IN_CLAUSE_CHUNK):
+        chunk = ordered[start:start + _IN_CLAUSE_CHUNK]
+        rows = (
+            db.query(Asset)
+            .filter(Asset.workspace_id == workspace_id, column.in_(chunk))
+            .order_by(Asset.updated_at.desc())
+            .all()
+        )
+        for row in rows:
+            found.setdefault(getattr(row, column.key), row)
+    return found
+
+
+# 资产解析缓存：workspace_id -> {(kind, value): (过期时间, 资产 ID, context)}
+# 未命中同样缓存（资产 ID 为 None），TTL 兜底多进程下的修改，本进程修改时显式失效。
+ASSET_CACHE_TTL = 60
+ASSET_CACHE_MAX = 20000
+_asset_cache: dict[int, OrderedDict[tuple[str, str], tuple[float, int | None, dict[str, Any]]]] = {}
+_asset_cache_lock = threading.Lock()
+_ASSET_COLUMNS = {"ip": Asset.ip, "domain": Asset.domain}
+
+
+def invalidate_asset_cache(workspace_id: int | None = None) -> None:
+    with _asset_cache_lock:
+        if workspace_id is None:
+            _asset_cache.clear()
+        else:
+            _asset_cache.pop(workspace_id, None)
+
+
+def _resolve_entries(db: Session, workspace_id: int, kind: str, values) -> dict[str, tuple[int | None, dict[str, Any]]]:
+    column = _ASSET_COLUMNS[kind]
+    wanted = {(value or "").strip() for value in values} - {""}
+    resolved: dict[str, tuple[int | None, dict[str, Any]]] = {}
+    current = time.monotonic()
+    with _asset_cache_lock:
+        bucket = _asset_cache.get(workspace_id)
+        if bucket is not None:
+            for value in wanted:
+                entry = bucket.get((kind, value))
+                if entry and entry[0] > current:
+                    bucket.move_to_end((kind, value))
+                    resolved[value] = (entry[1], entry[2])
+    missing = wanted - resolved.keys()
+    if not missing:
+        return resolved
+
+    found = _assets_by_column(db, workspace_id, column, missing)
+    expires = current + ASSET_CACHE_TTL
+    with _asset_cache_lock:
+        bucket = _asset_cache.setdefault(workspace_id, OrderedDict())
+        for value in missing:
+            asset = found.get(value)
+            entry = (expires, asset.id if asset else None, build_asset_context(asset))
+            bucket[(kind, value)] = entry
+            bucket.move_to_end((kind, value))
+            resolved[value] = (entry[1], entry[2])
+        while len(bucket) > ASSET_CACHE_MAX:
+            bucket.popitem(last=False)
+    return resolved
+
+
+def resolve_many(db: Session, workspace_id: int, kind: str, values) -> dict[str, dict[str, Any]]:
+    """
+    批量解析 IP（kind="ip"）或域名（kind="domain"）对应的资产 context。
+    返回 {值: context}，未命中为空字典；缓存未命中的值按块一次查询。
+    """
+    entries = _resolve_entries(db, workspace_id, kind, values)
+    return {value: copy.deepcopy(context) for value, (_, context) in entries.items()}
+
+
+def resolve_asset(db: Session, workspace_id: int, kind: str, value: str | None) -> dict[str, Any]:
+    value = (value or "").strip()
+    if not value:
+        return {}
+    return resolve_many(db, workspace_id, kind, [value]).get(value, {})
+
+
+def resolve_asset_row(db: Session, workspace_id: int, kind: str, value: str | None) -> Asset | None:
+    """与 lookup_asset_by_ip/domain 结果一致，但未命中走缓存，命中只按主键取一次。"""
+    value = (value or "").strip()
+    if not value:
+        return None
+    asset_id = _resolve_entries(db, workspace_id, kind, [value]).get(value, (None, {}))[0]
+    return db.get(Asset, asset_id) if asset_id else None
+
+
+def resolve_asset_contexts(db: Session, workspace_id: int, lookups: list[tuple[str | None, str | None]]) -> list[dict[str, Any]]:
+    """
+    批量关联资产上下文，返回与 lookups 一一对应的 context。
+    优先级与单条解析一致：IP 个体资产 > 域名个体资产 > IP 所属网段。
+    """
+    pairs = [((ip or "").strip(), (domain or "").strip()) for ip, domain in lookups]
+    by_ip = resolve_many(db, workspace_id, "ip", {ip for ip, _ in pairs if ip})
+    by_domain = resolve_many(db, workspace_id, "domain", {domain for ip, domain in pairs if domain and not by_ip.get(ip)})
+
+    segment_index: SegmentIndex | None = None
+    results: list[dict[str, Any]] = []
+    for ip, domain in pairs:
+        if ip and by_ip.get(ip):
+            results.append(by_ip[ip])
+            continue
+        if domain and by_domain.get(domain):
+            results.append(by_domain[domain])
+            continue
+        if ip:
+            if segment_index is None:
+                segment_index = get_segment_index(db, workspace_id)
+            hit = segment_index.lookup(ip)
+            if hit:
+                results.append(copy.deepcopy(hit[1]))
+                continue
+        results.append({})
+    return results
+
+
 def asset_summary_fields(prefix: str, context: dict[str, Any]) -> dict[str, Any]:
     fingerprints = context.get("fingerprints") or {}
     return {
@@ -0,0 +1,219 @@
+"""
+查询结果缓存。
+
+提供进程内 LRU 与 Redis 两种后端（EFF_CACHE_BACKEND=memory/redis/auto），缓存键带工作区代数：
+告警写入提交后递增对应工作区的代数，旧键自然失效。只有 Redis 后端能让多个 uvicorn 进程与 Worker
+共享同一代数；进程内后端的代数只对本进程有效，因此条目最多保留 MEMORY_CACHE_MAX_TTL 秒，
+其他进程的写入最迟在这段时间后可见。
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.settings import get_settings
+from app.models.entities import Alert
+from app.services.stats_service import invalidate_aggregate_stats
+
+logger = logging.getLogger("eff-cache")
+
+CACHE_BACKEND = os.getenv("EFF_CACHE_BACKEND", "auto").strip().lower()
+# 进程内缓存最多保留的条目数
+MEMORY_CACHE_MAX = 1000
+# 进程内缓存条目的最长有效期（秒）：其他进程（Worker、其余 uvicorn 进程）的写入无法使本进程的代数失效
+MEMORY_CACHE_MAX_TTL = 2
+# 告警列表命名空间
+ALERT_LIST_NAMESPACE = "alert_list"
+# 批量 UPDATE/DELETE 无法确定工作区时递增的全局代数对应的工作区标识
+ALL_WORKSPACES = "*"
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class MemoryCache:
+    """进程内 LRU，条目按 TTL 过期；代数计数同样只在本进程有效。"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = MEMORY_CACHE_MAX):
+        self.max_entries = max_entries
+        self._items: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._generations: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        with self._lock:
+            self._items[key] = (time.monotonic() + min(ttl, MEMORY_CACHE_MAX_TTL), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def generation(self, key: str) -> int:
+        with self._lock:
+            return self._generations.get(key, 0)
+
+    def bump(self, key: str) -> None:
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+
+class RedisCache:
+    """Redis 后端：值以 JSON 存储，代数使用 INCR；Redis 异常时视为未命中，不影响查询。"""
+
+    name = "redis"
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key: str) -> Any:
+        try:
+            raw = self.client.get(key)
+        except Exception as exc:
+            logger.warning("Redis cache get failed: %s", exc)
+            return None
+        return json.loads(raw) if raw else None
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        try:
+            self.client.set(key, json.dumps(value, ensure_ascii=False, default=_json_default), ex=ttl)
+        except Exception as exc:
+            logger.warning("Redis cache set failed: %s", exc)
+
+    def generation(self, key: str) -> int:
+        try:
+            return int(self.client.get(key) or 0)
+        except Exception as exc:
+            logger.warning("Redis cache generation read failed: %s", exc)
+            return 0
+
+    def bump(self, key: str) -> None:
+        try:
+            self.client.incr(key)
+        except Exception as exc:
+            logger.warning("Redis cache generation bump failed: %s", exc)
+
+
+_backend: MemoryCache | RedisCache | None = None
+_backend_lock = threading.Lock()
+
+
+def _build_backend() -> MemoryCache | RedisCache:
+    if CACHE_BACKEND in ("redis", "auto"):
+        try:
+            import redis
+
+            client = redis.Redis.from_url(get_settings().redis_url, socket_connect_timeout=2, socket_timeout=2)
+            client.ping()
+            return RedisCache(client)
+        except Exception as exc:
+            from app.services.task_service import TASK_EXECUTOR
+
+            if CACHE_BACKEND == "redis" or TASK_EXECUTOR != "inline":
+                # Worker 写入的告警无法使 API 进程的进程内缓存失效，只能等 MEMORY_CACHE_MAX_TTL 过期
+                logger.warning(
+                    "Redis cache unavailable, falling back to per-process memory cache (entries expire after %ss): %s",
+                    MEMORY_CACHE_MAX_TTL,
+                    exc,
+                )
+    return MemoryCache()
+
+
+def get_backend() -> MemoryCache | RedisCache:
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _build_backend()
+    return _backend
+
+
+def _generation_key(namespace: str, workspace_id: int | str) -> str:
+    return f"eff:gen:{namespace}:{workspace_id}"
+
+
+def cache_key(namespace: str, workspace_id: int, params: Any) -> str:
+    """带全局与工作区代数的缓存键，任一代数递增后旧键不再命中。"""
+    backend = get_backend()
+    generation = (
+        backend.generation(_generation_key(namespace, ALL_WORKSPACES)),
+        backend.generation(_generation_key(namespace, workspace_id)),
+    )
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return f"eff:cache:{namespace}:{workspace_id}:{generation[0]}.{generation[1]}:{digest}"
+
+
+def cache_get(key: str) -> Any:
+    return get_backend().get(key)
+
+
+def cache_set(key: str, value: Any, ttl: int) -> None:
+    get_backend().set(key, value, ttl)
+
+
+def invalidate(namespace: str, workspace_id: int | str) -> None:
+    get_backend().bump(_generation_key(namespace, workspace_id))
+
+
+def invalidate_alert_lists(workspace_id: int | str) -> None:
+    invalidate(ALERT_LIST_NAMESPACE, workspace_id)
+
+
+# ---- 告警写入后自动失效 ----
+# flush 时收集涉及的工作区，事务提交后再递增代数并丢弃本进程的今日统计快照，回滚则丢弃
+
+
+def _pending(session: Session) -> set:
+    return session.info.setdefault("alert_cache_workspaces", set())
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_alert_writes(session: Session, flush_context) -> None:
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Alert) and obj.workspace_id is not None:
+            _pending(session).add(obj.workspace_id)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_alert_writes(orm_execute_state) -> None:
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ is Alert:
+        _pending(orm_execute_state.session).add(ALL_WORKSPACES)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    workspaces = session.info.pop("alert_cache_workspaces", None)
+    for workspace_id in workspaces or ():
+        invalidate_alert_lists(workspace_id)
+        invalidate_aggregate_stats(None if workspace_id == ALL_WORKSPACES else workspace_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop("alert_cache_workspaces", None)
@@ -0,0 +1,311 @@
+"""
+告警导出。
+
+按 (created_at, id) 键集分批读取告警，每批一次性取回关联的用户/项目/设备与资产兜底上下文；
+导出模板预先编译为列计划（每列一个取值函数），逐行只做取值，不再为每条告警构建完整变量字典。
+"""
+from typing import Any, Callable, NamedTuple
+
+from sqlalchemy.orm import Query, Session
+
+from app.models.entities import Alert, Device, ParseRule, Project, User
+from app.services.asset_service import resolve_asset_contexts
+from app.services.search_service import search_alerts
+from app.services.workflow_constants import (
+    CLOSURE_ACTION_LABELS,
+    DISPOSAL_ACTION_LABELS,
+    DISPOSAL_TARGET_LABELS,
+    GROUP_LABELS,
+    STATUS_LABELS,
+)
+
+# 流式导出每批读取的告警数
+EXPORT_BATCH_SIZE = 1000
+
+
+class ExportBatch(NamedTuple):
+    users: dict[int, User]
+    projects: dict[int, Project]
+    devices: dict[int, Device]
+    asset_fallbacks: dict[int, tuple[dict[str, Any], dict[str, Any]]]
+
+
+def alert_export_query(db: Session, workspace_id: int, filters: dict[str, Any]) -> Query:
+    query = db.query(Alert).filter(Alert.workspace_id == workspace_id)
+    if filters.get("status"):
+        query = query.filter(Alert.status == filters["status"])
+    if filters.get("current_group"):
+        query = query.filter(Alert.current_group == filters["current_group"])
+    if filters.get("project_id"):
+        query = query.filter(Alert.project_id == filters["project_id"])
+    if filters.get("assignee_id"):
+        query = query.filter(Alert.assignee_id == filters["assignee_id"])
+    if filters.get("start_dt"):
+        query = query.filter(Alert.created_at >= filters["start_dt"])
+    if filters.get("end_dt"):
+        query = query.filter(Alert.created_at < filters["end_dt"])
+    if filters.get("q"):
+        query, _ = search_alerts(query, filters["q"])
+    return query
+
+
+def iter_alert_batches(query: Query, batch_size: int = EXPORT_BATCH_SIZE):
+    """按 (created_at, id) 倒序键集分批读取，每批一次查询，内存占用与导出总量无关。"""
+    last = None
+    while True:
+        page = query
+        if last is not None:
+            page = page.filter((Alert.created_at < last[0]) | ((Alert.created_at == last[0]) & (Alert.id < last[1])))
+        rows = page.order_by(Alert.created_at.desc(), Alert.id.desc()).limit(batch_size).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        last = (rows[-1].created_at, rows[-1].id)
+
+
+def export_batch_lookups(db: Session, workspace_id: int, rows: list[Alert]) -> ExportBatch:
+    """一批告警关联的用户、项目、设备与资产兜底上下文，各用一次查询批量取回。"""
+    user_ids = (
+        {row.created_by_id for row in rows if row.created_by_id}
+        | {row.last_updated_by_id for row in rows if row.last_updated_by_id}
+        | {row.assignee_id for row in rows if row.assignee_id}
+        | {row.analysis_owner_id for row in rows if row.analysis_owner_id}
+        | {row.disposal_owner_id for row in rows if row.disposal_owner_id}
+        | {row.response_owner_id for row in rows if row.response_owner_id}
+    )
+    users = {row.id: row for row in db.query(User).filter(User.id.in_(user_ids)).all()} if user_ids else {}
+    project_ids = {row.project_id for row in rows if row.project_id}
+    projects = {row.id: row for row in db.query(Project).filter(Project.id.in_(project_ids)).all()} if project_ids else {}
+    device_ids = {row.device_id for row in rows if row.device_id} | {device_id for row in rows for device_id in (row.block_device_ids or []) if device_id}
+    devices = {row.id: row for row in db.query(Device).filter(Device.id.in_(device_ids)).all()} if device_ids else {}
+
+    # 缺少资产上下文的告警统一批量解析，避免逐条查询
+    unresolved = [
+        row for row in rows
+        if not (row.src_asset_context or (row.parsed_fields or {}).get("src_asset_context"))
+        or not (row.dst_asset_context or (row.parsed_fields or {}).get("dst_asset_context"))
+    ]
+    lookups = [(row.source_ip, "") for row in unresolved] + [(row.destination_ip, str((row.parsed_fields or {}).get("domain") or "")) for row in unresolved]
+    contexts = resolve_asset_contexts(db, workspace_id, lookups) if lookups else []
+    asset_fallbacks = {row.id: (contexts[index], contexts[len(unresolved) + index]) for index, row in enumerate(unresolved)}
+    return ExportBatch(users, projects, devices, asset_fallbacks)
+
+
+# ---- 导出变量 ----
+# 取值函数签名均为 (alert, parsed_fields, batch)
+
+
+def _iso(value) -> str:
+    return value.isoformat(sep=" ", timespec="seconds") if value else ""
+
+
+def _user_name(batch: ExportBatch, user_id: int | None, default: str = "") -> str:
+    user = batch.users.get(user_id)
+    return user.display_name if user else default
+
+
+def _source_ip(alert: Alert, data: dict) -> str:
+    return str(alert.source_ip or data.get("攻击源IP") or data.get("源IP") or data.get("src_ip") or "")
+
+
+def _destination_ip(alert: Alert, data: dict) -> str:
+    return str(alert.destination_ip or data.get("攻击目的IP") or data.get("目的IP") or data.get("dst_ip") or "")
+
+
+def _device_name(alert: Alert, batch: ExportBatch) -> str:
+    device = batch.devices.get(alert.device_id)
+    return device.name if device else "通用设备"
+
+
+def _block_device_names(alert: Alert, batch: ExportBatch) -> list[str]:
+    return [batch.devices[item].name for item in (alert.block_device_ids or []) if item in batch.devices]
+
+
+def _project_name(alert: Alert, batch: ExportBatch) -> str:
+    project = batch.projects.get(alert.project_id)
+    return project.name if project else ""
+
+
+def _emergency(alert: Alert, value: Any) -> Any:
+    return value if alert.disposal_action == "emergency" else ""
+
+
+def _alert_time(alert: Alert, data: dict) -> str:
+    return str(data.get("告警时间") or data.get("alert_time") or _iso(alert.created_at))
+
+
+def _event_id(alert: Alert, data: dict) -> str:
+    return str(data.get("事件ID") or data.get("isop_event_id") or data.get("event_id") or alert.alert_hash or "")
+
+
+def _alert_name(alert: Alert, data: dict) -> str:
+    return str(data.get("告警名称") or data.get("event_name") or alert.event_type or "")
+
+
+def _device_ip(data: dict) -> str:
+    return str(data.get("告警设备IP地址") or data.get("device_ip") or "")
+
+
+def _asset(alert: Alert, data: dict, batch: ExportBatch, index: int) -> dict[str, Any]:
+    # 告警入库时未关联到资产的，按当前资产库补齐
+    fallback = (batch.asset_fallbacks.get(alert.id) or ({}, {}))[index]
+    if index == 0:
+        return alert.src_asset_context or data.get("src_asset_context") or fallback
+    return alert.dst_asset_context or data.get("dst_asset_context") or fallback
+
+
+Getter = Callable[[Alert, dict, ExportBatch], Any]
+
+_FIELD_GROUPS: list[tuple[tuple[str, ...], Getter]] = [
+    (("id",), lambda a, d, b: a.id),
+    (("alert_code", "告警ID"), lambda a, d, b: a.alert_code or a.id),
+    (("alert_hash", "告警Hash"), lambda a, d, b: a.alert_hash),
+    (("created_at", "创建时间"), lambda a, d, b: _iso(a.created_at)),
+    (("updated_at", "更新时间"), lambda a, d, b: _iso(a.updated_at)),
+    (("source_ip", "源IP"), lambda a, d, b: _source_ip(a, d)),
+    (("destination_ip", "目的IP"), lambda a, d, b: _destination_ip(a, d)),
+    (("event_type", "事件类型"), lambda a, d, b: a.event_type),
+    (("status",), lambda a, d, b: a.status),
+    (("current_group",), lambda a, d, b: a.current_group),
+    (("所属组",), lambda a, d, b: GROUP_LABELS.get(a.current_group, a.current_group)),
+    (("created_by", "created_by_name"), lambda a, d, b: _user_name(b, a.created_by_id)),
+    (("last_updated_by", "last_updated_by_name"), lambda a, d, b: _user_name(b, a.last_updated_by_id)),
+    (("assignee", "assignee_name"), lambda a, d, b: _user_name(b, a.assignee_id)),
+    (("负责人",), lambda a, d, b: _user_name(b, a.assignee_id, "未分配")),
+    (("analysis_owner", "研判负责人", "研判人员"), lambda a, d, b: _user_name(b, a.analysis_owner_id)),
+    (("disposal_owner", "处置负责人", "封禁人员"), lambda a, d, b: _user_name(b, a.disposal_owner_id)),
+    (("reported_by_name", "监测上报人员"), lambda a, d, b: a.reported_by_name or _user_name(b, a.created_by_id)),
+    (("analysis_result", "研判结果"), lambda a, d, b: a.analysis_result),
+    (("is_emergency", "是否应急"), lambda a, d, b: "是" if a.is_emergency else "否"),
+    (("block_device_names",), lambda a, d, b: _block_device_names(a, b)),
+    (("封禁位置",), lambda a, d, b: "、".join(_block_device_names(a, b))),
+    (("block_at", "封禁时间"), lambda a, d, b: _iso(a.block_at)),
+    (("response_note", "处置描述"), lambda a, d, b: _emergency(a, a.response_note)),
+    (("response_owner", "应急人员"), lambda a, d, b: _emergency(a, _user_name(b, a.response_owner_id))),
+    (("disposal_target",), lambda a, d, b: a.disposal_target),
+    (("处置对象",), lambda a, d, b: DISPOSAL_TARGET_LABELS.get(a.disposal_target, a.disposal_target)),
+    (("disposal_action",), lambda a, d, b: a.disposal_action),
+    (("处置动作",), lambda a, d, b: DISPOSAL_ACTION_LABELS.get(a.disposal_action, a.disposal_action)),
+    (("disposal_ip", "处置IP"), lambda a, d, b: a.disposal_ip),
+    (("closure_target",), lambda a, d, b: a.closure_target),
+    (("闭环对象",), lambda a, d, b: DISPOSAL_TARGET_LABELS.get(a.closure_target, a.closure_target)),
+    (("closure_action",), lambda a, d, b: a.closure_action),
+    (("闭环动作",), lambda a, d, b: CLOSURE_ACTION_LABELS.get(a.closure_action, a.closure_action)),
+    (("false_positive_reason", "误报原因"), lambda a, d, b: a.false_positive_reason),
+    (("project_name", "项目名称"), lambda a, d, b: _project_name(a, b)),
+    (("device_name", "设备名称"), lambda a, d, b: _device_name(a, b)),
+    (("status_label", "状态"), lambda a, d, b: STATUS_LABELS.get(a.status, a.status)),
+    (("当前日期",), lambda a, d, b: a.created_at.strftime("%Y-%m-%d") if a.created_at else ""),
+    (("当前时间",), lambda a, d, b: a.created_at.strftime("%Y-%m-%d %H:%M:%S") if a.created_at else ""),
+    (("ai_result", "AI 研判结果"), lambda a, d, b: a.ai_result),
+    (("raw_text", "原始日志"), lambda a, d, b: a.raw_text),
+]
+# 以下变量优先于同名的语义化规则字段
+_PINNED_GROUPS: list[tuple[tuple[str, ...], Getter]] = [
+    (("告警编号",), lambda a, d, b: a.alert_code or a.id),
+    (("事件ID",), lambda a, d, b: _event_id(a, d)),
+    (("告警时间",), lambda a, d, b: _alert_time(a, d)),
+    (("告警设备",), lambda a, d, b: _device_name(a, b)),
+    (("告警设备IP地址",), lambda a, d, b: _device_ip(d)),
+    (("告警名称",), lambda a, d, b: _alert_name(a, d)),
+    (("攻击源IP",), lambda a, d, b: _source_ip(a, d)),
+    (("攻击目的IP",), lambda a, d, b: _destination_ip(a, d)),
+]
+# 资产变量优先级最高，覆盖统计与解析字段
+_ASSET_GROUPS: list[tuple[tuple[str, ...], Getter]] = [
+    (("src_asset_name", "源资产名称"), lambda a, d, b: _asset(a, d, b, 0).get("name", "")),
+    (("src_asset_area", "源资产区域"), lambda a, d, b: _asset(a, d, b, 0).get("area", "")),
+    (("src_asset_owner", "源资产负责人"), lambda a, d, b: _asset(a, d, b, 0).get("owner", "")),
+    (("dst_asset_name", "目的资产名称"), lambda a, d, b: _asset(a, d, b, 1).get("name", "")),
+    (("dst_asset_area", "目的资产区域"), lambda a, d, b: _asset(a, d, b, 1).get("area", "")),
+    (("dst_asset_owner", "目的资产负责人"), lambda a, d, b: _asset(a, d, b, 1).get("owner", "")),
+    (("dst_asset_criticality", "目的资产重要性"), lambda a, d, b: _asset(a, d, b, 1).get("criticality", "")),
+]
+
+
+def _field_map(groups: list[tuple[tuple[str, ...], Getter]]) -> dict[str, Getter]:
+    return {key: getter for keys, getter in groups for key in keys}
+
+
+FIELD_GETTERS = _field_map(_FIELD_GROUPS)
+PINNED_GETTERS = _field_map(_PINNED_GROUPS)
+ASSET_GETTERS = _field_map(_ASSET_GROUPS)
+
+
+def _semantic_values(alert: Alert, data: dict, rules: list[ParseRule]) -> dict[str, Any]:
+    # 只处理与该告警设备匹配或通用的规则
+    values = {}
+    for rule in rules:
+        if not rule.device_id or rule.device_id == alert.device_id:
+            value = data.get(rule.field_key)
+            if value is not None:
+                values[rule.name] = value
+    return values
+
+
+def alert_export_context(alert: Alert, batch: ExportBatch, rules: list[ParseRule], stats: dict[str, Any]) -> dict[str, Any]:
+    """
+    单条告警的完整导出变量。优先级由低到高：解析字段、告警字段、语义化规则字段、
+    固定告警变量、统计变量、资产变量。批量导出请使用 AlertExportPlan。
+    """
+    data = alert.parsed_fields or {}
+    context = dict(data)
+    for getters in (FIELD_GETTERS, PINNED_GETTERS):
+        context.update({key: getter(alert, data, batch) for key, getter in getters.items()})
+    context.update(_semantic_values(alert, data, rules))
+    context.update({key: getter(alert, data, batch) for key, getter in PINNED_GETTERS.items()})
+    context.update(stats)
+    context.update({key: getter(alert, data, batch) for key, getter in ASSET_GETTERS.items()})
+    return context
+
+
+_MISSING = object()
+
+
+class AlertExportPlan:
+    """
+    预编译的导出列计划：按与 alert_export_context 相同的优先级，为每列选定唯一的取值函数，
+    语义化规则按名称预先分组，统计变量在编译时固定为常量。
+    """
+
+    def __init__(self, columns: list[tuple[str, str]], rules: list[ParseRule], stats: dict[str, Any]):
+        self.labels = [label for label, _ in columns]
+        self.keys = [key for _, key in columns]
+        rules_by_name: dict[str, list[ParseRule]] = {}
+        for rule in rules:
+            rules_by_name.setdefault(rule.name, []).append(rule)
+        self._getters = [self._compile(key, rules_by_name.get(key, []), stats) for key in self.keys]
+
+    @staticmethod
+    def _compile(key: str, rules: list[ParseRule], stats: dict[str, Any]) -> Getter:
+        if key in ASSET_GETTERS:
+            return ASSET_GETTERS[key]
+        if key in stats:
+            value = stats[key]
+            return lambda a, d, b: value
+        if key in PINNED_GETTERS:
+            return PINNED_GETTERS[key]
+        base = FIELD_GETTERS.get(key) or (lambda a, d, b: d.get(key, ""))
+        if not rules:
+            return base
+
+        def semantic(alert: Alert, data: dict, batch: ExportBatch) -> Any:
+            value = _MISSING
+            for rule in rules:
+                if not rule.device_id or rule.device_id == alert.device_id:
+                    candidate = data.get(rule.field_key)
+                    if candidate is not None:
+                        value = candidate
+            return base(alert, data, batch) if value is _MISSING else value
+
+        return semantic
+
+    def values(self, alert: Alert, batch: ExportBatch) -> list[Any]:
+        data = alert.parsed_fields or {}
+        return [getter(alert, data, batch) for getter in self._getters]
+
+    def row(self, alert: Alert, batch: ExportBatch) -> list[str]:
+        """与 render_template("{{key}}", context) 逐列渲染的结果一致。"""
+        return [str(value) for value in self.values(alert, batch)]
@@ -1,3 +1,4 @@
+import threading
 from ipaddress import AddressValueError, ip_address, ip_network
 from typing import Any
 from uuid import uuid4
@@ -8,7 +9,11 @@ from app.core.timezone import now
 from app.models.entities import Alert, Setting, User
 from app.services.audit_service import write_audit
 from app.services.message_service import notify_all
-from core.lists import is_ip_in_list
+from core.lists import IPListIndex
+
+# 工作区名单区间索引缓存：workspace_id -> (签名, {"whitelist": 索引, "blacklist": 索引})
+_index_cache: dict[int, tuple[tuple, dict[str, IPListIndex]]] = {}
+_index_lock = threading.Lock()
 
 
 def get_ip_list_setting(db: Session, workspace_id: int) -> Setting:
@@ -27,6 +32,40 @@ def get_ip_list_setting(db: Session, workspace_id: int) -> Setting:
     return row
 
 
+def _index_signature(row: Setting | None) -> tuple:
+    if row is None:
+        return (None, 0, 0)
+    value = row.value or {}
+    return (row.updated_at, len(value.get("whitelist") or []), len(value.get("blacklist") or []))
+
+
+def get_ip_list_index(db: Session, workspace_id: int, row: Setting | None = None) -> dict[str, IPListIndex]:
+    """
+    返回工作区黑白名单的区间索引。名单变更时 updated_at 会刷新，签名不一致即重建，
+    因此多进程部署下其它进程的修改同样生效。
+    """
+    if row is None:
+        row = db.query(Setting).filter_by(workspace_id=workspace_id, key="ip_lists").first()
+    signature = _index_signature(row)
+    with _index_lock:
+        cached = _index_cache.get(workspace_id)
+    if cached and cached[0] == signature:
+        return cached[1]
+    value = (row.value if row else None) or {}
+    indexes = {list_type: IPListIndex(value.get(list_type) or []) for list_type in ("whitelist", "blacklist")}
+    with _index_lock:
+        _index_cache[workspace_id] = (signature, indexes)
+    return indexes
+
+
+def invalidate_ip_list_index(workspace_id: int | None = None) -> None:
+    with _index_lock:
+        if workspace_id is None:
+            _index_cache.clear()
+        else:
+            _index_cache.pop(workspace_id, None)
+
+
 def detect_value_type(value: str) -> str:
     text = (value or "").strip()
     if "/" in text:
@@ -129,6 +168,7 @@ def normalize_value(value: dict[str, Any] | None) -> dict[str, Any]:
 def set_ip_list_value(db: Session, row: Setting, value: dict[str, Any]) -> None:
     row.value = normalize_value(value)
     row.updated_at = now(db, row.workspace_id)
+    invalidate_ip_list_index(row.workspace_id)
 
 
 def save_ip_lists(db: Session, actor: User, whitelist: list[Any], blacklist: list[Any]) -> Setting:
@@ -208,6 +248,41 @@ def delete_ip_list_items(db: Session, actor: User, item_ids: list[str]) -> tuple
     return row, deleted
 
 
+def import_ip_list_values(
+    db: Session,
+    actor: User,
+    list_type: str,
+    values: list[str],
+    *,
+    description: str = "",
+) -> tuple[Setting, int, int, list[dict[str, str]]]:
+    """批量导入名单项，整批只规范化并写入一次。返回 (row, 新增数, 跳过数, 无效项)。"""
+    if list_type not in {"whitelist", "blacklist"}:
+        raise ValueError("名单类型仅支持 whitelist 或 blacklist")
+    row = get_ip_list_setting(db, actor.workspace_id)
+    value = normalize_value(row.value)
+    existing = {(item["list_type"], item["value"]) for item in value["items"]}
+    added = 0
+    skipped = 0
+    invalid: list[dict[str, str]] = []
+    for text in values:
+        key = (list_type, str(text or "").strip())
+        if key in existing:
+            skipped += 1
+            continue
+        try:
+            item = _item_from_value(text, list_type, description=description, source="import")
+        except ValueError as exc:
+            invalid.append({"value": text, "error": str(exc)})
+            continue
+        value["items"].append(item)
+        existing.add(key)
+        added += 1
+    if added:
+        set_ip_list_value(db, row, value)
+    return row, added, skipped, invalid
+
+
 def add_to_whitelist(
     db: Session,
     actor: User,
@@ -250,11 +325,10 @@ def block_ip(
         return {"blocked": False, "was_whitelisted": False, "removed_whitelist": []}
 
     row = get_ip_list_setting(db, actor.workspace_id)
+    matched_whitelist = get_ip_list_index(db, actor.workspace_id, row)["whitelist"].match(ip)
     value = normalize_value(row.value)
-    whitelist = normalize_items(value.get("whitelist", []))
     blacklist = normalize_items(value.get("blacklist", []))
 
-    matched_whitelist = [item for item in whitelist if is_ip_in_list(ip, [item])]
     removed_whitelist = [item for item in matched_whitelist if item == ip]
     if removed_whitelist:
         value["items"] = [
@@ -3,19 +3,20 @@ from __future__ import annotations
 import json
 import re
 import sys
+import threading
 from pathlib import Path
 from typing import Any
 from datetime import datetime
 
 from fastapi import HTTPException
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.core.timezone import now as app_now
 from app.models.entities import Device, ParseRule, Template, User
-from app.models.entities import Setting
-from app.services.asset_service import asset_summary_fields, build_asset_context, lookup_asset_by_ip
-from app.services.template_service import render_template
-from app.services.stats_service import get_aggregate_stats
+from app.services.asset_service import asset_summary_fields, resolve_asset_contexts
+from app.services.template_service import render_template, template_variables
+from app.services.stats_service import STATS_VARIABLES, get_aggregate_stats
 from app.services.workflow_constants import DISPOSAL_TARGET_LABELS, DISPOSAL_ACTION_LABELS
 
 ROOT = Path(__file__).resolve().parents[3]
@@ -24,7 +25,7 @@ if str(ROOT) not in sys.path:
 
 from core.config import get_default_config  # noqa: E402
 from core.parser import parse_log, parse_text  # noqa: E402
-from core.lists import is_ip_in_list  # noqa: E402
+from app.services.ip_list_service import get_ip_list_index  # noqa: E402
 from output.formatter import render_chat, render_excel  # noqa: E402
 
 
@@ -55,7 +56,7 @@ def _rules_to_config(rules: list[ParseRule]) -> dict[str, Any]:
     return cfg
 
 
-def _builtin_value(rule: ParseRule, user: User, device: Device | None = None) -> str:
+def _builtin_value(rule: "CompiledRule", user: User, device: Device | None = None) -> str:
     key = (rule.pattern or "").strip()
     now = app_now(None, user.workspace_id)
     values = {
@@ -78,37 +79,126 @@ def _normalize_ip(value: Any) -> str:
     return match.group(0) if match else str(value or "")
 
 
-def _extract_value(rule: ParseRule, text: str, user: User, device: Device | None) -> str | None:
+def _extract_value(rule: "CompiledRule", text: str, user: User, device: Device | None) -> str | None:
     if rule.match_type == "fixed":
         return rule.pattern
     if rule.match_type == "builtin":
         return _builtin_value(rule, user, device)
-    if rule.match_type == "regex":
-        try:
-            reg = re.compile(rule.pattern, re.S)
-            if getattr(rule, "match_all", False):
-                matches = list(reg.finditer(text))
-                if matches:
-                    results = []
-                    for m in matches:
-                        results.append(m.group(1) if m.groups() else m.group(0))
-                    return ", ".join(results)
-            else:
-                m = reg.search(text)
-                if m:
-                    return m.group(1) if m.groups() else m.group(0)
-        except re.error:
-            pass
+    if rule.match_type == "regex" and rule.regex is not None:
+        reg = rule.regex
+        if rule.match_all:
+            matches = list(reg.finditer(text))
+            if matches:
+                results = []
+                for m in matches:
+                    results.append(m.group(1) if m.groups() else m.group(0))
+                return ", ".join(results)
+        else:
+            m = reg.search(text)
+            if m:
+                return m.group(1) if m.groups() else m.group(0)
     return None
 
 
-def _regex_matches(rule: ParseRule, text: str) -> bool:
-    if rule.match_type != "regex":
-        return False
-    try:
-        return bool(re.search(rule.pattern, text, re.S))
-    except re.error:
+def _regex_matches(rule: "CompiledRule", text: str) -> bool:
+    if rule.match_type != "regex" or rule.regex is None:
         return False
+    return bool(rule.regex.search(text))
+
+
+class CompiledRule:
+    """ParseRule 的只读快照，正则在构建规则集时一次性编译，可跨请求/会话复用。"""
+
+    __slots__ = (
+        "id", "name", "field_key", "field_label", "match_type", "pattern",
+        "priority", "is_meta", "match_all", "device_id", "regex",
+    )
+
+    def __init__(self, rule: ParseRule):
+        self.id = rule.id
+        self.name = rule.name
+        self.field_key = rule.field_key
+        self.field_label = rule.field_label or ""
+        self.match_type = rule.match_type
+        self.pattern = rule.pattern or ""
+        self.priority = rule.priority
+        self.is_meta = bool(rule.is_meta)
+        self.match_all = bool(getattr(rule, "match_all", False))
+        self.device_id = rule.device_id
+        self.regex: re.Pattern[str] | None = None
+        if self.match_type == "regex":
+            try:
+                self.regex = re.compile(self.pattern, re.S)
+            except re.error:
+                self.regex = None
+
+
+class CompiledRuleSet:
+    """某个 (工作区, 设备) 下已启用规则的编译结果，按字段分组并预先排好优先级。"""
+
+    def __init__(self, rules: list[ParseRule], signature: tuple[Any, ...] = ()):
+        self.signature = signature
+        self.rules = [CompiledRule(rule) for rule in rules]
+        grouped: dict[str, list[CompiledRule]] = {}
+        for rule in self.rules:
+            grouped.setdefault(rule.field_key, []).append(rule)
+        # "other" 字段保持查询顺序，其余字段按 (非元规则优先, priority) 排序
+        self.by_key: dict[str, list[CompiledRule]] = {
+            key: items if key == "other" else sorted(items, key=lambda x: (x.is_meta, x.priority))
+            for key, items in grouped.items()
+        }
+        self.field_labels = {rule.field_key: rule.field_label for rule in self.rules if rule.field_label}
+
+    def matched_rules(self, text: str) -> list[dict[str, Any]]:
+        return [{"id": r.id, "name": r.name, "field_key": r.field_key} for r in self.rules if _regex_matches(r, text)]
+
+
+# 编译后的规则集缓存，键为 (workspace_id, device_id)。
+# 规则接口写入时主动失效；另外每次取用前比对一次轻量签名，其它进程/入口（备份恢复、设备包导入等）的修改也能及时生效。
+_RULE_SET_CACHE_MAX = 256
+_rule_set_cache: dict[tuple[int, int | None], CompiledRuleSet] = {}
+_rule_set_lock = threading.Lock()
+
+
+def _rule_signature(db: Session, workspace_id: int) -> tuple[Any, ...]:
+    row = (
+        db.query(func.count(ParseRule.id), func.max(ParseRule.id), func.max(ParseRule.updated_at))
+        .filter(ParseRule.workspace_id == workspace_id)
+        .one()
+    )
+    return tuple(row)
+
+
+def get_rule_set(db: Session, workspace_id: int, device_id: int | None = None) -> CompiledRuleSet:
+    """返回工作区/设备对应的已编译规则集，命中缓存时不再加载和编译规则。"""
+    key = (workspace_id, device_id or None)
+    signature = _rule_signature(db, workspace_id)
+    with _rule_set_lock:
+        cached = _rule_set_cache.get(key)
+    if cached is not None and cached.signature == signature:
+        return cached
+
+    query = db.query(ParseRule).filter(ParseRule.workspace_id == workspace_id, ParseRule.enabled.is_(True))
+    if device_id:
+        query = query.filter((ParseRule.device_id == device_id) | (ParseRule.device_id.is_(None)))
+    rule_set = CompiledRuleSet(query.order_by(ParseRule.id.asc()).all(), signature)
+
+    with _rule_set_lock:
+        _rule_set_cache.pop(key, None)
+        _rule_set_cache[key] = rule_set
+        while len(_rule_set_cache) > _RULE_SET_CACHE_MAX:
+            _rule_set_cache.pop(next(iter(_rule_set_cache)))
+    return rule_set
+
+
+def invalidate_rule_set(workspace_id: int | None = None) -> None:
+    """规则增删改后调用，丢弃该工作区（或全部）已编译的规则集。"""
+    with _rule_set_lock:
+        if workspace_id is None:
+            _rule_set_cache.clear()
+            return
+        for key in [key for key in _rule_set_cache if key[0] == workspace_id]:
+            del _rule_set_cache[key]
 
 
 def _get_workspace_device(db: Session, user: User, device_id: int | None) -> Device | None:
@@ -136,6 +226,250 @@ def _get_compatible_template(
     return template
 
 
+class ParseSession:
+    """
+    一次解析请求共享的工作区状态：设备、已编译规则集、名单、模板和统计只加载一次，
+    单条解析与批量解析都基于它完成。
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        user: User,
+        device_id: int | None = None,
+        message_template_id: int | None = None,
+        excel_template_id: int | None = None,
+    ):
+        self.db = db
+        self.user = user
+        self.device_id = device_id
+        self.device = _get_workspace_device(db, user, device_id)
+        self.rule_set = get_rule_set(db, user.workspace_id, device_id)
+
+        device = self.device
+        current = app_now(db, user.workspace_id)
+        self.base_values = {
+            "current_time": current.strftime("%Y-%m-%d %H:%M:%S"),
+            "current_date": current.strftime("%Y-%m-%d"),
+            "current_user": user.display_name or user.username,
+            "current_username": user.username,
+            "workspace_id": str(user.workspace_id),
+            "current_device": device.name if device else "通用设备",
+            "device_name": device.name if device else "通用设备",
+            "current_device_vendor": device.vendor if device else "Generic",
+            "current_device_product": device.product if device else "Security Device",
+            "current_device_ip": device.version if device else "",
+            "current_device_version": device.version if device else "",
+            "assignee_name": "未分配",
+            "status_label": "研判中",
+            "raw_text": "",
+            "alert_code": "",
+            "alert_hash": "",
+            "ti_result": "",
+            "ai_result": "",
+            "src_ip_location": "",
+            "dst_ip_location": "",
+            "project_name": "",
+            "created_by_name": user.display_name or user.username,
+            "last_updated_by_name": user.display_name or user.username,
+        }
+
+        self.ip_lists = get_ip_list_index(db, user.workspace_id)
+        self._ip_list_hits: dict[str, tuple[str | None, str | None]] = {}
+
+        # 注入字段名称映射
+        self.cfg = _base_config()
+        self.cfg["fields"] = dict(self.rule_set.field_labels)
+
+        template_query = db.query(Template).filter_by(workspace_id=user.workspace_id)
+        if device_id:
+            template_query = template_query.filter((Template.device_id == device_id) | (Template.device_id.is_(None)))
+        else:
+            template_query = template_query.filter(Template.device_id.is_(None))
+        self.templates = template_query.all()
+        self.message_template = _get_compatible_template(db, user, message_template_id, device_id)
+        self.excel_template = _get_compatible_template(db, user, excel_template_id, device_id)
+
+        # 注入全局统计信息：仅当模板引用了统计变量时才读取（工作区级短时快照）
+        self.stats: dict[str, Any] = {}
+        referenced: set[str] = set()
+        for item in [*self.templates, self.message_template, self.excel_template]:
+            if item is not None:
+                referenced |= template_variables(item.content)
+        if referenced & STATS_VARIABLES:
+            try:
+                self.stats = get_aggregate_stats(db, user.workspace_id)
+            except Exception:
+                pass
+
+    def extract(self, text: str) -> tuple[dict[str, Any], dict[str, Any]]:
+        """按规则提取字段，返回 (parsed_fields, 模板语义化字典)，尚未关联资产。"""
+        user = self.user
+        data: dict[str, Any] = dict(self.base_values)
+        data["raw_text"] = text
+        semantic_data: dict[str, Any] = {}
+
+        # 语义化映射系统字段
+        semantic_builtins = {
+            "告警ID": data["alert_code"],
+            "告警Hash": data["alert_hash"],
+            "创建人": data["created_by_name"],
+            "最后更新人": data["last_updated_by_name"],
+            "负责人": data["assignee_name"],
+            "状态": data["status_label"],
+            "当前时间": data["current_time"],
+            "当前日期": data["current_date"],
+            "设备名称": data["device_name"],
+            "设备厂商": data["current_device_vendor"],
+            "设备产品": data["current_device_product"],
+            "设备IP": data["current_device_ip"],
+            "设备版本": data["current_device_version"],
+            "登录用户名称": data["current_user"],
+            "登录用户名": data["current_username"],
+            "项目名称": data["project_name"],
+            "原始日志": data["raw_text"],
+            "AI 研判结果": data["ai_result"],
+            "威胁情报结果": data["ti_result"],
+        }
+        semantic_data.update(semantic_builtins)
+        semantic_data.update(self.stats)
+
+        # 字段提取逻辑
+        meta_keys = {"event_type", "alert_time", "src_ip", "src_port", "dst_ip", "dst_port", "protocol", "request", "response", "payload", "domain"}
+
+        for field_key, sorted_rules in self.rule_set.by_key.items():
+            if field_key == "other":
+                for r in sorted_rules:
+                    val = _extract_value(r, text, user, self.device)
+                    if val:
+                        data[f"other_{r.id}"] = val
+                        semantic_data[r.name] = val
+                continue
+
+            for rule in sorted_rules:
+                value = _extract_value(rule, text, user, self.device)
+                if value:
+                    # 只在主字典存入优先级最高的一个值
+                    if field_key not in data:
+                        data[field_key] = value
+                    # 语义化字典存入所有命中的规则名，方便不同命名的模板引用
+                    semantic_data[rule.name] = value
+
+        # 确保 10 种元字段即使没匹配到也存在（空字符串）
+        for mk in meta_keys:
+            if mk not in data:
+                data[mk] = ""
+
+        # IP 归一化
+        for ip_key in ("src_ip", "dst_ip"):
+            if data.get(ip_key):
+                data[ip_key] = _normalize_ip(data[ip_key])
+
+        # 模板变量同时支持规则名和字段显示名。
+        # 设备专属规则可以使用带前缀的唯一名称，模板仍可统一引用 {{告警时间}}、{{源IP}} 等字段标签。
+        for rule in self.rule_set.rules:
+            if rule.field_label and data.get(rule.field_key):
+                semantic_data[rule.field_label] = data[rule.field_key]
+        return data, semantic_data
+
+    def ip_list_alerts(self, data: dict[str, Any]) -> list[dict[str, str]]:
+        alerts = []
+        for key, label in (("src_ip", "源IP"), ("dst_ip", "目的IP")):
+            val = data.get(key)
+            if not val:
+                continue
+            val = str(val)
+            # 批量解析时同一 IP 反复出现，名单只匹配一次
+            hits = self._ip_list_hits.get(val)
+            if hits is None:
+                # 只用到名单中第一个命中项，first() 为一次二分，不随宽网段退化
+                hits = (self.ip_lists["whitelist"].first(val), self.ip_lists["blacklist"].first(val))
+                self._ip_list_hits[val] = hits
+            if hits[0]:
+                alerts.append({"field": key, "label": label, "ip": val, "list": "whitelist", "range": hits[0], "message": f"{label} {val} 命中白名单"})
+            if hits[1]:
+                alerts.append({"field": key, "label": label, "ip": val, "list": "blacklist", "range": hits[1], "message": f"{label} {val} 命中黑名单"})
+        return alerts
+
+    @staticmethod
+    def asset_lookups(data: dict[str, Any]) -> list[tuple[str, str]]:
+        """资产关联的查询键：源 IP 只按 IP，目的 IP 可用域名兜底。"""
+        final_domain = str(data.get("domain") or "").strip()
+        return [(str(data.get("src_ip") or ""), ""), (str(data.get("dst_ip") or ""), final_domain)]
+
+    def render(
+        self,
+        text: str,
+        data: dict[str, Any],
+        semantic_data: dict[str, Any],
+        src_asset: dict[str, Any],
+        dst_asset: dict[str, Any],
+    ) -> dict[str, Any]:
+        ip_list_alerts = self.ip_list_alerts(data)
+
+        asset_context = {"src_asset": src_asset, "dst_asset": dst_asset}
+        data["asset_context"] = asset_context
+        data["src_asset_context"] = src_asset
+        data["dst_asset_context"] = dst_asset
+        data.update(asset_summary_fields("src", src_asset))
+        data.update(asset_summary_fields("dst", dst_asset))
+
+        # 注入语义化资产信息
+        semantic_data.update({
+            "源资产名称": src_asset.get("name", ""),
+            "源资产区域": src_asset.get("area", ""),
+            "源资产负责人": src_asset.get("owner", ""),
+            "源资产重要性": src_asset.get("criticality", ""),
+            "源资产环境": src_asset.get("environment", ""),
+            "源资产指纹": json.dumps(src_asset.get("fingerprints", {}), ensure_ascii=False),
+            "目的资产名称": dst_asset.get("name", ""),
+            "目的资产区域": dst_asset.get("area", ""),
+            "目的资产负责人": dst_asset.get("owner", ""),
+            "目的资产重要性": dst_asset.get("criticality", ""),
+            "目的资产环境": dst_asset.get("environment", ""),
+            "目的资产指纹": json.dumps(dst_asset.get("fingerprints", {}), ensure_ascii=False),
+            "源IP地理位置": data.get("src_ip_location", ""),
+            "目的IP地理位置": data.get("dst_ip_location", ""),
+            "处置对象": DISPOSAL_TARGET_LABELS.get(data.get("disposal_target", ""), data.get("disposal_target", "")),
+            "处置动作": DISPOSAL_ACTION_LABELS.get(data.get("disposal_action", ""), data.get("disposal_action", "")),
+        })
+
+        # 可选的渲染模板
+        for item in self.templates:
+            data[f"template_{item.id}"] = render_template(item.content, semantic_data)
+
+        message_template = self.message_template
+        excel_template = self.excel_template
+        formatted_chat = render_template(message_template.content, semantic_data) if message_template else render_chat(data, self.cfg)
+        formatted_excel = render_template(excel_template.content, semantic_data) if excel_template else render_excel(data, self.cfg)
+
+        return {
+            "parsed_fields": data,
+            "matched_rules": self.rule_set.matched_rules(text),
+            "formatted_chat": formatted_chat,
+            "formatted_excel": formatted_excel,
+            "ip_list_alerts": ip_list_alerts,
+            "asset_context": asset_context,
+            "warnings": []
+        }
+
+    def parse(self, text: str) -> dict[str, Any]:
+        return self.parse_many([text])[0]
+
+    def parse_many(self, texts: list[str]) -> list[dict[str, Any]]:
+        """批量解析：先提取全部字段，再一次性关联资产，最后逐条渲染。"""
+        extracted = [self.extract(text) for text in texts]
+        lookups: list[tuple[str, str]] = []
+        for data, _semantic in extracted:
+            lookups.extend(self.asset_lookups(data))
+        # 资产关联：个体优先，网段兜底，最后域名
+        contexts = resolve_asset_contexts(self.db, self.user.workspace_id, lookups)
+        results = []
+        for index, (text, (data, semantic_data)) in enumerate(zip(texts, extracted)):
+            results.append(self.render(text, data, semantic_data, contexts[2 * index], contexts[2 * index + 1]))
+        return results
+
+
 def parse_text_for_user(
     db: Session,
     user: User,
@@ -144,220 +478,21 @@ def parse_text_for_user(
     message_template_id: int | None = None,
     excel_template_id: int | None = None,
 ) -> dict[str, Any]:
-    query = db.query(ParseRule).filter(ParseRule.workspace_id == user.workspace_id, ParseRule.enabled.is_(True))
-    if device_id:
-        query = query.filter((ParseRule.device_id == device_id) | (ParseRule.device_id.is_(None)))
-    
-    device = _get_workspace_device(db, user, device_id)
-    all_rules = query.all()
-    
-    # 1. 规则优先级校验与分组
-    rules_by_key: dict[str, list[ParseRule]] = {}
-    for r in all_rules:
-        rules_by_key.setdefault(r.field_key, []).append(r)
-    
-    data: dict[str, Any] = {}
-    semantic_data: dict[str, Any] = {}
-    
-    # 注入基础环境变量
-    current = app_now(db, user.workspace_id)
-    base_values = {
-        "current_time": current.strftime("%Y-%m-%d %H:%M:%S"),
-        "current_date": current.strftime("%Y-%m-%d"),
-        "current_user": user.display_name or user.username,
-        "current_username": user.username,
-        "workspace_id": str(user.workspace_id),
-        "current_device": device.name if device else "通用设备",
-        "device_name": device.name if device else "通用设备",
-        "current_device_vendor": device.vendor if device else "Generic",
-        "current_device_product": device.product if device else "Security Device",
-        "current_device_ip": device.version if device else "",
-        "current_device_version": device.version if device else "",
-        "assignee_name": "未分配",
-        "status_label": "研判中",
-        "raw_text": text,
-        "alert_code": "",
-        "alert_hash": "",
-        "ti_result": "",
-        "ai_result": "",
-        "src_ip_location": "",
-        "dst_ip_location": "",
-        "project_name": "",
-        "created_by_name": user.display_name or user.username,
-        "last_updated_by_name": user.display_name or user.username,
-    }
-    data.update(base_values)
-    
-    # 语义化映射系统字段
-    semantic_builtins = {
-        "告警ID": data["alert_code"],
-        "告警Hash": data["alert_hash"],
-        "创建人": data["created_by_name"],
-        "最后更新人": data["last_updated_by_name"],
-        "负责人": data["assignee_name"],
-        "状态": data["status_label"],
-        "当前时间": data["current_time"],
-        "当前日期": data["current_date"],
-        "设备名称": data["device_name"],
-        "设备厂商": data["current_device_vendor"],
-        "设备产品": data["current_device_product"],
-        "设备IP": data["current_device_ip"],
-        "设备版本": data["current_device_version"],
-        "登录用户名称": data["current_user"],
-        "登录用户名": data["current_username"],
-        "项目名称": data["project_name"],
-        "原始日志": data["raw_text"],
-        "AI 研判结果": data["ai_result"],
-        "威胁情报结果": data["ti_result"],
-    }
-    semantic_data.update(semantic_builtins)
-    
-    # 注入全局统计信息
-    try:
-        stats = get_aggregate_stats(db, user.workspace_id)
-        semantic_data.update(stats)
-    except Exception:
-        pass
-
-    # 2. 字段提取逻辑
-    meta_keys = {"event_type", "alert_time", "src_ip", "src_port", "dst_ip", "dst_port", "protocol", "request", "response", "payload", "domain"}
-    
-    for field_key, rules in rules_by_key.items():
-        sorted_rules = sorted(rules, key=lambda x: (x.is_meta, x.priority))
-        
-        if field_key == "other":
-            for r in rules:
-                val = _extract_value(r, text, user, device)
-                if val:
-                    data[f"other_{r.id}"] = val
-                    semantic_data[r.name] = val
-            continue
+    session = ParseSession(db, user, device_id, message_template_id, excel_template_id)
+    return session.parse(text)
 
-        for rule in sorted_rules:
-            value = _extract_value(rule, text, user, device)
-            if value:
-                # 只在主字典存入优先级最高的一个值
-                if field_key not in data:
-                    data[field_key] = value
-                # 语义化字典存入所有命中的规则名，方便不同命名的模板引用
-                semantic_data[rule.name] = value
-
-    # 确保 10 种元字段即使没匹配到也存在（空字符串）
-    for mk in meta_keys:
-        if mk not in data:
-            data[mk] = ""
-
-    # 3. IP 归一化与情报检测
-    for ip_key in ("src_ip", "dst_ip"):
-        if data.get(ip_key):
-            data[ip_key] = _normalize_ip(data[ip_key])
-
-    # 模板变量同时支持规则名和字段显示名。
-    # 设备专属规则可以使用带前缀的唯一名称，模板仍可统一引用 {{告警时间}}、{{源IP}} 等字段标签。
-    for rule in all_rules:
-        if rule.field_label and data.get(rule.field_key):
-            semantic_data[rule.field_label] = data[rule.field_key]
-            
-    ip_list_setting = db.query(Setting).filter_by(workspace_id=user.workspace_id, key="ip_lists").first()
-    ip_lists = ip_list_setting.value if ip_list_setting else {"whitelist": [], "blacklist": []}
-    ip_list_alerts = []
-    for key, label in (("src_ip", "源IP"), ("dst_ip", "目的IP")):
-        val = data.get(key)
-        if val and is_ip_in_list(str(val), ip_lists.get("whitelist", [])):
-            ip_list_alerts.append({"field": key, "label": label, "ip": str(val), "list": "whitelist", "message": f"{label} {val} 命中白名单"})
-        if val and is_ip_in_list(str(val), ip_lists.get("blacklist", [])):
-            ip_list_alerts.append({"field": key, "label": label, "ip": str(val), "list": "blacklist", "message": f"{label} {val} 命中黑名单"})
-
-    # 4. 资产关联：个体优先，网段兜底，最后域名
-    def _find_asset(ip_val: str | None, domain_val: str | None) -> dict[str, Any]:
-        from app.services.asset_service import lookup_asset_by_ip, lookup_asset_by_domain, lookup_asset_by_segment, build_asset_context, build_segment_context
-        
-        ip_val = (ip_val or "").strip()
-        domain_val = (domain_val or "").strip()
-        
-        # 1. 尝试按 IP 匹配个体资产
-        if ip_val:
-            asset_obj = lookup_asset_by_ip(db, user.workspace_id, ip_val)
-            if asset_obj:
-                return build_asset_context(asset_obj)
-        
-        # 2. 尝试按域名匹配个体资产
-        if domain_val:
-            asset_obj = lookup_asset_by_domain(db, user.workspace_id, domain_val)
-            if asset_obj:
-                return build_asset_context(asset_obj)
-        
-        # 3. 尝试按 IP 匹配网段资产（兜底）
-        if ip_val:
-            seg_obj = lookup_asset_by_segment(db, user.workspace_id, ip_val)
-            if seg_obj:
-                return build_segment_context(seg_obj)
-        
-        return {}
-
-    final_domain = str(data.get("domain") or "").strip()
-
-    src_asset = _find_asset(str(data.get("src_ip") or ""), None)
-    dst_asset = _find_asset(str(data.get("dst_ip") or ""), final_domain)
-
-    asset_context = {"src_asset": src_asset, "dst_asset": dst_asset}
-    data["asset_context"] = asset_context
-    data["src_asset_context"] = src_asset
-    data["dst_asset_context"] = dst_asset
-    data.update(asset_summary_fields("src", src_asset))
-    data.update(asset_summary_fields("dst", dst_asset))
-
-    # 注入语义化资产信息
-    semantic_data.update({
-        "源资产名称": src_asset.get("name", ""),
-        "源资产区域": src_asset.get("area", ""),
-        "源资产负责人": src_asset.get("owner", ""),
-        "源资产重要性": src_asset.get("criticality", ""),
-        "源资产环境": src_asset.get("environment", ""),
-        "源资产指纹": json.dumps(src_asset.get("fingerprints", {}), ensure_ascii=False),
-        "目的资产名称": dst_asset.get("name", ""),
-        "目的资产区域": dst_asset.get("area", ""),
-        "目的资产负责人": dst_asset.get("owner", ""),
-        "目的资产重要性": dst_asset.get("criticality", ""),
-        "目的资产环境": dst_asset.get("environment", ""),
-        "目的资产指纹": json.dumps(dst_asset.get("fingerprints", {}), ensure_ascii=False),
-        "源IP地理位置": data.get("src_ip_location", ""),
-        "目的IP地理位置": data.get("dst_ip_location", ""),
-        "处置对象": DISPOSAL_TARGET_LABELS.get(data.get("disposal_target", ""), data.get("disposal_target", "")),
-        "处置动作": DISPOSAL_ACTION_LABELS.get(data.get("disposal_action", ""), data.get("disposal_action", "")),
-    })
-
-    # 4. 可选的渲染模板
-    # 注入字段名称映射
-    field_labels = {r.field_key: r.field_label for r in all_rules if r.field_label}
-    cfg = _base_config()
-    cfg["fields"] = field_labels
 
-    template_query = db.query(Template).filter_by(workspace_id=user.workspace_id)
-    if device_id:
-        template_query = template_query.filter((Template.device_id == device_id) | (Template.device_id.is_(None)))
-    else:
-        template_query = template_query.filter(Template.device_id.is_(None))
-    
-    db_templates = template_query.all()
-    for item in db_templates:
-        data[f"template_{item.id}"] = render_template(item.content, semantic_data)
-
-    message_template = _get_compatible_template(db, user, message_template_id, device_id)
-    excel_template = _get_compatible_template(db, user, excel_template_id, device_id)
-
-    formatted_chat = render_template(message_template.content, semantic_data) if message_template else render_chat(data, cfg)
-    formatted_excel = render_template(excel_template.content, semantic_data) if excel_template else render_excel(data, cfg)
-    
-    return {
-        "parsed_fields": data,
-        "matched_rules": [{"id": r.id, "name": r.name, "field_key": r.field_key} for r in all_rules if _regex_matches(r, text)],
-        "formatted_chat": formatted_chat,
-        "formatted_excel": formatted_excel,
-        "ip_list_alerts": ip_list_alerts,
-        "asset_context": asset_context,
-        "warnings": []
-    }
+def parse_texts_for_user(
+    db: Session,
+    user: User,
+    texts: list[str],
+    device_id: int | None = None,
+    message_template_id: int | None = None,
+    excel_template_id: int | None = None,
+) -> list[dict[str, Any]]:
+    """同一设备的多条日志共用一次工作区状态加载和批量资产查询。"""
+    session = ParseSession(db, user, device_id, message_template_id, excel_template_id)
+    return session.parse_many(texts)
 
 
 def generate_candidate_rules(sample_log: str) -> list[dict[str, Any]]:
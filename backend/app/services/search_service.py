@@ -0,0 +1,209 @@
+"""
+告警全文检索。
+
+告警列表、CSV 导出与 AI 工具的关键字搜索统一走这里，按数据库选择可走索引的实现：
+- PostgreSQL：按字段组建立 to_tsvector 表达式 GIN 索引，另为各字段建 pg_trgm 三元组 GIN 索引。
+  pg_trgm 可用时按 ILIKE '%q%' 子串匹配（走三元组索引）；不可用时 ILIKE 只能顺序扫描，
+  改为 tsvector 整词短语匹配（走表达式索引）。排序使用 ts_rank，表达式索引随行写入自动维护。
+- SQLite：FTS5 外部内容表 alerts_fts（trigram 分词，支持子串匹配），由触发器在增删改时同步，
+  排序使用 bm25。SQLite 版本过低或搜索词不足 3 个字符时退回 LIKE。
+"""
+import logging
+import threading
+from typing import Any
+
+from sqlalchemy import case, func, literal, literal_column, or_, select, text
+from sqlalchemy.orm import Query, Session
+
+from app.models.entities import Alert
+
+logger = logging.getLogger("eff-search")
+
+# 字段组：alert 为告警标识类字段，raw 为原始报文
+SEARCH_FIELDS = {
+    "alert": ("alert_code", "alert_hash", "source_ip", "destination_ip", "event_type"),
+    "raw": ("raw_text",),
+}
+FTS_TABLE = "alerts_fts"
+FTS_COLUMNS = ("alert_code", "alert_hash", "source_ip", "destination_ip", "event_type", "raw_text")
+# trigram 分词器无法匹配短于 3 个字符的搜索词
+FTS_MIN_LENGTH = 3
+# FTS5 trigram 分词器自 SQLite 3.34 起提供
+SQLITE_TRIGRAM_VERSION = (3, 34, 0)
+# tsvector 上限 1MB，原始报文只取前若干字符建全文索引，超长报文的尾部仍可通过三元组 ILIKE 搜到
+RAW_TSVECTOR_CHARS = 65536
+# 搜索词与标识字段完全相同时额外加分，使精确命中排在最前
+EXACT_MATCH_BOOST = 10.0
+
+_fts_ready: dict[str, bool] = {}
+_fts_lock = threading.Lock()
+
+
+def _dialect(db: Session) -> str:
+    return db.bind.dialect.name if db.bind else "sqlite"
+
+
+def _pg_vector_sql(group: str) -> str:
+    # 查询与索引必须使用同一表达式，PostgreSQL 才会命中表达式索引
+    parts = " || ' ' || ".join(
+        f"coalesce(left({name}, {RAW_TSVECTOR_CHARS}), '')" if name == "raw_text" else f"coalesce({name}, '')"
+        for name in SEARCH_FIELDS[group]
+    )
+    return f"to_tsvector('simple', {parts})"
+
+
+# ---- 建索引（启动时由 bootstrap 调用） ----
+
+
+def _ensure_postgres_search(db: Session) -> None:
+    # 旧版按完整 raw_text 建的索引会让超长报文写入失败，换成截断表达式的新索引
+    db.execute(text("DROP INDEX IF EXISTS ix_alerts_search_raw_fts"))
+    for group in SEARCH_FIELDS:
+        name = "ix_alerts_search_raw_prefix_fts" if group == "raw" else f"ix_alerts_search_{group}_fts"
+        db.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON alerts USING GIN (({_pg_vector_sql(group)}))"))
+    try:
+        # 扩展需要相应权限，失败时仅缺少三元组索引，搜索结果不受影响
+        with db.begin_nested():
+            db.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except Exception as exc:
+        logger.warning("pg_trgm unavailable, substring search will not use trigram indexes: %s", exc)
+        return
+    for name in FTS_COLUMNS:
+        db.execute(text(f"CREATE INDEX IF NOT EXISTS ix_alerts_{name}_trgm ON alerts USING GIN ({name} gin_trgm_ops)"))
+
+
+def _ensure_sqlite_search(db: Session) -> None:
+    version = tuple(int(part) for part in db.execute(text("SELECT sqlite_version()")).scalar().split("."))
+    if version < SQLITE_TRIGRAM_VERSION:
+        logger.warning("SQLite %s lacks the FTS5 trigram tokenizer, falling back to LIKE search", ".".join(map(str, version)))
+        return
+    exists = db.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}).first()
+    columns = ", ".join(FTS_COLUMNS)
+    new_values = ", ".join(f"new.{name}" for name in FTS_COLUMNS)
+    old_values = ", ".join(f"old.{name}" for name in FTS_COLUMNS)
+    if not exists:
+        db.execute(text(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({columns}, content='alerts', content_rowid='id', tokenize='trigram')"))
+    db.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS alerts_fts_ai AFTER INSERT ON alerts BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+    ))
+    db.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS alerts_fts_ad AFTER DELETE ON alerts BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END"
+    ))
+    db.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS alerts_fts_au AFTER UPDATE OF {columns} ON alerts BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+    ))
+    if not exists:
+        # 首次建表时把已有告警写入索引
+        db.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def ensure_search_indexes(db: Session) -> None:
+    if _dialect(db) == "postgresql":
+        _ensure_postgres_search(db)
+    elif _dialect(db) == "sqlite":
+        _ensure_sqlite_search(db)
+    with _fts_lock:
+        _fts_ready.clear()
+
+
+def _search_ready(db: Session, sql: str, **params: Any) -> bool:
+    # 检查结果按数据库缓存，ensure_search_indexes 重建索引后清空
+    key = f"{db.bind.url if db.bind else ''}|{sql}"
+    with _fts_lock:
+        ready = _fts_ready.get(key)
+    if ready is None:
+        ready = db.execute(text(sql), params).first() is not None
+        with _fts_lock:
+            _fts_ready[key] = ready
+    return ready
+
+
+def _sqlite_fts_available(db: Session) -> bool:
+    return _search_ready(db, "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name", name=FTS_TABLE)
+
+
+def _pg_trgm_available(db: Session) -> bool:
+    return _search_ready(db, "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+
+
+# ---- 查询 ----
+
+
+def _terms(q: str) -> list[str]:
+    return [term for term in q.split() if term]
+
+
+def _fts_match(q: str, group: str) -> str:
+    # 每个词作为短语（trigram 下即子串）匹配，多个词之间为 AND；列过滤限定在字段组内
+    phrases = " ".join('"' + term.replace('"', '""') + '"' for term in _terms(q))
+    return "{" + " ".join(SEARCH_FIELDS[group]) + "} : (" + phrases + ")"
+
+
+def _exact_boost(q: str, group: str) -> Any:
+    columns = [getattr(Alert, name) for name in SEARCH_FIELDS[group] if name != "raw_text"]
+    if not columns:
+        return None
+    return case((or_(*(column == q for column in columns)), literal(EXACT_MATCH_BOOST)), else_=literal(0.0))
+
+
+def _with_boost(score: Any, q: str, group: str) -> Any:
+    boost = _exact_boost(q, group)
+    return score if boost is None else score + boost
+
+
+def _like_filter(q: str, group: str) -> Any:
+    like = f"%{q}%"
+    return or_(*(getattr(Alert, name).ilike(like) for name in SEARCH_FIELDS[group]))
+
+
+def search_alerts(query: Query, q: str | None, group: str = "alert", extra: Any = None) -> tuple[Query, Any]:
+    """
+    在告警查询上追加关键字条件，返回 (query, rank)。rank 为相关度表达式（越大越相关），
+    无可比较的相关度时为 None；排序请用 relevance_order，不需要排序时忽略即可。
+    IP 地址与其他搜索词一样按子串匹配（10.0.0.1 也会命中 10.0.0.10），与字段完全相同的结果靠前。
+    extra 为与关键字匹配并列（OR）的附加条件，如按状态/级别精确匹配，应当能走索引。
+    """
+    q = (q or "").strip()
+    if not q:
+        return query, None
+    db = query.session
+    dialect = _dialect(db)
+    if dialect == "postgresql":
+        vector = literal_column(_pg_vector_sql(group))
+        if _pg_trgm_available(db):
+            # 三元组索引支撑子串匹配，ts_rank 只用于排序
+            ts_query = func.plainto_tsquery(literal_column("'simple'"), q)
+            match = _like_filter(q, group)
+        else:
+            # 多个词须按顺序相邻出现，与子串匹配的结果尽量一致
+            ts_query = func.phraseto_tsquery(literal_column("'simple'"), q)
+            match = vector.op("@@")(ts_query)
+        query = query.filter(or_(match, *_optional(extra)))
+        return query, _with_boost(func.ts_rank(vector, ts_query), q, group)
+    if dialect == "sqlite" and min(len(term) for term in _terms(q)) >= FTS_MIN_LENGTH and _sqlite_fts_available(db):
+        hits = (
+            select(literal_column("rowid").label("id"), literal_column(f"bm25({FTS_TABLE})").label("score"))
+            .select_from(text(FTS_TABLE))
+            .where(text(f"{FTS_TABLE} MATCH :fts_match").bindparams(fts_match=_fts_match(q, group)))
+            .subquery("alert_search_hits")
+        )
+        if extra is None:
+            query = query.join(hits, hits.c.id == Alert.id)
+            # bm25 越小越相关，取负值与其他实现保持同一方向
+            return query, _with_boost(-hits.c.score, q, group)
+        query = query.outerjoin(hits, hits.c.id == Alert.id).filter(or_(hits.c.id.isnot(None), extra))
+        return query, _with_boost(func.coalesce(-hits.c.score, literal(0.0)), q, group)
+    return query.filter(or_(_like_filter(q, group), *_optional(extra))), _exact_boost(q, group)
+
+
+def _optional(condition: Any) -> list:
+    return [] if condition is None else [condition]
+
+
+def relevance_order(rank: Any, *fallback: Any) -> list:
+    """相关度优先、其余按 fallback 排序的 ORDER BY 列表。"""
+    return ([rank.desc()] if rank is not None else []) + list(fallback)
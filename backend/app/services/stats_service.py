@@ -1,10 +1,52 @@
+import threading
+import time
 from datetime import timedelta
 from typing import Any
-from sqlalchemy import func, desc, text
+from sqlalchemy import String, case, cast, func, desc, or_, text
 from sqlalchemy.orm import Session
 from app.core.timezone import now, today_start
 from app.models.entities import Alert, AuditLog, User, Asset
-from app.services.workflow_constants import STATUS_FALSE_POSITIVE, TERMINAL_STATUSES, normalize_status
+from app.services.workflow_constants import OLD_STATUS_MAP, STATUS_FALSE_POSITIVE, TERMINAL_STATUSES
+
+# 今日统计快照的刷新间隔（秒）：间隔内的解析/导出/报表直接复用快照
+STATS_SNAPSHOT_TTL = 15
+
+# 历史状态值按 normalize_status 折算后属于闭环状态的，也计入已办结
+TERMINAL_STATUS_VALUES = sorted(TERMINAL_STATUSES | {old for old, new in OLD_STATUS_MAP.items() if new in TERMINAL_STATUSES})
+
+# 模板中可引用的统计变量（“当前日期”由解析上下文自身提供，不触发统计）
+STATS_VARIABLES = frozenset(
+    [
+        "当前总数", "待处理数", "已办结数", "当前处置率", "误报率", "平均处置耗时",
+        "资产命中率", "高危告警占比", "今日新增总数", "Top5_攻击源排行", "Top5_受攻击资产排行",
+    ]
+    + [f"Top{i}_攻击源IP" for i in range(1, 6)]
+    + [f"Top{i}_受攻击资产" for i in range(1, 6)]
+)
+
+_stats_snapshots: dict[int, tuple[float, Any, dict[str, Any]]] = {}
+_stats_lock = threading.Lock()
+
+
+def duration_seconds(db: Session, start_column, end_column):
+    """两个时间列之差（秒）的 SQL 表达式，兼容 PostgreSQL 与 SQLite。"""
+    dialect = db.bind.dialect.name if db.bind else "sqlite"
+    if dialect == "postgresql":
+        return func.extract("epoch", end_column - start_column)
+    return (func.julianday(end_column) - func.julianday(start_column)) * 86400.0
+
+
+def time_bucket(db: Session, column, hourly: bool = False):
+    """
+    按小时或按天归桶的 SQL 表达式，结果为与趋势图横轴一致的文本标签
+    （小时：YYYY-MM-DD HH:00，天：YYYY-MM-DD）。
+    """
+    dialect = db.bind.dialect.name if db.bind else "sqlite"
+    if dialect == "postgresql":
+        unit, pattern = ("hour", "YYYY-MM-DD HH24:00") if hourly else ("day", "YYYY-MM-DD")
+        return func.to_char(func.date_trunc(unit, column), pattern)
+    return func.strftime("%Y-%m-%d %H:00" if hourly else "%Y-%m-%d", column)
+
 
 def format_duration(seconds: float | None) -> str:
     if seconds is None: return "0秒"
@@ -14,39 +56,42 @@ def format_duration(seconds: float | None) -> str:
     hours = mins // 60
     return f"{hours}小时{mins % 60}分"
 
-def get_aggregate_stats(db: Session, workspace_id: int) -> dict[str, Any]:
-    # 默认统计范围：应用配置时区的今日 0 点开始
-    today_start_dt = today_start(db, workspace_id)
-    
-    # 1. 基础数量统计
-    base_query = db.query(Alert).filter(Alert.workspace_id == workspace_id, Alert.created_at >= today_start_dt)
-    all_alerts = base_query.all()
-    total_count = len(all_alerts)
-    
-    pending_count = sum(1 for a in all_alerts if normalize_status(a.status) not in TERMINAL_STATUSES)
-    completed_count = sum(1 for a in all_alerts if normalize_status(a.status) in TERMINAL_STATUSES)
-    fp_count = sum(1 for a in all_alerts if normalize_status(a.status) == STATUS_FALSE_POSITIVE)
+def _compute_aggregate_stats(db: Session, workspace_id: int, today_start_dt) -> dict[str, Any]:
+    # 1. 基础数量统计：全部在数据库侧聚合，不再把今日告警逐条加载到内存
+    base_filter = (Alert.workspace_id == workspace_id, Alert.created_at >= today_start_dt)
+    is_terminal = Alert.status.in_(TERMINAL_STATUS_VALUES)
+    has_asset = or_(
+        cast(Alert.src_asset_context, String).notin_(["{}", "null"]),
+        cast(Alert.dst_asset_context, String).notin_(["{}", "null"]),
+    )
+    counts = (
+        db.query(
+            func.count(Alert.id),
+            func.coalesce(func.sum(case((is_terminal, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((Alert.status == STATUS_FALSE_POSITIVE, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((has_asset, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((Alert.severity.in_(["high", "critical"]), 1), else_=0)), 0),
+        )
+        .filter(*base_filter)
+        .one()
+    )
+    total_count, completed_count, fp_count, asset_hit_count, high_sev_count = (int(value or 0) for value in counts)
+    pending_count = total_count - completed_count
     
     # 2. 比例计算
     disposal_rate = f"{(completed_count / total_count * 100):.1f}%" if total_count > 0 else "0.0%"
     fp_rate = f"{(fp_count / completed_count * 100):.1f}%" if completed_count > 0 else "0.0%"
     
     # 3. 资产命中率
-    asset_hit_count = sum(1 for a in all_alerts if a.src_asset_context or a.dst_asset_context)
     asset_hit_rate = f"{(asset_hit_count / total_count * 100):.1f}%" if total_count > 0 else "0.0%"
     
     # 4. 高危占比
-    high_sev_count = sum(1 for a in all_alerts if a.severity in {"high", "critical"})
     high_sev_rate = f"{(high_sev_count / total_count * 100):.1f}%" if total_count > 0 else "0.0%"
 
     # 5. MTTR 计算
-    mttr_samples = []
-    for a in all_alerts:
-        if normalize_status(a.status) in TERMINAL_STATUSES:
-            diff = (a.updated_at - a.created_at).total_seconds()
-            if diff >= 0: mttr_samples.append(diff)
-    
-    avg_mttr = sum(mttr_samples) / len(mttr_samples) if mttr_samples else None
+    elapsed = duration_seconds(db, Alert.created_at, Alert.updated_at)
+    avg_mttr = db.query(func.avg(elapsed)).filter(*base_filter, is_terminal, elapsed >= 0).scalar()
+    avg_mttr = float(avg_mttr) if avg_mttr is not None else None
     
     # 6. 排行榜 (Top 5)
     def _get_top_5(column):
@@ -92,3 +137,30 @@ def get_aggregate_stats(db: Session, workspace_id: int) -> dict[str, Any]:
     res["Top5_受攻击资产排行"] = "\n".join(dst_lines) if dst_lines else "暂无数据"
 
     return res
+
+
+def get_aggregate_stats(db: Session, workspace_id: int, max_age: float = STATS_SNAPSHOT_TTL) -> dict[str, Any]:
+    """
+    今日统计快照。每个工作区最多每 max_age 秒重新聚合一次，跨天自动重算；
+    max_age=0 强制刷新。返回副本，调用方可以自由修改。
+    """
+    # 默认统计范围：应用配置时区的今日 0 点开始
+    today_start_dt = today_start(db, workspace_id)
+    current = time.monotonic()
+    with _stats_lock:
+        cached = _stats_snapshots.get(workspace_id)
+    if cached and cached[1] == today_start_dt and current - cached[0] < max_age:
+        return dict(cached[2])
+    stats = _compute_aggregate_stats(db, workspace_id, today_start_dt)
+    with _stats_lock:
+        _stats_snapshots[workspace_id] = (current, today_start_dt, stats)
+    return dict(stats)
+
+
+def invalidate_aggregate_stats(workspace_id: int | None = None) -> None:
+    """告警写入提交后由 cache_service 调用，丢弃本进程的快照；其他进程的快照仍按 STATS_SNAPSHOT_TTL 过期。"""
+    with _stats_lock:
+        if workspace_id is None:
+            _stats_snapshots.clear()
+        else:
+            _stats_snapshots.pop(workspace_id, None)
@@ -1,10 +1,43 @@
-from typing import Any
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable
 
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 
+from app.core.settings import get_settings
 from app.core.timezone import now
+from app.models.database import SessionLocal
 from app.models.entities import TaskRecord, User
 
+logger = logging.getLogger("eff-tasks")
+
+# 任务执行方式：worker 由独立 Worker 进程消费队列；inline 在 API 进程的后台线程执行（无 Worker 的单机部署）。
+# 默认 inline，只启动 uvicorn 的本地开发环境也能执行任务；docker-compose 部署显式设为 worker
+TASK_EXECUTOR = os.getenv("EFF_TASK_EXECUTOR", "inline").strip().lower() or "inline"
+# Worker 进程内并发执行的任务数
+WORKER_CONCURRENCY = max(int(os.getenv("EFF_WORKER_CONCURRENCY", "4") or 4), 1)
+# 任务租约时长（秒）；执行中的 Worker 定期续约，进程崩溃后租约过期的任务重新排队
+TASK_LEASE_SECONDS = max(int(os.getenv("EFF_TASK_LEASE_SECONDS", "120") or 120), 10)
+# 单个任务最多被领取的次数，超过后不再重新排队而是标记失败
+TASK_MAX_ATTEMPTS = max(int(os.getenv("EFF_TASK_MAX_ATTEMPTS", "3") or 3), 1)
+# 新任务通知频道（Redis Pub/Sub），Worker 订阅后无需等待下一次轮询
+TASK_WAKEUP_CHANNEL = "eff:tasks:wakeup"
+
+TaskHandler = Callable[[Session, TaskRecord, User], dict[str, Any]]
+_handlers: dict[str, TaskHandler] = {}
+_inline_executor: ThreadPoolExecutor | None = None
+_inline_lock = threading.Lock()
+# inline 模式下本进程已领取、尚未结束的任务，由巡检线程续约
+_inline_in_flight: set[int] = set()
+_inline_supervisor: threading.Thread | None = None
+_redis_client = None
+
 
 def create_task(
     db: Session,
@@ -13,12 +46,13 @@ def create_task(
     target_type: str = "",
     target_id: str | int = "",
     input_data: dict[str, Any] | None = None,
+    status: str = "running",
 ) -> TaskRecord:
     task = TaskRecord(
         workspace_id=user.workspace_id,
         actor_id=user.id,
         task_type=task_type,
-        status="running",
+        status=status,
         target_type=target_type,
         target_id=str(target_id) if target_id is not None else "",
         input=input_data or {},
@@ -33,6 +67,7 @@ def create_task(
 def finish_task(db: Session, task: TaskRecord, output: dict[str, Any] | None = None) -> TaskRecord:
     task.status = "success"
     task.output = output or {}
+    task.lease_expires_at = None
     task.updated_at = now(db, task.workspace_id)
     db.flush()
     return task
@@ -41,6 +76,271 @@ def finish_task(db: Session, task: TaskRecord, output: dict[str, Any] | None = N
 def fail_task(db: Session, task: TaskRecord, error: Exception | str) -> TaskRecord:
     task.status = "failed"
     task.error = str(error)
+    task.lease_expires_at = None
     task.updated_at = now(db, task.workspace_id)
     db.flush()
     return task
+
+
+def register_task_handler(task_type: str) -> Callable[[TaskHandler], TaskHandler]:
+    """注册异步任务的执行函数；函数返回值写入任务 output，抛出异常则任务失败。"""
+
+    def decorator(func: TaskHandler) -> TaskHandler:
+        _handlers[task_type] = func
+        return func
+
+    return decorator
+
+
+def task_handler(task_type: str) -> TaskHandler | None:
+    return _handlers.get(task_type)
+
+
+def find_active_task(db: Session, workspace_id: int, task_type: str, target_type: str, target_id: str | int) -> TaskRecord | None:
+    # 租约已过期的执行中任务视为执行端已退出，不再阻止重新提交（过期任务稍后由巡检重新排队或标记失败）
+    lease_alive = TaskRecord.lease_expires_at.is_(None) | (TaskRecord.lease_expires_at >= lease_clock())
+    return (
+        db.query(TaskRecord)
+        .filter(
+            TaskRecord.workspace_id == workspace_id,
+            TaskRecord.task_type == task_type,
+            TaskRecord.target_type == target_type,
+            TaskRecord.target_id == str(target_id),
+            (TaskRecord.status == "queued") | ((TaskRecord.status == "running") & lease_alive),
+        )
+        .first()
+    )
+
+
+def enqueue_task(
+    db: Session,
+    user: User,
+    task_type: str,
+    target_type: str = "",
+    target_id: str | int = "",
+    input_data: dict[str, Any] | None = None,
+) -> TaskRecord:
+    """创建排队任务；调用方提交事务后再调用 dispatch_task 通知执行端。"""
+    if task_type not in _handlers:
+        raise ValueError(f"未注册的任务类型: {task_type}")
+    return create_task(db, user, task_type, target_type, target_id, input_data, status="queued")
+
+
+def lease_clock() -> datetime:
+    """租约统一使用 UTC 时间，避免不同工作区时区设置影响过期判断。"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def redis_client():
+    """懒加载 Redis 连接；未安装 redis 包或连接失败时返回 None，调用方退回轮询。"""
+    global _redis_client
+    if _redis_client is None:
+        try:
+            import redis
+
+            _redis_client = redis.Redis.from_url(get_settings().redis_url, socket_connect_timeout=2, socket_timeout=2)
+        except Exception as exc:
+            logger.warning("Redis unavailable for task wakeup: %s", exc)
+            return None
+    return _redis_client
+
+
+def dispatch_task(task_id: int) -> None:
+    """
+    任务已提交到数据库后调用：worker 模式下通过 Redis 唤醒空闲 Worker，
+    inline 模式下在本进程后台线程领取并执行。
+    """
+    if TASK_EXECUTOR != "inline":
+        client = redis_client()
+        if client is not None:
+            try:
+                client.publish(TASK_WAKEUP_CHANNEL, str(task_id))
+            except Exception as exc:
+                # 通知失败不影响任务本身，Worker 会在下一次轮询时领取
+                logger.warning("Task wakeup publish failed: %s", exc)
+        return
+    _inline_pool().submit(_run_inline, task_id)
+
+
+def _inline_pool() -> ThreadPoolExecutor:
+    global _inline_executor
+    with _inline_lock:
+        if _inline_executor is None:
+            _inline_executor = ThreadPoolExecutor(max_workers=WORKER_CONCURRENCY, thread_name_prefix="eff-task")
+        return _inline_executor
+
+
+def _inline_worker_id() -> str:
+    return f"inline:{socket.gethostname()}:{os.getpid()}"
+
+
+def _run_inline(task_id: int, claimed: bool = False) -> None:
+    if not claimed:
+        db = SessionLocal()
+        try:
+            if not claim_task(db, task_id, _inline_worker_id()):
+                return
+        finally:
+            db.close()
+        with _inline_lock:
+            _inline_in_flight.add(task_id)
+    try:
+        execute_task(task_id)
+    finally:
+        with _inline_lock:
+            _inline_in_flight.discard(task_id)
+
+
+def start_inline_supervisor() -> None:
+    """
+    inline 模式下由 API 启动时调用：启动巡检线程，为本进程执行中的任务续约，
+    把租约过期的任务重新排队，并领取重启前遗留或通知丢失的排队任务。worker 模式下不做任何事。
+    """
+    global _inline_supervisor
+    if TASK_EXECUTOR != "inline":
+        return
+    with _inline_lock:
+        if _inline_supervisor is not None:
+            return
+        _inline_supervisor = threading.Thread(target=_supervise_inline, name="eff-task-supervisor", daemon=True)
+    _inline_supervisor.start()
+
+
+def _supervise_inline() -> None:
+    worker_id = _inline_worker_id()
+    while True:
+        db = SessionLocal()
+        try:
+            with _inline_lock:
+                task_ids = list(_inline_in_flight)
+            extend_leases(db, worker_id, task_ids)
+            result = requeue_expired_tasks(db)
+            if result["requeued"] or result["failed"]:
+                logger.warning("Expired task leases: %s", result)
+            for task_id in claim_tasks(db, worker_id, WORKER_CONCURRENCY - len(task_ids)):
+                # 领取后立即登记，排队等待线程期间也能续约
+                with _inline_lock:
+                    _inline_in_flight.add(task_id)
+                _inline_pool().submit(_run_inline, task_id, True)
+        except Exception as exc:
+            db.rollback()
+            logger.error("Inline task supervisor error: %s", exc)
+        finally:
+            db.close()
+        time.sleep(max(TASK_LEASE_SECONDS / 3, 1))
+
+
+def _claimed_values(worker_id: str) -> dict[str, Any]:
+    return {
+        "status": "running",
+        "locked_by": worker_id,
+        "lease_expires_at": lease_clock() + timedelta(seconds=TASK_LEASE_SECONDS),
+        "attempts": TaskRecord.attempts + 1,
+    }
+
+
+def claim_task(db: Session, task_id: int, worker_id: str) -> bool:
+    """以条件更新领取指定任务，只有仍处于 queued 的任务才会被当前执行者拿到。"""
+    result = db.execute(
+        update(TaskRecord)
+        .where(TaskRecord.id == task_id, TaskRecord.status == "queued")
+        .values(**_claimed_values(worker_id))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def claim_tasks(db: Session, worker_id: str, limit: int) -> list[int]:
+    """
+    按创建顺序领取最多 limit 个排队任务，多个 Worker 并发领取互不重复。
+    PostgreSQL 使用 FOR UPDATE SKIP LOCKED；SQLite 不支持行锁，逐个做条件更新。
+    """
+    if limit <= 0:
+        return []
+    query = (
+        db.query(TaskRecord.id)
+        .filter(TaskRecord.status == "queued")
+        .order_by(TaskRecord.created_at.asc(), TaskRecord.id.asc())
+    )
+    dialect = db.bind.dialect.name if db.bind else "sqlite"
+    if dialect == "postgresql":
+        ids = [row.id for row in query.limit(limit).with_for_update(skip_locked=True).all()]
+        if ids:
+            db.execute(
+                update(TaskRecord)
+                .where(TaskRecord.id.in_(ids))
+                .values(**_claimed_values(worker_id))
+                .execution_options(synchronize_session=False)
+            )
+        db.commit()
+        return ids
+    candidates = [row.id for row in query.limit(limit * 2).all()]
+    db.rollback()
+    claimed = []
+    for task_id in candidates:
+        if len(claimed) >= limit:
+            break
+        if claim_task(db, task_id, worker_id):
+            claimed.append(task_id)
+    return claimed
+
+
+def extend_leases(db: Session, worker_id: str, task_ids: list[int]) -> None:
+    """为执行中的任务续约。"""
+    if not task_ids:
+        return
+    db.execute(
+        update(TaskRecord)
+        .where(TaskRecord.id.in_(task_ids), TaskRecord.locked_by == worker_id, TaskRecord.status == "running")
+        .values(lease_expires_at=lease_clock() + timedelta(seconds=TASK_LEASE_SECONDS))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def requeue_expired_tasks(db: Session) -> dict[str, int]:
+    """租约过期的执行中任务重新排队；领取次数已达上限的标记为失败。"""
+    expired = TaskRecord.lease_expires_at.is_not(None) & (TaskRecord.lease_expires_at < lease_clock())
+    base = update(TaskRecord).where(TaskRecord.status == "running", expired).execution_options(synchronize_session=False)
+    requeued = db.execute(
+        base.where(TaskRecord.attempts < TASK_MAX_ATTEMPTS).values(status="queued", locked_by="", lease_expires_at=None)
+    ).rowcount
+    failed = db.execute(
+        base.where(TaskRecord.attempts >= TASK_MAX_ATTEMPTS).values(
+            status="failed", error="任务执行超时或 Worker 异常退出，已达最大重试次数", lease_expires_at=None
+        )
+    ).rowcount
+    db.commit()
+    return {"requeued": requeued, "failed": failed}
+
+
+def execute_task(task_id: int) -> None:
+    """在独立会话中执行一个已领取（running）的任务，结果与异常都会落库。"""
+    db = SessionLocal()
+    try:
+        task = db.get(TaskRecord, task_id)
+        if not task or task.status != "running":
+            return
+        handler = _handlers.get(task.task_type)
+        user = db.get(User, task.actor_id) if task.actor_id else None
+        if handler is None:
+            # 自动提取等任务已改为人工触发，未注册类型的排队任务直接结束
+            finish_task(db, task, {"msg": "Manual generation required for this task type"})
+            db.commit()
+            return
+        try:
+            if user is None:
+                raise RuntimeError("任务提交人不存在")
+            output = handler(db, task, user)
+            finish_task(db, task, output)
+            db.commit()
+        except Exception as exc:
+            db.rollback()
+            task = db.get(TaskRecord, task_id)
+            if task:
+                fail_task(db, task, exc)
+                db.commit()
+            logger.error("Task %s (%s) failed: %s", task_id, task.task_type if task else "", exc)
+    finally:
+        db.close()
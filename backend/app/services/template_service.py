@@ -1,10 +1,17 @@
 import re
 from typing import Any
 
+_VARIABLE_RE = re.compile(r"\{\{\s*([^{}]+)\s*\}\}")
+
 
 def render_template(content: str, data: dict[str, Any]) -> str:
     def replace(match: re.Match[str]) -> str:
         key = match.group(1).strip()
         return str(data.get(key, ""))
 
-    return re.sub(r"\{\{\s*([^{}]+)\s*\}\}", replace, content or "")
+    return _VARIABLE_RE.sub(replace, content or "")
+
+
+def template_variables(content: str | None) -> set[str]:
+    """返回模板中引用的全部变量名（已去除首尾空白）。"""
+    return {match.group(1).strip() for match in _VARIABLE_RE.finditer(content or "")}
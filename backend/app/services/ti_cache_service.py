@@ -0,0 +1,227 @@
+"""
+威胁情报结果缓存。
+
+按 (提供商, IP) 把 core.ti_service 的单 IP 查询结果持久化到 threat_intel_cache 表，
+不同研判结论使用不同 TTL；过期但仍在容忍窗口内的结果先返回，再由后台线程刷新。
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.timezone import now
+from app.models.database import SessionLocal
+from app.models.entities import ThreatIntelCache
+from core.ti_service import _query_ip, active_provider_name, query_ips_batch, query_pair
+
+# 默认 TTL（秒），可通过情报配置 cache.ttl_malicious / ttl_clean / ttl_error 覆盖
+DEFAULT_CACHE_TTL = {
+    "malicious": 24 * 3600,
+    "clean": 6 * 3600,
+    "error": 5 * 60,
+}
+# 过期后仍可先返回旧结果的时长（秒），期间后台刷新
+DEFAULT_STALE_SECONDS = 24 * 3600
+
+_refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ti-refresh")
+_refreshing: set[tuple[str, str]] = set()
+_refresh_lock = threading.Lock()
+
+
+def _cache_config(providers_cfg: dict[str, Any]) -> dict[str, Any]:
+    cfg = providers_cfg.get("cache") or {}
+    ttl = {}
+    for verdict, default in DEFAULT_CACHE_TTL.items():
+        try:
+            ttl[verdict] = max(int(cfg.get(f"ttl_{verdict}", default)), 0)
+        except (TypeError, ValueError):
+            ttl[verdict] = default
+    try:
+        stale = max(int(cfg.get("stale_seconds", DEFAULT_STALE_SECONDS)), 0)
+    except (TypeError, ValueError):
+        stale = DEFAULT_STALE_SECONDS
+    return {"enabled": cfg.get("enabled", True) is not False, "ttl": ttl, "stale_seconds": stale}
+
+
+def verdict_of(result: dict[str, Any] | None) -> str | None:
+    """结果对应的缓存类别；提供商未配置等空结果返回 None，不写缓存。"""
+    if result is None:
+        return "error"
+    if result.get("is_malicious"):
+        return "malicious"
+    if result.get("raw"):
+        return "clean"
+    return None
+
+
+def store_result(db: Session, provider: str, ip: str, result: dict[str, Any] | None, providers_cfg: dict[str, Any]) -> None:
+    verdict = verdict_of(result)
+    if verdict is None:
+        return
+    cache_cfg = _cache_config(providers_cfg)
+    current = now()
+    values = {
+        "verdict": verdict,
+        "result": result or {},
+        "fetched_at": current,
+        "expires_at": current + timedelta(seconds=cache_cfg["ttl"][verdict]),
+    }
+    row = db.query(ThreatIntelCache).filter_by(provider=provider, ip=ip).first()
+    if row:
+        for key, value in values.items():
+            setattr(row, key, value)
+        db.flush()
+        return
+    savepoint = db.begin_nested()
+    try:
+        db.add(ThreatIntelCache(provider=provider, ip=ip, **values))
+        db.flush()
+        savepoint.commit()
+    except IntegrityError:
+        # 并发写入了同一 (provider, ip)，以先写入的为准
+        savepoint.rollback()
+
+
+def _refresh(provider: str, ip: str, providers_cfg: dict[str, Any]) -> None:
+    db = SessionLocal()
+    try:
+        store_result(db, provider, ip, _query_ip(ip, providers_cfg), providers_cfg)
+        db.commit()
+    except Exception:
+        db.rollback()
+    finally:
+        db.close()
+        with _refresh_lock:
+            _refreshing.discard((provider, ip))
+
+
+def _schedule_refresh(provider: str, ip: str, providers_cfg: dict[str, Any]) -> None:
+    with _refresh_lock:
+        if (provider, ip) in _refreshing:
+            return
+        _refreshing.add((provider, ip))
+    _refresh_executor.submit(_refresh, provider, ip, providers_cfg)
+
+
+def _lookup(db: Session, provider: str, ip: str, providers_cfg: dict[str, Any]) -> tuple[dict[str, Any] | None, str]:
+    """
+    读取缓存，返回 (结果, 状态)。状态为 hit / stale / miss；
+    stale 时已安排后台刷新，miss 时结果为 None，由调用方查询。
+    """
+    cache_cfg = _cache_config(providers_cfg)
+    if not cache_cfg["enabled"]:
+        return None, "miss"
+    row = db.query(ThreatIntelCache).filter_by(provider=provider, ip=ip).first()
+    if not row:
+        return None, "miss"
+    current = now()
+    if row.expires_at > current:
+        return row.result or None, "hit"
+    if row.expires_at + timedelta(seconds=cache_cfg["stale_seconds"]) > current:
+        _schedule_refresh(provider, ip, providers_cfg)
+        return row.result or None, "stale"
+    return None, "miss"
+
+
+def _cache_meta(state: str) -> dict[str, Any]:
+    return {"hit": state in ("hit", "stale"), "stale": state == "stale"}
+
+
+def query_ip_cached(db: Session, ip: str, providers_cfg: dict[str, Any]) -> dict[str, Any] | None:
+    """带缓存的单 IP 情报查询，结果附带 cache 字段标识是否命中缓存。"""
+    ip = (ip or "").strip()
+    if not ip:
+        return None
+    provider = active_provider_name(providers_cfg)
+    result, state = _lookup(db, provider, ip, providers_cfg)
+    if state == "miss":
+        result = _query_ip(ip, providers_cfg)
+        if _cache_config(providers_cfg)["enabled"]:
+            store_result(db, provider, ip, result, providers_cfg)
+    if result is None:
+        return None
+    return {**result, "cache": _cache_meta(state)}
+
+
+def query_pair_cached(db: Session, src_ip: str | None, dst_ip: str | None, cfg: dict[str, Any]) -> dict[str, Any]:
+    """
+    带缓存的 query_pair：命中缓存的一侧直接返回，其余仍由 query_pair 并发查询后写回缓存。
+    返回值在 query_pair 的基础上增加 cache: {"src_ip_ti": "hit|stale|miss", ...}。
+    """
+    providers_cfg = cfg.get("providers", {}) or {}
+    if not providers_cfg.get("enabled", True):
+        return query_pair(src_ip, dst_ip, cfg)
+    provider = active_provider_name(providers_cfg)
+    mode = providers_cfg.get("mode", "both")
+    targets = {}
+    if src_ip and mode in ("both", "src"):
+        targets["src_ip_ti"] = src_ip.strip()
+    if dst_ip and mode in ("both", "dst"):
+        targets["dst_ip_ti"] = dst_ip.strip()
+
+    cached = {key: _lookup(db, provider, ip, providers_cfg) for key, ip in targets.items()}
+    pending = {key: ip for key, ip in targets.items() if cached[key][1] == "miss"}
+    if pending:
+        result = query_pair(pending.get("src_ip_ti"), pending.get("dst_ip_ti"), cfg)
+    else:
+        result = {"src_ip_ti": None, "dst_ip_ti": None, "sources": [], "latency_ms": {}, "partial": False}
+
+    cache_states = {}
+    timed_out = set(result.get("timed_out") or [])
+    for key, (cached_result, state) in cached.items():
+        cache_states[key] = state
+        if state != "miss":
+            result[key] = {**cached_result, "cache": _cache_meta(state)} if cached_result else None
+            result["latency_ms"][key] = 0
+            if cached_result:
+                result["sources"] = list(set(result["sources"]) | set(cached_result.get("sources") or []))
+        elif key not in timed_out and key not in (result.get("errors") or {}) and _cache_config(providers_cfg)["enabled"]:
+            store_result(db, provider, targets[key], result.get(key), providers_cfg)
+            if result.get(key):
+                result[key] = {**result[key], "cache": _cache_meta(state)}
+    result["cache"] = cache_states
+    return result
+
+
+def query_ips_cached(db: Session, ips, providers_cfg: dict[str, Any]) -> tuple[dict[str, tuple[dict[str, Any] | None, str]], dict[str, Any]]:
+    """
+    批量查询多个 IP：先查缓存，未命中的 IP 走提供商批量接口并写回缓存。
+    返回 ({ip: (结果, hit|stale|miss)}, 统计)，统计含缓存命中数与实际请求数。
+    """
+    provider = active_provider_name(providers_cfg)
+    wanted = list(dict.fromkeys((ip or "").strip() for ip in ips if (ip or "").strip()))
+    resolved = {ip: _lookup(db, provider, ip, providers_cfg) for ip in wanted}
+    misses = [ip for ip, (_, state) in resolved.items() if state == "miss"]
+    fetched, stats = query_ips_batch(misses, providers_cfg)
+    cache_enabled = _cache_config(providers_cfg)["enabled"]
+    for ip in misses:
+        result = fetched.get(ip)
+        if cache_enabled:
+            store_result(db, provider, ip, result, providers_cfg)
+        resolved[ip] = (result, "miss")
+    stats.update({
+        "distinct_ips": len(wanted),
+        "cache_hits": sum(1 for _, state in resolved.values() if state == "hit"),
+        "cache_stale": sum(1 for _, state in resolved.values() if state == "stale"),
+        "queried_ips": len(misses),
+    })
+    return resolved, stats
+
+
+def pair_result(src_ip: str | None, dst_ip: str | None, resolved: dict[str, tuple[dict[str, Any] | None, str]], providers_cfg: dict[str, Any]) -> dict[str, Any]:
+    """用批量查询结果拼出与 query_pair_cached 相同结构的单条告警 ti_result。"""
+    mode = providers_cfg.get("mode", "both")
+    result: dict[str, Any] = {"src_ip_ti": None, "dst_ip_ti": None, "sources": [], "latency_ms": {}, "partial": False, "cache": {}}
+    for key, ip, allowed in (("src_ip_ti", src_ip, ("both", "src")), ("dst_ip_ti", dst_ip, ("both", "dst"))):
+        ip = (ip or "").strip()
+        if not ip or mode not in allowed or ip not in resolved:
+            continue
+        ti, state = resolved[ip]
+        result["cache"][key] = state
+        if ti:
+            result[key] = {**ti, "cache": _cache_meta(state)}
+            result["sources"] = list(set(result["sources"]) | set(ti.get("sources") or []))
+    return result
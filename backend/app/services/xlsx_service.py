@@ -0,0 +1,64 @@
+"""
+XLSX 导出辅助。
+
+大数据量导出使用 openpyxl 的 write-only 模式逐行写入（工作表内容先落临时文件），
+成品写入 SpooledTemporaryFile：小文件留在内存，超过阈值自动转存磁盘，再分块流式返回。
+"""
+import tempfile
+from typing import Any, Iterator
+
+from fastapi.responses import StreamingResponse
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# 成品文件超过该大小后转存磁盘
+XLSX_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+# 响应分块大小
+XLSX_CHUNK_SIZE = 64 * 1024
+# Excel 单元格最多容纳的字符数
+XLSX_CELL_MAX_LENGTH = 32767
+
+
+def write_only_workbook() -> Workbook:
+    return Workbook(write_only=True)
+
+
+def cell_value(value: Any) -> Any:
+    """去掉 Excel 不允许的控制字符并截断超长文本，避免个别告警报文导致整个导出失败。"""
+    if isinstance(value, str):
+        return ILLEGAL_CHARACTERS_RE.sub("", value)[:XLSX_CELL_MAX_LENGTH]
+    return value
+
+
+def save_workbook(wb: Workbook):
+    """保存到临时文件并回到文件开头，返回的文件由 xlsx_response 负责关闭。"""
+    output = tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_MAX_SIZE)
+    try:
+        wb.save(output)
+    except Exception:
+        output.close()
+        raise
+    output.seek(0)
+    return output
+
+
+def _iter_file(fileobj) -> Iterator[bytes]:
+    try:
+        while True:
+            chunk = fileobj.read(XLSX_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+def xlsx_response(fileobj, filename: str) -> StreamingResponse:
+    size = fileobj.seek(0, 2)
+    fileobj.seek(0)
+    return StreamingResponse(
+        _iter_file(fileobj),
+        media_type=XLSX_MEDIA_TYPE,
+        headers={"Content-Disposition": f"attachment; filename={filename}", "Content-Length": str(size)},
+    )
@@ -1,16 +1,35 @@
 import time
 import logging
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 from app.models.database import SessionLocal
-from app.models.entities import TaskRecord
-from app.services.task_service import finish_task, fail_task
-from app.services.ai_service import handle_auto_ste_task
+from app.services.task_service import (
+    TASK_LEASE_SECONDS,
+    TASK_WAKEUP_CHANNEL,
+    WORKER_CONCURRENCY,
+    claim_tasks,
+    execute_task,
+    extend_leases,
+    redis_client,
+    requeue_expired_tasks,
+)
+import app.services.alert_task_service  # noqa: F401  注册告警类任务的执行函数
+import app.services.cache_service  # noqa: F401  任务写入告警后同步失效列表缓存
+import app.services.asset_import_service  # noqa: F401  注册资产/网段导入任务的执行函数
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("eff-worker")
 
+# 没有收到唤醒通知时的兜底轮询间隔（秒）
+POLL_INTERVAL = float(os.getenv("EFF_WORKER_POLL_INTERVAL", "5") or 5)
+# 检查过期租约的间隔（秒）
+REQUEUE_INTERVAL = 30
+
 
 def wait_for_schema() -> None:
     while True:
@@ -25,45 +44,102 @@ def wait_for_schema() -> None:
             db.close()
 
 
-def main() -> None:
-    wait_for_schema()
-    logger.info("EFF worker started. Polling for tasks...")
-    
-    while True:
-        db: Session = SessionLocal()
+class Worker:
+    def __init__(self, concurrency: int = WORKER_CONCURRENCY):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.concurrency = concurrency
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="eff-worker")
+        self.in_flight: set[int] = set()
+        self.lock = threading.Lock()
+        # 新任务通知或有任务执行完毕时置位，主循环据此立即尝试领取
+        self.wakeup = threading.Event()
+
+    def _free_slots(self) -> int:
+        with self.lock:
+            return self.concurrency - len(self.in_flight)
+
+    def _run(self, task_id: int) -> None:
         try:
-            # 1. 查找队列中的任务
-            task = db.query(TaskRecord).filter_by(status="queued").order_by(TaskRecord.created_at.asc()).first()
-            
-            if not task:
-                db.close()
+            logger.info(f"Processing task {task_id}...")
+            execute_task(task_id)
+            logger.info(f"Task {task_id} done.")
+        finally:
+            with self.lock:
+                self.in_flight.discard(task_id)
+            self.wakeup.set()
+
+    def _listen(self) -> None:
+        """订阅 Redis 唤醒频道；连接断开后重试，期间主循环按兜底间隔轮询。"""
+        while True:
+            client = redis_client()
+            if client is None:
+                return
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(TASK_WAKEUP_CHANNEL)
+                logger.info("Subscribed to task wakeup channel.")
+                for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self.wakeup.set()
+            except Exception as e:
+                logger.warning(f"Task wakeup subscription lost: {str(e)}")
                 time.sleep(5)
+
+    def _heartbeat(self) -> None:
+        """为执行中的任务续约，并定期把其他 Worker 遗留的过期任务重新排队。"""
+        last_requeue = 0.0
+        while True:
+            time.sleep(max(TASK_LEASE_SECONDS / 3, 1))
+            db: Session = SessionLocal()
+            try:
+                with self.lock:
+                    task_ids = list(self.in_flight)
+                extend_leases(db, self.worker_id, task_ids)
+                if time.monotonic() - last_requeue >= REQUEUE_INTERVAL:
+                    last_requeue = time.monotonic()
+                    result = requeue_expired_tasks(db)
+                    if result["requeued"] or result["failed"]:
+                        logger.warning(f"Expired task leases: {result}")
+                        self.wakeup.set()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Lease heartbeat error: {str(e)}")
+            finally:
+                db.close()
+
+    def run(self) -> None:
+        threading.Thread(target=self._listen, name="eff-worker-listen", daemon=True).start()
+        threading.Thread(target=self._heartbeat, name="eff-worker-heartbeat", daemon=True).start()
+        logger.info(f"EFF worker {self.worker_id} started with concurrency {self.concurrency}.")
+        while True:
+            self.wakeup.clear()
+            free = self._free_slots()
+            if free <= 0:
+                self.wakeup.wait(POLL_INTERVAL)
                 continue
-            
-            logger.info(f"Processing task {task.id} (type: {task.task_type})...")
-            
-            # 2. 标记为运行中
-            task.status = "running"
-            db.commit()
-            
-            # 3. 执行具体逻辑
+            db: Session = SessionLocal()
             try:
-                # 自动提取逻辑已改为人工触发，此处目前作为心跳保留
-                logger.info(f"Task {task.id} processed (placeholder).")
-                finish_task(db, task, {"msg": "Manual generation required for this task type"})
-                
-                db.commit()
+                task_ids = claim_tasks(db, self.worker_id, free)
             except Exception as e:
                 db.rollback()
-                fail_task(db, task, e)
-                db.commit()
-                logger.error(f"Task {task.id} failed with error: {str(e)}")
-                
-        except Exception as e:
-            logger.error(f"Worker loop error: {str(e)}")
-            time.sleep(10)
-        finally:
-            db.close()
+                logger.error(f"Worker loop error: {str(e)}")
+                time.sleep(10)
+                continue
+            finally:
+                db.close()
+            if not task_ids:
+                self.wakeup.wait(POLL_INTERVAL)
+                continue
+            with self.lock:
+                self.in_flight.update(task_ids)
+            for task_id in task_ids:
+                self.executor.submit(self._run, task_id)
+
+
+def main() -> None:
+    wait_for_schema()
+    Worker().run()
+
 
 if __name__ == "__main__":
     main()
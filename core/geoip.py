@@ -0,0 +1,325 @@
+"""
+离线 GeoIP / ASN 库
+职责: 把 IP 段 CSV 编译为紧凑的有序区间二进制文件，查询时以 mmap 方式打开并二分查找，
+不依赖外部网络，单次查询为微秒级。
+
+文件格式 (小端):
+    头部      MAGIC(8) + <IIIIQ>: IPv4 段数, IPv6 段数, 记录数, 字符串区字节数, 生成时间戳
+    IPv4 段   <III>: 起始, 结束, 记录号          (按起始升序, 互不重叠)
+    IPv6 段   <16s16sI>: 起始, 结束(大端字节), 记录号
+    记录      <IIIII>: country/province/city/carrier/asn 在字符串区中的偏移, 0xFFFFFFFF 表示空
+    字符串区  每项为 <H> 长度 + UTF-8 内容
+"""
+import csv
+import ipaddress
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+MAGIC = b"EFFGEO1\x00"
+_HEADER = struct.Struct("<IIIIQ")
+_V4 = struct.Struct("<III")
+_V6 = struct.Struct("<16s16sI")
+_RECORD = struct.Struct("<IIIII")
+_STR_LEN = struct.Struct("<H")
+_NONE = 0xFFFFFFFF
+
+FIELDS = ("country", "province", "city", "carrier", "asn")
+# CSV 表头别名，兼容常见 GeoIP 导出格式
+_COLUMN_ALIASES = {
+    "start_ip": ("start_ip", "ip_start", "start", "begin_ip", "ip_from"),
+    "end_ip": ("end_ip", "ip_end", "end", "ip_to"),
+    "network": ("network", "cidr", "segment", "prefix"),
+    "country": ("country", "country_name", "国家"),
+    "province": ("province", "region", "region_name", "subdivision", "省份"),
+    "city": ("city", "city_name", "城市"),
+    "carrier": ("carrier", "isp", "org", "organization", "运营商"),
+    "asn": ("asn", "as", "autonomous_system_number"),
+}
+
+DEFAULT_PATH = Path(os.getenv("EFF_GEOIP_DB") or Path(__file__).resolve().parents[1] / "data" / "geoip.bin")
+# 检查文件是否被替换的最短间隔（秒），其他进程导入新库后无需重启即可生效
+RELOAD_CHECK_INTERVAL = 5
+
+
+def _header_size() -> int:
+    return len(MAGIC) + _HEADER.size
+
+
+def _column_map(fieldnames: list) -> Dict[str, str]:
+    normalized = {str(name or "").strip().lower(): name for name in fieldnames}
+    mapping = {}
+    for key, aliases in _COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in normalized:
+                mapping[key] = normalized[alias]
+                break
+    return mapping
+
+
+def _row_range(row: Dict[str, Any], columns: Dict[str, str]):
+    """返回 (版本, 起始整数, 结束整数)，无法识别时返回 None。"""
+    try:
+        if "network" in columns and row.get(columns["network"]):
+            network = ipaddress.ip_network(str(row[columns["network"]]).strip(), strict=False)
+            return network.version, int(network.network_address), int(network.broadcast_address)
+        start = ipaddress.ip_address(str(row[columns["start_ip"]]).strip())
+        end = ipaddress.ip_address(str(row[columns["end_ip"]]).strip())
+    except (KeyError, TypeError, ValueError):
+        return None
+    if start.version != end.version or int(start) > int(end):
+        return None
+    return start.version, int(start), int(end)
+
+
+def build_database(rows: Iterable[Dict[str, Any]], dest: Path, columns: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    把 IP 段记录编译为二进制库并原子替换 dest。rows 为 csv.DictReader 形式的字典；
+    columns 为逻辑列名到实际表头的映射，缺省时按 rows 的键自动识别。
+    与前一段重叠的 IP 段会被跳过，返回各类计数。
+    """
+    strings: Dict[str, int] = {}
+    string_blob = bytearray()
+    records: Dict[tuple, int] = {}
+    ranges = {4: [], 6: []}
+    invalid = 0
+
+    def string_id(value) -> int:
+        text = str(value or "").strip()
+        if not text:
+            return _NONE
+        offset = strings.get(text)
+        if offset is None:
+            encoded = text.encode("utf-8")[:65535]
+            offset = len(string_blob)
+            string_blob.extend(_STR_LEN.pack(len(encoded)))
+            string_blob.extend(encoded)
+            strings[text] = offset
+        return offset
+
+    for row in rows:
+        if columns is None:
+            columns = _column_map(list(row.keys()))
+            if "network" not in columns and not ("start_ip" in columns and "end_ip" in columns):
+                raise ValueError("缺少 network 或 start_ip/end_ip 列")
+        bounds = _row_range(row, columns)
+        if bounds is None:
+            invalid += 1
+            continue
+        key = tuple(string_id(row.get(columns[field])) if field in columns else _NONE for field in FIELDS)
+        record_id = records.setdefault(key, len(records))
+        version, start, end = bounds
+        ranges[version].append((start, end, record_id))
+
+    overlapped = 0
+    packed = {}
+    for version, items in ranges.items():
+        items.sort()
+        kept = []
+        for item in items:
+            if kept and item[0] <= kept[-1][1]:
+                overlapped += 1
+                continue
+            kept.append(item)
+        ranges[version] = kept
+        if version == 4:
+            packed[4] = b"".join(_V4.pack(*item) for item in kept)
+        else:
+            packed[6] = b"".join(_V6.pack(s.to_bytes(16, "big"), e.to_bytes(16, "big"), r) for s, e, r in kept)
+
+    record_blob = b"".join(_RECORD.pack(*key) for key, _ in sorted(records.items(), key=lambda pair: pair[1]))
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".tmp")
+    with open(tmp, "wb") as fh:
+        fh.write(MAGIC)
+        fh.write(_HEADER.pack(len(ranges[4]), len(ranges[6]), len(records), len(string_blob), int(time.time())))
+        fh.write(packed[4])
+        fh.write(packed[6])
+        fh.write(record_blob)
+        fh.write(string_blob)
+    # 用新文件替换旧文件；已打开旧库的进程仍持有原 inode，下次检查时切换
+    os.replace(tmp, dest)
+    return {
+        "ipv4_ranges": len(ranges[4]),
+        "ipv6_ranges": len(ranges[6]),
+        "records": len(records),
+        "invalid": invalid,
+        "overlapped": overlapped,
+    }
+
+
+def build_from_csv(src, dest: Path) -> Dict[str, Any]:
+    """src 为文本文件对象或路径。"""
+    if isinstance(src, (str, Path)):
+        with open(src, "r", encoding="utf-8-sig", newline="") as fh:
+            return build_database(csv.DictReader(fh), dest)
+    return build_database(csv.DictReader(src), dest)
+
+
+class GeoIPDatabase:
+    """以 mmap 打开的只读库，查询时直接在映射内存上二分查找。"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read_header()
+        except Exception:
+            # 校验失败时释放映射，避免每次重试都泄漏一个 mmap
+            self._mm.close()
+            raise
+        # 记录数通常只有数万条，解码结果常驻内存
+        self._records: Dict[int, Dict[str, Optional[str]]] = {}
+
+    def _read_header(self) -> None:
+        if self._mm[: len(MAGIC)] != MAGIC:
+            raise ValueError("GeoIP 库格式不正确")
+        if len(self._mm) < _header_size():
+            raise ValueError("GeoIP 库文件不完整")
+        self.v4_count, self.v6_count, self.record_count, string_size, self.built_at = _HEADER.unpack_from(self._mm, len(MAGIC))
+        self._v4_offset = _header_size()
+        self._v6_offset = self._v4_offset + self.v4_count * _V4.size
+        self._record_offset = self._v6_offset + self.v6_count * _V6.size
+        self._string_offset = self._record_offset + self.record_count * _RECORD.size
+        if self._string_offset + string_size != len(self._mm):
+            raise ValueError("GeoIP 库文件不完整")
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def meta(self) -> Dict[str, Any]:
+        return {
+            "path": str(self.path),
+            "ipv4_ranges": self.v4_count,
+            "ipv6_ranges": self.v6_count,
+            "records": self.record_count,
+            "built_at": self.built_at,
+            "size": len(self._mm),
+        }
+
+    def _string(self, offset: int) -> Optional[str]:
+        if offset == _NONE:
+            return None
+        pos = self._string_offset + offset
+        (length,) = _STR_LEN.unpack_from(self._mm, pos)
+        return self._mm[pos + _STR_LEN.size: pos + _STR_LEN.size + length].decode("utf-8", "ignore")
+
+    def _record(self, record_id: int) -> Dict[str, Optional[str]]:
+        record = self._records.get(record_id)
+        if record is None:
+            offsets = _RECORD.unpack_from(self._mm, self._record_offset + record_id * _RECORD.size)
+            record = {field: self._string(offset) for field, offset in zip(FIELDS, offsets)}
+            self._records[record_id] = record
+        return record
+
+    def _search(self, key, count: int, base: int, item: struct.Struct) -> Optional[int]:
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start, end, record_id = item.unpack_from(self._mm, base + mid * item.size)
+            if key < start:
+                hi = mid
+            elif key > end:
+                lo = mid + 1
+            else:
+                return record_id
+        return None
+
+    def lookup(self, ip: str) -> Optional[Dict[str, Optional[str]]]:
+        try:
+            addr = ipaddress.ip_address(str(ip).strip())
+        except ValueError:
+            return None
+        if addr.version == 6 and addr.ipv4_mapped:
+            addr = addr.ipv4_mapped
+        if addr.version == 4:
+            record_id = self._search(int(addr), self.v4_count, self._v4_offset, _V4)
+        else:
+            record_id = self._search(addr.packed, self.v6_count, self._v6_offset, _V6)
+        if record_id is None:
+            return None
+        return dict(self._record(record_id))
+
+
+_db: Optional[GeoIPDatabase] = None
+_db_stamp = None
+_checked_at = 0.0
+_db_lock = threading.Lock()
+
+
+def _file_stamp(path: Path):
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def reload(path: Optional[Path] = None) -> Optional[GeoIPDatabase]:
+    """重新打开库文件；文件不存在或损坏时关闭离线库。"""
+    global _db, _db_stamp, _checked_at
+    path = Path(path or DEFAULT_PATH)
+    with _db_lock:
+        stamp = _file_stamp(path)
+        try:
+            new_db = GeoIPDatabase(path) if stamp else None
+        except (OSError, ValueError) as e:
+            print(f"GeoIP 库加载失败: {e}")
+            new_db = None
+        # 旧映射交给 GC 回收，避免与正在进行的查询竞争
+        _db, _db_stamp, _checked_at = new_db, stamp, time.monotonic()
+        return new_db
+
+
+def get_database() -> Optional[GeoIPDatabase]:
+    global _checked_at
+    current = time.monotonic()
+    if _checked_at and current - _checked_at < RELOAD_CHECK_INTERVAL:
+        return _db
+    if _file_stamp(DEFAULT_PATH) != _db_stamp:
+        return reload()
+    _checked_at = current
+    return _db
+
+
+def lookup(ip: str) -> Optional[Dict[str, Optional[str]]]:
+    """离线查询 IP 位置，返回 country/province/city/carrier/asn；未导入库或未命中时返回 None。"""
+    db = get_database()
+    if db is None:
+        return None
+    return db.lookup(ip)
+
+
+def import_file(src, dest: Optional[Path] = None) -> Dict[str, Any]:
+    """导入 CSV（文本文件对象或路径）并编译为二进制库，完成后立即重新加载。"""
+    dest = Path(dest or DEFAULT_PATH)
+    stats = build_from_csv(src, dest)
+    db = reload(dest)
+    return {**stats, **(db.meta() if db else {})}
+
+
+def install_binary(fileobj, dest: Optional[Path] = None) -> Dict[str, Any]:
+    """安装已编译好的二进制库：校验通过后原子替换并重新加载。"""
+    dest = Path(dest or DEFAULT_PATH)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".tmp")
+    with open(tmp, "wb") as fh:
+        while True:
+            chunk = fileobj.read(1024 * 1024)
+            if not chunk:
+                break
+            fh.write(chunk)
+    try:
+        GeoIPDatabase(tmp).close()
+    except Exception:
+        os.unlink(tmp)
+        raise
+    os.replace(tmp, dest)
+    db = reload(dest)
+    return db.meta() if db else {}
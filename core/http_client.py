@@ -0,0 +1,173 @@
+"""
+共享 HTTP 客户端
+职责: 为威胁情报与 Webhook 提供复用连接的会话（按主机连接池、keep-alive）、
+统一的连接/读取超时、429/5xx 退避重试，以及按提供商限制并发请求数
+"""
+import os
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# 超时与并发上限可通过环境变量调整
+CONNECT_TIMEOUT = _env_float("EFF_HTTP_CONNECT_TIMEOUT", 5)
+READ_TIMEOUT = _env_float("EFF_HTTP_READ_TIMEOUT", 15)
+MAX_CONCURRENCY = max(int(_env_float("EFF_HTTP_MAX_CONCURRENCY", 8)), 1)
+# 每个主机保持的空闲连接数
+POOL_MAXSIZE = 16
+
+_sessions: Dict[str, requests.Session] = {}
+_limits: Dict[str, threading.BoundedSemaphore] = {}
+_lock = threading.Lock()
+
+Timeout = Union[float, Tuple[float, float], None]
+
+
+class RequestCounter:
+    """按 provider 统计实际发出的请求数（用于配额统计），可在多个线程间共享。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    def add(self, provider: str) -> None:
+        with self._lock:
+            self.counts[provider] = self.counts.get(provider, 0) + 1
+
+    def total(self, exclude: Tuple[str, ...] = ()) -> int:
+        with self._lock:
+            return sum(count for provider, count in self.counts.items() if provider not in exclude)
+
+
+_request_counter: ContextVar[Optional[RequestCounter]] = ContextVar("eff_http_request_counter", default=None)
+# 当前线程正在发送的请求所属 provider，供重试计数使用
+_request_provider: ContextVar[str] = ContextVar("eff_http_request_provider", default="default")
+
+
+@contextmanager
+def count_requests() -> Iterator[RequestCounter]:
+    """
+    统计代码块内经本模块发出的请求数。线程池中的任务需通过 contextvars.copy_context().run
+    提交才会计入（线程池默认不继承上下文）。
+    """
+    counter = RequestCounter()
+    token = _request_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _request_counter.reset(token)
+
+
+class _CountingRetry(Retry):
+    """urllib3 每决定重试一次即多发一个请求，在此计入当前统计，使配额统计覆盖会话内部的重试。"""
+
+    def increment(self, *args, **kwargs) -> "_CountingRetry":
+        # 重试次数耗尽时父类抛出异常，不会再发请求，也就不计数
+        retry = super().increment(*args, **kwargs)
+        counter = _request_counter.get()
+        if counter is not None:
+            counter.add(_request_provider.get())
+        return retry
+
+
+# 查询类接口 (GET)：429/5xx 与连接失败均退避重试
+_QUERY_RETRY = _CountingRetry(
+    total=2,
+    backoff_factor=0.5,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset({"GET"}),
+    # 不按 Retry-After 休眠：长等待会占住提供商并发名额并拖过调用方的截止时间，只做有限的指数退避
+    respect_retry_after_header=False,
+    raise_on_status=False,
+)
+# 推送类接口 (POST)：只在对方明确未处理时重试（连接失败、429），避免群里重复消息
+_PUSH_RETRY = _CountingRetry(
+    total=2,
+    connect=2,
+    read=0,
+    backoff_factor=0.5,
+    status_forcelist=(429,),
+    allowed_methods=frozenset({"POST"}),
+    respect_retry_after_header=False,
+    raise_on_status=False,
+)
+
+
+def _build_session(retry: Retry) -> requests.Session:
+    session = requests.Session()
+    # 会话在所有提供商与工作区间共享，禁止保存和回传 Cookie，避免一方设置的 Cookie 被带到其他请求；
+    # 需要 Cookie 的调用（如微步 Web 模式）通过请求头显式传入
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = HTTPAdapter(pool_connections=POOL_MAXSIZE, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(kind: str = "query") -> requests.Session:
+    """kind 为 query（情报查询）或 push（Webhook 推送），同类请求共用一个连接池。"""
+    with _lock:
+        session = _sessions.get(kind)
+        if session is None:
+            session = _build_session(_PUSH_RETRY if kind == "push" else _QUERY_RETRY)
+            _sessions[kind] = session
+        return session
+
+
+def _limit_for(provider: str) -> threading.BoundedSemaphore:
+    with _lock:
+        limit = _limits.get(provider)
+        if limit is None:
+            limit = threading.BoundedSemaphore(MAX_CONCURRENCY)
+            _limits[provider] = limit
+        return limit
+
+
+def request(method: str, url: str, *, provider: str = "default", timeout: Timeout = None, **kwargs) -> requests.Response:
+    """
+    发送请求。同一 provider 同时在途的请求不超过 MAX_CONCURRENCY；
+    timeout 可为读取超时秒数或 (连接, 读取) 元组，缺省使用全局配置。
+    """
+    if timeout is None:
+        timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+    elif not isinstance(timeout, tuple):
+        timeout = (min(CONNECT_TIMEOUT, timeout), timeout)
+    session = get_session("push" if method.upper() == "POST" else "query")
+    with _limit_for(provider):
+        counter = _request_counter.get()
+        if counter is not None:
+            counter.add(provider)
+        token = _request_provider.set(provider)
+        try:
+            return session.request(method, url, timeout=timeout, **kwargs)
+        finally:
+            _request_provider.reset(token)
+
+
+def get(url: str, *, provider: str = "default", timeout: Timeout = None, **kwargs) -> requests.Response:
+    return request("GET", url, provider=provider, timeout=timeout, **kwargs)
+
+
+def post(url: str, *, provider: str = "default", timeout: Timeout = None, **kwargs) -> requests.Response:
+    return request("POST", url, provider=provider, timeout=timeout, **kwargs)
+
+
+def close_sessions() -> None:
+    with _lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
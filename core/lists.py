@@ -2,10 +2,14 @@
 IP 名单匹配工具。
 
 Web 版名单数据存储在数据库系统配置中；本模块只负责判断单个 IP 是否
-命中单 IP、CIDR 或范围规则。
+命中单 IP、CIDR 或范围规则。大名单请先用 IPListIndex 编译成有序区间，
+再做二分查找。
 """
 
+import heapq
+from bisect import bisect_right
 from ipaddress import AddressValueError, ip_address, ip_network
+from typing import Iterable
 
 
 def _range_bounds(value: str):
@@ -23,8 +27,163 @@ def _range_bounds(value: str):
     return start_ip, end_ip
 
 
-def is_ip_in_list(ip: str, ip_list: list[str]) -> bool:
+def item_bounds(value: str) -> tuple[int, int, int] | None:
+    """把名单项解析为 (IP 版本, 起始整数, 结束整数)，无法识别时返回 None。"""
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        if "/" in value:
+            network = ip_network(value, strict=False)
+            return network.version, int(network.network_address), int(network.broadcast_address)
+        if "-" in value:
+            start_ip, end_ip = _range_bounds(value)
+            if start_ip.version != end_ip.version or start_ip > end_ip:
+                return None
+            return start_ip.version, int(start_ip), int(end_ip)
+        target = ip_address(value)
+        return target.version, int(target), int(target)
+    except (ValueError, AddressValueError):
+        return None
+
+
+class _VersionIndex:
+    """单个 IP 版本的区间索引。"""
+
+    __slots__ = ("starts", "ends", "max_ends", "items", "merged_starts", "merged_ends", "bounds", "first_items", "specific_items")
+
+    def __init__(self, intervals: list[tuple[int, int, int]]):
+        # intervals: (start, end, 名单项序号)，按起点排序
+        intervals.sort()
+        self.starts = [start for start, _, _ in intervals]
+        self.ends = [end for _, end, _ in intervals]
+        self.items = [position for _, _, position in intervals]
+        # 前缀最大终点：向前回溯时一旦小于目标即可停止
+        self.max_ends: list[int] = []
+        running = -1
+        for end in self.ends:
+            running = max(running, end)
+            self.max_ends.append(running)
+        # 合并重叠/相邻区间，用于只关心是否命中的场景
+        self.merged_starts: list[int] = []
+        self.merged_ends: list[int] = []
+        for start, end, _ in intervals:
+            if self.merged_ends and start <= self.merged_ends[-1] + 1:
+                if end > self.merged_ends[-1]:
+                    self.merged_ends[-1] = end
+            else:
+                self.merged_starts.append(start)
+                self.merged_ends.append(end)
+
+        # 按所有区间端点把数轴切成基本段，每段预先记下覆盖它的名单序号最小项与范围最小项（-1 表示无），
+        # 首个命中与最长前缀查询只需一次二分，不受宽区间（如 0.0.0.0/0、10.0.0.0/8）影响
+        self.bounds: list[int] = sorted({start for start, _, _ in intervals} | {end + 1 for _, end, _ in intervals})
+        self.first_items: list[int] = []
+        self.specific_items: list[int] = []
+        by_position: list[tuple[int, int, int]] = []
+        by_span: list[tuple[int, int, int, int]] = []
+        cursor = 0
+        for point in self.bounds:
+            while cursor < len(intervals) and intervals[cursor][0] == point:
+                start, end, position = intervals[cursor]
+                heapq.heappush(by_position, (position, end, position))
+                # 范围相同时取名单中靠前的一项
+                heapq.heappush(by_span, (end - start, position, end, position))
+                cursor += 1
+            self.first_items.append(self._heap_top(by_position, point))
+            self.specific_items.append(self._heap_top(by_span, point))
+
+    @staticmethod
+    def _heap_top(heap: list, point: int) -> int:
+        # 惰性删除：只弹出已结束的堆顶，堆中其余过期项不影响最小值；堆元素末两位固定为 (end, position)
+        while heap and heap[0][-2] < point:
+            heapq.heappop(heap)
+        return heap[0][-1] if heap else -1
+
+    def contains(self, value: int) -> bool:
+        pos = bisect_right(self.merged_starts, value) - 1
+        return pos >= 0 and value <= self.merged_ends[pos]
+
+    def first(self, value: int) -> int:
+        pos = bisect_right(self.bounds, value) - 1
+        return self.first_items[pos] if pos >= 0 else -1
+
+    def most_specific(self, value: int) -> int:
+        pos = bisect_right(self.bounds, value) - 1
+        return self.specific_items[pos] if pos >= 0 else -1
+
+    def match(self, value: int) -> list[int]:
+        positions = []
+        pos = bisect_right(self.starts, value) - 1
+        while pos >= 0 and self.max_ends[pos] >= value:
+            if self.ends[pos] >= value:
+                positions.append(self.items[pos])
+            pos -= 1
+        return positions
+
+
+class IPListIndex:
+    """
+    名单编译后的区间索引：IPv4/IPv6 分开存放，查找为二分 O(log n)。
+
+    contains() 只判断是否命中；first() 返回名单中第一个命中项，与 contains() 同为 O(log n)，
+    供解析等热路径使用；match() 返回全部命中项（按名单顺序），存在宽区间时需回溯较多区间，
+    适合管理端的单次查询；most_specific() 返回覆盖范围最小的命中项（最长前缀匹配），同为 O(log n)。
+    无法解析的名单项会被忽略，与 is_ip_in_list 的行为一致。
+    """
+
+    def __init__(self, items: Iterable[str]):
+        self.items: list[str] = []
+        intervals: dict[int, list[tuple[int, int, int]]] = {4: [], 6: []}
+        for item in items:
+            bounds = item_bounds(item if isinstance(item, str) else "")
+            if bounds is None:
+                continue
+            version, start, end = bounds
+            intervals[version].append((start, end, len(self.items)))
+            self.items.append(item.strip())
+        self._indexes = {version: _VersionIndex(rows) for version, rows in intervals.items()}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _target(self, ip: str):
+        try:
+            return ip_address((ip or "").strip())
+        except (ValueError, AddressValueError):
+            return None
+
+    def contains(self, ip: str) -> bool:
+        target = self._target(ip)
+        if target is None:
+            return False
+        return self._indexes[target.version].contains(int(target))
+
+    def first(self, ip: str) -> str | None:
+        target = self._target(ip)
+        if target is None:
+            return None
+        pos = self._indexes[target.version].first(int(target))
+        return self.items[pos] if pos >= 0 else None
+
+    def match(self, ip: str) -> list[str]:
+        target = self._target(ip)
+        if target is None:
+            return []
+        return [self.items[pos] for pos in sorted(self._indexes[target.version].match(int(target)))]
+
+    def most_specific(self, ip: str) -> str | None:
+        target = self._target(ip)
+        if target is None:
+            return None
+        pos = self._indexes[target.version].most_specific(int(target))
+        return self.items[pos] if pos >= 0 else None
+
+
+def is_ip_in_list(ip: str, ip_list: "list[str] | IPListIndex") -> bool:
     """检查 IP 是否命中名单项，支持单 IP、CIDR、完整范围和 IPv4 简写范围。"""
+    if isinstance(ip_list, IPListIndex):
+        return ip_list.contains(ip)
     try:
         target = ip_address((ip or "").strip())
     except (ValueError, AddressValueError):
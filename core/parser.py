@@ -2,8 +2,7 @@
 文本解析模块
 职责: 基础文本解析，提取key-value对
 """
-import re
-from .regex import load_engine
+from .regex import compile_pattern, get_engine
 
 
 def parse_text(text):
@@ -122,9 +121,8 @@ def extract_with_patterns(patterns, text):
         patterns = [patterns]
 
     for p in patterns:
-        try:
-            reg = re.compile(p)
-        except re.error:
+        reg = compile_pattern(p)
+        if reg is None:
             continue
 
         m = reg.search(text)
@@ -153,9 +151,9 @@ def parse_log(text, cfg=None):
     if not text:
         return result
 
-    # 1. 尝试使用 RegexEngine（优先）
+    # 1. 尝试使用 RegexEngine（优先），相同正则配置复用缓存的引擎
     try:
-        engine = load_engine(cfg)
+        engine = get_engine(cfg)
         fields = engine.extract_fields(text)
         if fields:
             result['data'].update(fields)
@@ -2,20 +2,204 @@
 正则引擎模块
 职责: 编译用户定义的正则规则，进行日志字段提取
 """
+import hashlib
+import json
 import re
+import threading
+import time
+from collections import OrderedDict
+
 from .config import get_default_config
 
+_REGEX_META = set(".^$*+?{}[]\\|()")
+_QUANTIFIERS = set("*+?{")
+# 引擎缓存容量：按正则配置内容寻址，超过后淘汰最久未使用的引擎
+ENGINE_CACHE_SIZE = 64
+PATTERN_CACHE_SIZE = 1024
+
+# 字面量前缀太短时锚点命中过多，单次扫描反而更慢，这类规则仍逐条 search
+_MIN_ANCHOR_LENGTH = 2
+
+
+def _has_top_level_alternation(pattern):
+    """判断正则是否在最外层含有 `|`（此时不存在公共字面量前缀）"""
+    depth = 0
+    in_class = False
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if in_class:
+            if ch == "]":
+                in_class = False
+        elif ch == "[":
+            in_class = True
+            if pattern[i + 1:i + 2] == "^":
+                i += 1
+            if pattern[i + 1:i + 2] == "]":
+                i += 1
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "|" and depth == 0:
+            return True
+        i += 1
+    return False
+
+
+def literal_prefix(pattern):
+    """
+    提取正则的固定字面量前缀，每个匹配都必须以该前缀开头
+
+    Args:
+        pattern: 正则字符串
+
+    Returns:
+        str: 字面量前缀；无法确定时返回空字符串
+    """
+    if not isinstance(pattern, str) or _has_top_level_alternation(pattern):
+        return ""
+    chars = []
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\":
+            # 只接受转义的标点（\. \: \-），\d \s \1 等都不是字面量
+            if i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+                literal, step = pattern[i + 1], 2
+            else:
+                break
+        elif ch in _REGEX_META:
+            break
+        else:
+            literal, step = ch, 1
+        # 后面跟量词时该字符可能不出现或重复，不能计入前缀
+        if pattern[i + step:i + step + 1] in _QUANTIFIERS:
+            break
+        chars.append(literal)
+        i += step
+    return "".join(chars)
+
+
+def _prefix_trie_pattern(words):
+    """
+    把一组字面量编译为按公共前缀折叠的交替正则
+
+    扁平的 `a|b|c` 在每个位置要逐个尝试全部分支，按前缀树折叠后每个位置
+    只需比较各层的首字符。某个词是另一个词的前缀时只保留短词，
+    调用方会在命中位置用 startswith 逐个确认所有前缀。
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            if node.get("") is True:
+                break
+            node = node.setdefault(ch, {})
+        else:
+            node.clear()
+            node[""] = True
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch != ""]
+        if not branches:
+            return ""
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+
+    return build(trie)
+
+
+class _SinglePassPlan:
+    """
+    单次扫描提取计划
+
+    所有带字面量前缀的规则共用一个前缀交替正则，一次扫描即可找出每个前缀
+    在文本中的全部出现位置；规则只在这些位置用自身编译结果做锚定匹配。
+    由于规则的任何匹配都必须从其前缀处开始，按位置递增找到的第一个锚定
+    匹配即为 search 的最左匹配，结果与逐条 search 完全一致。
+    无法提取前缀的规则（以分组、字符类、内联标志开头或顶层含 `|`）
+    回退为逐条 search。提取仍使用每条规则自己的编译结果，反向引用等语法不受影响。
+    """
+
+    def __init__(self, groups):
+        # groups: [(field, [compiled_patterns])]，顺序即写入结果的顺序
+        self.groups = groups
+        self.anchors = {}  # {(group_idx, pattern_idx): prefix}
+        self.by_first_char = {}  # {first_char: [(group_idx, pattern_idx)]}
+        for g, (_field, patterns) in enumerate(groups):
+            for k, compiled in enumerate(patterns):
+                prefix = literal_prefix(compiled.pattern) if compiled.flags & re.IGNORECASE == 0 else ""
+                if len(prefix) >= _MIN_ANCHOR_LENGTH:
+                    self.anchors[(g, k)] = prefix
+                    self.by_first_char.setdefault(prefix[0], []).append((g, k))
+        prefixes = sorted(set(self.anchors.values()), key=len)
+        self.scanner = re.compile(_prefix_trie_pattern(prefixes)) if prefixes else None
+
+    def _scan(self, text):
+        """一次扫描，返回 {(group_idx, pattern_idx): match}（仅包含命中的锚定规则）"""
+        found = {}
+        if self.scanner is None:
+            return found
+        pending = set(self.anchors)
+        anchors = self.anchors
+        by_first_char = self.by_first_char
+        groups = self.groups
+        search = self.scanner.search
+        pos = 0
+        while pending:
+            hit = search(text, pos)
+            if not hit:
+                break
+            start = hit.start()
+            # 从命中位置 +1 继续，保证相互重叠的前缀出现位置都能被找到
+            for slot in by_first_char[text[start]]:
+                if slot in pending and text.startswith(anchors[slot], start):
+                    match = groups[slot[0]][1][slot[1]].match(text, start)
+                    if match:
+                        found[slot] = match
+                        # 同字段中优先级更低的规则已不再需要
+                        g, k = slot
+                        for other in range(k, len(groups[g][1])):
+                            pending.discard((g, other))
+            pos = start + 1
+        return found
+
+    def extract(self, text):
+        found = self._scan(text)
+        result = {}
+        for g, (field, patterns) in enumerate(self.groups):
+            value = None
+            for k, compiled in enumerate(patterns):
+                if (g, k) in self.anchors:
+                    match = found.get((g, k))
+                else:
+                    match = compiled.search(text)
+                if match:
+                    value = match.group(1) if match.groups() else match.group(0)
+                    break
+            if value:
+                result[field] = value
+        return result
+
 
 class RegexEngine:
     """正则引擎，管理编译后的正则模式"""
     
-    def __init__(self):
+    def __init__(self, single_pass=False):
         self.five_tuple_patterns = {}  # {field: [compiled_patterns]}
         self.extra_patterns = {}  # {field: [compiled_patterns]}
         self.extra_enabled = {}  # {field: enabled}
+        self.single_pass = single_pass  # 是否使用单次扫描提取模式
+        self._plan = None
     
     def load_from_config(self, cfg):
         """从配置加载并编译正则模式"""
+        self._plan = None
         # 编译五元组
         five_tuple = cfg.get('regex', {}).get('five_tuple', {})
         for field, patterns in five_tuple.items():
@@ -68,6 +252,9 @@ class RegexEngine:
         
         if not text:
             return result
+
+        if self.single_pass:
+            return self.extract_fields_single_pass(text)
         
         # 提取五元组
         for field, patterns in self.five_tuple_patterns.items():
@@ -84,6 +271,28 @@ class RegexEngine:
         
         return result
     
+    def extract_fields_single_pass(self, text):
+        """
+        单次扫描提取字段，结果与 extract_fields 的逐字段循环一致
+
+        Args:
+            text: 原始日志文本
+
+        Returns:
+            dict: 提取的字段 {field: value}
+        """
+        if not text:
+            return {}
+        if self._plan is None:
+            groups = list(self.five_tuple_patterns.items())
+            groups.extend(
+                (field, patterns)
+                for field, patterns in self.extra_patterns.items()
+                if self.extra_enabled.get(field, True)
+            )
+            self._plan = _SinglePassPlan(groups)
+        return self._plan.extract(text)
+    
     def _match_patterns(self, text, patterns):
         """
         使用多个正则模式匹配
@@ -108,12 +317,13 @@ class RegexEngine:
         return None
 
 
-def load_engine(cfg=None):
+def load_engine(cfg=None, single_pass=False):
     """
     加载并初始化正则引擎
     
     Args:
         cfg: 配置字典，如果为 None 则使用内置默认配置
+        single_pass: 是否启用单次扫描提取模式
     
     Returns:
         RegexEngine: 初始化后的引擎
@@ -121,11 +331,149 @@ def load_engine(cfg=None):
     if cfg is None:
         cfg = get_default_config()
     
-    engine = RegexEngine()
+    engine = RegexEngine(single_pass=single_pass)
     engine.load_from_config(cfg)
     return engine
 
 
+_engine_cache = OrderedDict()  # {config_hash: RegexEngine}
+_pattern_cache = OrderedDict()  # {pattern: compiled 或 None（编译失败）}
+_cache_lock = threading.Lock()
+_cache_stats = {
+    "hits": 0,
+    "misses": 0,
+    "evictions": 0,
+    "compile_seconds": 0.0,
+    "pattern_hits": 0,
+    "pattern_misses": 0,
+}
+
+
+def engine_config_hash(cfg=None, single_pass=False):
+    """
+    计算正则配置的稳定哈希，只覆盖 RegexEngine 实际读取的部分
+
+    Args:
+        cfg: 配置字典，如果为 None 则使用内置默认配置
+        single_pass: 是否启用单次扫描提取模式
+
+    Returns:
+        str: sha256 十六进制摘要
+    """
+    if cfg is None:
+        cfg = get_default_config()
+    regex_cfg = cfg.get('regex', {}) or {}
+    payload = {
+        "five_tuple": regex_cfg.get('five_tuple', {}),
+        "extra_fields": regex_cfg.get('extra_fields', {}),
+        "single_pass": bool(single_pass),
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get_engine(cfg=None, single_pass=False):
+    """
+    获取（必要时编译）与配置内容对应的引擎，相同配置不会重复编译
+
+    返回的引擎在多次调用间共享，调用方不应再修改其模式表。
+
+    Args:
+        cfg: 配置字典，如果为 None 则使用内置默认配置
+        single_pass: 是否启用单次扫描提取模式
+
+    Returns:
+        RegexEngine: 已编译的引擎
+    """
+    key = engine_config_hash(cfg, single_pass)
+    with _cache_lock:
+        engine = _engine_cache.get(key)
+        if engine is not None:
+            _engine_cache.move_to_end(key)
+            _cache_stats["hits"] += 1
+            return engine
+        _cache_stats["misses"] += 1
+
+    started = time.perf_counter()
+    engine = load_engine(cfg, single_pass=single_pass)
+    elapsed = time.perf_counter() - started
+
+    with _cache_lock:
+        _cache_stats["compile_seconds"] += elapsed
+        # 并发未命中时以先写入者为准，保证同一配置只有一个共享实例
+        engine = _engine_cache.setdefault(key, engine)
+        _engine_cache.move_to_end(key)
+        while len(_engine_cache) > ENGINE_CACHE_SIZE:
+            _engine_cache.popitem(last=False)
+            _cache_stats["evictions"] += 1
+    return engine
+
+
+def compile_pattern(pattern, flags=0):
+    """
+    带缓存的 re.compile，编译失败返回 None（失败结果同样缓存）
+
+    Args:
+        pattern: 正则字符串
+        flags: re 标志位
+
+    Returns:
+        re.Pattern: 编译结果，或 None
+    """
+    key = (pattern, flags)
+    with _cache_lock:
+        if key in _pattern_cache:
+            _pattern_cache.move_to_end(key)
+            _cache_stats["pattern_hits"] += 1
+            return _pattern_cache[key]
+        _cache_stats["pattern_misses"] += 1
+
+    started = time.perf_counter()
+    try:
+        compiled = re.compile(pattern, flags)
+    except (re.error, TypeError):
+        compiled = None
+    elapsed = time.perf_counter() - started
+
+    with _cache_lock:
+        _cache_stats["compile_seconds"] += elapsed
+        _pattern_cache[key] = compiled
+        while len(_pattern_cache) > PATTERN_CACHE_SIZE:
+            _pattern_cache.popitem(last=False)
+    return compiled
+
+
+def engine_cache_info():
+    """
+    返回引擎/正则缓存的计数器
+
+    Returns:
+        dict: hits / misses / evictions / size / maxsize / compile_ms，
+              以及单条正则缓存的 pattern_hits / pattern_misses / pattern_size
+    """
+    with _cache_lock:
+        return {
+            "hits": _cache_stats["hits"],
+            "misses": _cache_stats["misses"],
+            "evictions": _cache_stats["evictions"],
+            "size": len(_engine_cache),
+            "maxsize": ENGINE_CACHE_SIZE,
+            "compile_ms": round(_cache_stats["compile_seconds"] * 1000, 3),
+            "pattern_hits": _cache_stats["pattern_hits"],
+            "pattern_misses": _cache_stats["pattern_misses"],
+            "pattern_size": len(_pattern_cache),
+        }
+
+
+def clear_engine_cache():
+    """清空引擎和正则缓存并重置计数器"""
+    with _cache_lock:
+        _engine_cache.clear()
+        _pattern_cache.clear()
+        for key in _cache_stats:
+            _cache_stats[key] = 0.0 if key == "compile_seconds" else 0
+
+
 def extract_fields(text, engine):
     """
     使用给定的引擎提取字段
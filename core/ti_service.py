@@ -2,11 +2,40 @@
 威胁情报聚合模块
 职责: 调用微步 ThreatBook、绿盟 NTI、奇安信 TI 和安恒 TI 接口，返回规范化结果
 """
-import requests
+import ipaddress
 import json
+import os
 import re
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import Optional, Dict, Any
 
+from . import geoip, http_client
+
+# 情报查询线程池：源/目的 IP 并发查询；地理位置兜底单独一个池，避免与外层任务互相等待
+TI_MAX_WORKERS = 16
+GEO_MAX_WORKERS = 8
+# 批量查询单独的线程池，大批量任务只占用少量线程，不挤占单条告警的交互查询
+TI_BATCH_MAX_WORKERS = 4
+# query_pair 的整体截止时间（秒），可通过 providers.deadline_seconds 覆盖
+TI_DEFAULT_DEADLINE = 20
+# query_ips_batch 的整体截止时间（秒），可通过 providers.batch_deadline_seconds 覆盖
+TI_BATCH_DEADLINE = 120
+
+_ti_executor = ThreadPoolExecutor(max_workers=TI_MAX_WORKERS, thread_name_prefix="ti-query")
+_geo_executor = ThreadPoolExecutor(max_workers=GEO_MAX_WORKERS, thread_name_prefix="ti-geo")
+_ti_batch_executor = ThreadPoolExecutor(max_workers=TI_BATCH_MAX_WORKERS, thread_name_prefix="ti-batch")
+
+
+def _elapsed_ms(started: float) -> int:
+    return int((time.perf_counter() - started) * 1000)
+
+
+def _ipv4_param(ip: str) -> Optional[str]:
+    m = re.search(r'(?:\d{1,3}\.){3}\d{1,3}', ip or "")
+    return m.group(0) if m else None
+
 
 class ThreatIntelService:
     """微步在线 (ThreatBook) 威胁情报服务"""
@@ -15,15 +44,7 @@ class ThreatIntelService:
     @staticmethod
     def query_threatbook_api(ip: str, config: Dict) -> Optional[Dict[str, Any]]:
         """使用官方 API Key 查询"""
-        base = {
-            'source': 'threatbook',
-            'is_malicious': False,
-            'severity': None,
-            'judgments': [],
-            'labels': [],
-            'location': {},
-            'raw': {}
-        }
+        base = ThreatIntelService._base()
         api_key = config.get("api_key", "").strip()
         if not api_key:
             return base
@@ -35,48 +56,93 @@ class ThreatIntelService:
 
         try:
             params = {"apikey": api_key, "resource": ip_param, "lang": "zh"}
-            resp = requests.get(ThreatIntelService.API_URL, params=params, timeout=15)
+            resp = http_client.get(ThreatIntelService.API_URL, params=params, provider="threatbook")
             resp.raise_for_status()
             data = resp.json()
             base['raw'] = data
 
             if data.get('response_code') == 0:
                 container = data.get('data') or data.get('ips') or {}
-                ip_data = container.get(ip_param) or {}
-                if ip_data:
-                    basic = ip_data.get('basic', {})
-                    loc = basic.get('location', {})
-                    carrier = basic.get('carrier')
-                    location = {
-                        "country": loc.get('country'),
-                        "province": loc.get('province'),
-                        "city": loc.get('city'),
-                        "carrier": carrier,
-                    }
-                    
-                    # 提取标签 (Greedy 模式)
-                    labels = []
-                    labels.extend(ip_data.get('judgments') or [])
-                    for tc in ip_data.get('tags_classes') or []:
-                        labels.extend(tc.get('tags', []) or [])
-                    scene = ip_data.get('scene')
-                    if scene: labels.append(f"场景:{scene}")
-                    if carrier: labels.append(carrier)
-                    
-                    labels = list(dict.fromkeys(filter(None, labels)))
-
-                    base.update({
-                        'is_malicious': ip_data.get('is_malicious', False),
-                        'severity': ip_data.get('severity'),
-                        'judgments': labels,
-                        'labels': labels,
-                        'location': location
-                    })
+                ThreatIntelService._apply_threatbook_ip(base, container.get(ip_param) or {})
             return base
         except Exception as e:
             print(f"微步 API 查询失败: {e}")
             return None
 
+    @staticmethod
+    def _base() -> Dict[str, Any]:
+        return {
+            'source': 'threatbook',
+            'is_malicious': False,
+            'severity': None,
+            'judgments': [],
+            'labels': [],
+            'location': {},
+            'raw': {}
+        }
+
+    @staticmethod
+    def _apply_threatbook_ip(base: Dict[str, Any], ip_data: Dict[str, Any]) -> None:
+        if not ip_data:
+            return
+        basic = ip_data.get('basic', {})
+        loc = basic.get('location', {})
+        carrier = basic.get('carrier')
+        location = {
+            "country": loc.get('country'),
+            "province": loc.get('province'),
+            "city": loc.get('city'),
+            "carrier": carrier,
+        }
+        
+        # 提取标签 (Greedy 模式)
+        labels = []
+        labels.extend(ip_data.get('judgments') or [])
+        for tc in ip_data.get('tags_classes') or []:
+            labels.extend(tc.get('tags', []) or [])
+        scene = ip_data.get('scene')
+        if scene: labels.append(f"场景:{scene}")
+        if carrier: labels.append(carrier)
+        
+        labels = list(dict.fromkeys(filter(None, labels)))
+
+        base.update({
+            'is_malicious': ip_data.get('is_malicious', False),
+            'severity': ip_data.get('severity'),
+            'judgments': labels,
+            'labels': labels,
+            'location': location
+        })
+
+    @staticmethod
+    def query_threatbook_api_batch(ips: list, config: Dict) -> Dict[str, Optional[Dict[str, Any]]]:
+        """一次请求查询多个 IP（resource 逗号分隔），返回 {ip: 结果}，请求失败时各 IP 为 None。"""
+        api_key = config.get("api_key", "").strip()
+        params_by_ip = {ip: _ipv4_param(ip) for ip in ips}
+        wanted = list(dict.fromkeys(param for param in params_by_ip.values() if param))
+        if not api_key or not wanted:
+            return {ip: ThreatIntelService._base() for ip in ips}
+        try:
+            params = {"apikey": api_key, "resource": ",".join(wanted), "lang": "zh"}
+            resp = http_client.get(ThreatIntelService.API_URL, params=params, provider="threatbook")
+            resp.raise_for_status()
+            data = resp.json()
+        except Exception as e:
+            print(f"微步 API 批量查询失败: {e}")
+            return {ip: (None if param else ThreatIntelService._base()) for ip, param in params_by_ip.items()}
+
+        results = {}
+        container = (data.get('data') or data.get('ips') or {}) if data.get('response_code') == 0 else {}
+        envelope = {k: v for k, v in data.items() if k not in ('data', 'ips')}
+        for ip, param in params_by_ip.items():
+            base = ThreatIntelService._base()
+            if param:
+                # 批量响应中只保留本 IP 的部分，避免每条结果都复制整包 raw
+                base['raw'] = {**envelope, 'data': {param: container[param]} if param in container else {}}
+                ThreatIntelService._apply_threatbook_ip(base, container.get(param) or {})
+            results[ip] = base
+        return results
+
     @staticmethod
     def query_threatbook_http(ip: str, config: Dict) -> Optional[Dict[str, Any]]:
         base = {
@@ -120,7 +186,7 @@ class ThreatIntelService:
         headers = {k: v for k, v in headers.items() if v}
 
         try:
-            resp = requests.get(url, headers=headers, timeout=15)
+            resp = http_client.get(url, headers=headers, provider="threatbook_web")
             resp.raise_for_status()
             text = resp.text or ""
 
@@ -206,9 +272,12 @@ class NSFocusService:
             "X-Ns-Nti-Key": api_key,
             "Accept-encoding": "gzip"
         }
-        
+
+        # 绿盟 IOC 不含地理位置：优先查离线库，未命中时兜底定位与 NTI 请求并发进行
+        local_loc = geoip.lookup(ip_param)
+        fallback_future = None if local_loc else _geo_executor.submit(get_fallback_location, ip_param)
         try:
-            resp = requests.get(NSFocusService.NTI_URL, params={"query": ip_param}, headers=headers, timeout=15)
+            resp = http_client.get(NSFocusService.NTI_URL, params={"query": ip_param}, headers=headers, provider="nsfocus")
             resp.raise_for_status()
             data = resp.json()
             base['raw'] = data
@@ -233,7 +302,10 @@ class NSFocusService:
 
             # 即使绿盟没返回地理位置，也可以通过 API 获取一些描述性标签
             # 尝试通过 fallback 获取位置并提取运营商标签
-            fallback_loc = get_fallback_location(ip_param)
+            try:
+                fallback_loc = local_loc or fallback_future.result()
+            except Exception:
+                fallback_loc = None
             if fallback_loc:
                 base['location'] = fallback_loc
                 if fallback_loc.get('carrier'):
@@ -261,16 +333,7 @@ class QiAnXinService:
 
     @staticmethod
     def query_qianxin(ip: str, config: Dict) -> Optional[Dict[str, Any]]:
-        base = {
-            'source': 'qianxin',
-            'is_malicious': False,
-            'severity': None,
-            'confidence_level': None,
-            'judgments': [],
-            'labels': [],
-            'location': {},
-            'raw': {}
-        }
+        base = QiAnXinService._base()
         api_key = config.get("api_key", "").strip()
         if not api_key:
             return base
@@ -282,119 +345,163 @@ class QiAnXinService:
 
         headers = {"Api-Key": api_key}
         try:
-            resp = requests.get(QiAnXinService.API_URL, params={"param": ip_param}, headers=headers, timeout=15)
+            resp = http_client.get(QiAnXinService.API_URL, params={"param": ip_param}, headers=headers, provider="qianxin")
             resp.raise_for_status()
             data = resp.json()
             base['raw'] = data
 
             if data.get('status') == 10000:
-                ip_data = data.get('data', {}).get(ip_param)
-                if ip_data:
-                    geo = ip_data.get('geo', {})
-                    location = {
-                        "country": geo.get('country'),
-                        "province": geo.get('province'),
-                        "city": geo.get('city'),
-                        "carrier": ip_data.get('normal_info', {}).get('asn_org'),
-                    }
-                    
-                    summary = ip_data.get('summary_info', {})
-                    labels = []
-                    labels.extend(summary.get('malicious_label') or [])
-                    labels.extend(summary.get('ip_infrastructure_label') or [])
-                    labels.extend(summary.get('ipservice_benign_label') or [])
-                    
-                    # 威胁事件列表
-                    threat_events = []
-                    
-                    # 处理 compromised_info
-                    for comp in ip_data.get('compromised_info', []) or []:
-                        if comp.get('malware_family'): labels.append(f"家族:{comp['malware_family']}")
-                        threat_events.append({
-                            "source": "qianxin",
-                            "type": "compromised_info",
-                            "malicious_family": [comp.get('malware_family')] if comp.get('malware_family') else [],
-                            "malicious_type": comp.get('malicious_type'),
-                            "etime": comp.get('etime'),
-                        })
-
-                    # 处理 compromise (重点修复)
-                    for item in ip_data.get('compromise', []) or []:
-                        event = {
-                            "source": "qianxin",
-                            "type": "compromise",
-                            "alert_name": item.get("alert_name"),
-                            "malicious_type": item.get("malicious_type"),
-                            "kill_chain": item.get("kill_chain"),
-                            "risk": item.get("risk"),
-                            "confidence": item.get("confidence"),
-                            "current_status": item.get("current_status"),
-                            "etime": item.get("etime"),
-                            "malicious_family": item.get("malicious_family") or [],
-                            "tag": item.get("tag") or [],
-                            "platform": item.get("platform"),
-                            "ioc": item.get("ioc") or [],
-                            "ioc_category": item.get("ioc_category"),
-                            "ttp": item.get("TTP")
-                        }
-                        threat_events.append(event)
-                        
-                        # 提取标签
-                        if item.get("alert_name"): labels.append(item.get("alert_name"))
-                        if item.get("malicious_type"): labels.append(item.get("malicious_type"))
-                        if item.get("kill_chain"): labels.append(f"kill_chain:{item.get('kill_chain')}")
-                        if item.get("risk"): labels.append(f"风险:{item.get('risk')}")
-                        if item.get("confidence"): labels.append(f"置信度:{item.get('confidence')}")
-                        for f in (item.get("malicious_family") or []): labels.append(f"家族:{f}")
-                        for t in (item.get("tag") or []): labels.append(f"tag:{t}")
-                        if item.get("platform"): labels.append(f"平台:{item.get('platform')}")
-
-                    user_type = ip_data.get('normal_info', {}).get('user_type')
-                    if user_type: labels.append(user_type)
-                    labels = list(dict.fromkeys(filter(None, labels)))
-                    
-                    reputation = summary.get('reputation', 'unknown')
-                    is_malicious = reputation in ('malicious', 'suspicious')
-                    
-                    # 风险判定增强
-                    sev_score = {"high": 3, "medium": 2, "low": 1, None: 0}
-                    current_sev = None
-                    
-                    # 1. 原始恶意信息
-                    mal_infos = ip_data.get('malicious_info', [])
-                    if mal_infos:
-                        current_sev = mal_infos[0].get('severity')
-                    
-                    # 2. 如果 reputation 对应等级更高
-                    rep_sev = "high" if reputation == "malicious" else "medium" if reputation == "suspicious" else None
-                    if sev_score.get(rep_sev, 0) > sev_score.get(current_sev, 0):
-                        current_sev = rep_sev
-
-                    # 3. compromise 中的 risk
-                    for te in threat_events:
-                        risk = te.get("risk")
-                        if risk in ("high", "medium", "low", "critical"):
-                            # 把 critical 映射为 high
-                            mapped_risk = "high" if risk in ("high", "critical") else risk
-                            if sev_score.get(mapped_risk, 0) > sev_score.get(current_sev, 0):
-                                current_sev = mapped_risk
-                            # 如果有中高风险事件，判定为恶意
-                            if risk in ("high", "medium", "critical"):
-                                is_malicious = True
-
-                    base.update({
-                        'is_malicious': is_malicious,
-                        'severity': current_sev,
-                        'judgments': labels,
-                        'labels': labels,
-                        'location': location,
-                        'threat_events': threat_events
-                    })
+                QiAnXinService._apply_qianxin_ip(base, data.get('data', {}).get(ip_param) or {})
             return base
         except Exception as e:
             print(f"奇安信 TI 查询失败: {e}")
             return None
 
+    @staticmethod
+    def _base() -> Dict[str, Any]:
+        return {
+            'source': 'qianxin',
+            'is_malicious': False,
+            'severity': None,
+            'confidence_level': None,
+            'judgments': [],
+            'labels': [],
+            'location': {},
+            'raw': {}
+        }
+
+    @staticmethod
+    def _apply_qianxin_ip(base: Dict[str, Any], ip_data: Dict[str, Any]) -> None:
+        if not ip_data:
+            return
+        geo = ip_data.get('geo', {})
+        location = {
+            "country": geo.get('country'),
+            "province": geo.get('province'),
+            "city": geo.get('city'),
+            "carrier": ip_data.get('normal_info', {}).get('asn_org'),
+        }
+        
+        summary = ip_data.get('summary_info', {})
+        labels = []
+        labels.extend(summary.get('malicious_label') or [])
+        labels.extend(summary.get('ip_infrastructure_label') or [])
+        labels.extend(summary.get('ipservice_benign_label') or [])
+        
+        # 威胁事件列表
+        threat_events = []
+        
+        # 处理 compromised_info
+        for comp in ip_data.get('compromised_info', []) or []:
+            if comp.get('malware_family'): labels.append(f"家族:{comp['malware_family']}")
+            threat_events.append({
+                "source": "qianxin",
+                "type": "compromised_info",
+                "malicious_family": [comp.get('malware_family')] if comp.get('malware_family') else [],
+                "malicious_type": comp.get('malicious_type'),
+                "etime": comp.get('etime'),
+            })
+
+        # 处理 compromise (重点修复)
+        for item in ip_data.get('compromise', []) or []:
+            event = {
+                "source": "qianxin",
+                "type": "compromise",
+                "alert_name": item.get("alert_name"),
+                "malicious_type": item.get("malicious_type"),
+                "kill_chain": item.get("kill_chain"),
+                "risk": item.get("risk"),
+                "confidence": item.get("confidence"),
+                "current_status": item.get("current_status"),
+                "etime": item.get("etime"),
+                "malicious_family": item.get("malicious_family") or [],
+                "tag": item.get("tag") or [],
+                "platform": item.get("platform"),
+                "ioc": item.get("ioc") or [],
+                "ioc_category": item.get("ioc_category"),
+                "ttp": item.get("TTP")
+            }
+            threat_events.append(event)
+            
+            # 提取标签
+            if item.get("alert_name"): labels.append(item.get("alert_name"))
+            if item.get("malicious_type"): labels.append(item.get("malicious_type"))
+            if item.get("kill_chain"): labels.append(f"kill_chain:{item.get('kill_chain')}")
+            if item.get("risk"): labels.append(f"风险:{item.get('risk')}")
+            if item.get("confidence"): labels.append(f"置信度:{item.get('confidence')}")
+            for f in (item.get("malicious_family") or []): labels.append(f"家族:{f}")
+            for t in (item.get("tag") or []): labels.append(f"tag:{t}")
+            if item.get("platform"): labels.append(f"平台:{item.get('platform')}")
+
+        user_type = ip_data.get('normal_info', {}).get('user_type')
+        if user_type: labels.append(user_type)
+        labels = list(dict.fromkeys(filter(None, labels)))
+        
+        reputation = summary.get('reputation', 'unknown')
+        is_malicious = reputation in ('malicious', 'suspicious')
+        
+        # 风险判定增强
+        sev_score = {"high": 3, "medium": 2, "low": 1, None: 0}
+        current_sev = None
+        
+        # 1. 原始恶意信息
+        mal_infos = ip_data.get('malicious_info', [])
+        if mal_infos:
+            current_sev = mal_infos[0].get('severity')
+        
+        # 2. 如果 reputation 对应等级更高
+        rep_sev = "high" if reputation == "malicious" else "medium" if reputation == "suspicious" else None
+        if sev_score.get(rep_sev, 0) > sev_score.get(current_sev, 0):
+            current_sev = rep_sev
+
+        # 3. compromise 中的 risk
+        for te in threat_events:
+            risk = te.get("risk")
+            if risk in ("high", "medium", "low", "critical"):
+                # 把 critical 映射为 high
+                mapped_risk = "high" if risk in ("high", "critical") else risk
+                if sev_score.get(mapped_risk, 0) > sev_score.get(current_sev, 0):
+                    current_sev = mapped_risk
+                # 如果有中高风险事件，判定为恶意
+                if risk in ("high", "medium", "critical"):
+                    is_malicious = True
+
+        base.update({
+            'is_malicious': is_malicious,
+            'severity': current_sev,
+            'judgments': labels,
+            'labels': labels,
+            'location': location,
+            'threat_events': threat_events
+        })
+
+    @staticmethod
+    def query_qianxin_batch(ips: list, config: Dict) -> Dict[str, Optional[Dict[str, Any]]]:
+        """一次请求查询多个 IP（param 逗号分隔），返回 {ip: 结果}，请求失败时各 IP 为 None。"""
+        api_key = config.get("api_key", "").strip()
+        params_by_ip = {ip: _ipv4_param(ip) for ip in ips}
+        wanted = list(dict.fromkeys(param for param in params_by_ip.values() if param))
+        if not api_key or not wanted:
+            return {ip: QiAnXinService._base() for ip in ips}
+        try:
+            resp = http_client.get(QiAnXinService.API_URL, params={"param": ",".join(wanted)}, headers={"Api-Key": api_key}, provider="qianxin")
+            resp.raise_for_status()
+            data = resp.json()
+        except Exception as e:
+            print(f"奇安信 TI 批量查询失败: {e}")
+            return {ip: (None if param else QiAnXinService._base()) for ip, param in params_by_ip.items()}
+
+        results = {}
+        container = (data.get('data') or {}) if data.get('status') == 10000 else {}
+        envelope = {k: v for k, v in data.items() if k != 'data'}
+        for ip, param in params_by_ip.items():
+            base = QiAnXinService._base()
+            if param:
+                base['raw'] = {**envelope, 'data': {param: container[param]} if param in container else {}}
+                QiAnXinService._apply_qianxin_ip(base, container.get(param) or {})
+            results[ip] = base
+        return results
+
 
 class DBAppService:
     """安恒 (DBAppSecurity) 威胁情报服务"""
@@ -423,7 +530,7 @@ class DBAppService:
 
         headers = {"X-API-Key": api_key}
         try:
-            resp = requests.get(DBAppService.API_URL, params={"ip": ip_param}, headers=headers, timeout=15)
+            resp = http_client.get(DBAppService.API_URL, params={"ip": ip_param}, headers=headers, provider="dbapp")
             resp.raise_for_status()
             data = resp.json()
             base['raw'] = data
@@ -465,11 +572,20 @@ class DBAppService:
             return None
 
 
+# 离线库未命中时是否再调用 ip-api.com；内网隔离环境设置 EFF_GEOIP_ONLINE=0 可避免超时等待
+GEOIP_ONLINE_FALLBACK = os.getenv("EFF_GEOIP_ONLINE", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
 def get_fallback_location(ip: str) -> Optional[Dict[str, str]]:
-    """使用公共 GeoIP API (ip-api.com) 进行位置兜底"""
+    """位置兜底：先查离线 GeoIP 库，未命中再使用公共 GeoIP API (ip-api.com)"""
+    local = geoip.lookup(ip)
+    if local:
+        return local
+    if not GEOIP_ONLINE_FALLBACK or not _is_public_ip(ip):
+        return None
     try:
         url = f"http://ip-api.com/json/{ip}?lang=zh-CN"
-        resp = requests.get(url, timeout=5)
+        resp = http_client.get(url, provider="ip-api", timeout=5)
         if resp.status_code == 200:
             data = resp.json()
             if data.get("status") == "success":
@@ -484,36 +600,93 @@ def get_fallback_location(ip: str) -> Optional[Dict[str, str]]:
     return None
 
 
+def _is_public_ip(ip: str) -> bool:
+    try:
+        return ipaddress.ip_address(ip.strip()).is_global
+    except ValueError:
+        return False
+
+
 def query_pair(src_ip: Optional[str], dst_ip: Optional[str], cfg: Dict) -> Dict[str, Any]:
+    """
+    并发查询源/目的 IP 情报，整体不超过 deadline_seconds。
+    超时的一侧结果为 None 并记录在 timed_out 中（partial=True），已完成的一侧照常返回；
+    latency_ms 记录每个 IP 的耗时，各 IP 结果内另有按提供商拆分的 latency_ms。
+    """
     result = {'src_ip_ti': None, 'dst_ip_ti': None, 'sources': []}
     providers_cfg = cfg.get('providers', {}) or {}
     if not providers_cfg.get('enabled', True):
         return result
         
     mode = providers_cfg.get('mode', 'both')
-    
+    targets = {}
     if src_ip and mode in ('both', 'src'):
-        src_ti = _query_ip(src_ip, providers_cfg)
-        result['src_ip_ti'] = src_ti
-        if src_ti:
-            result['sources'].extend(src_ti.get('sources', []))
-    
+        targets['src_ip_ti'] = src_ip
     if dst_ip and mode in ('both', 'dst'):
-        dst_ti = _query_ip(dst_ip, providers_cfg)
-        result['dst_ip_ti'] = dst_ti
-        if dst_ti:
-            result['sources'].extend(dst_ti.get('sources', []))
-    
+        targets['dst_ip_ti'] = dst_ip
+    if not targets:
+        return result
+
+    try:
+        deadline = float(providers_cfg.get('deadline_seconds') or TI_DEFAULT_DEADLINE)
+    except (TypeError, ValueError):
+        deadline = TI_DEFAULT_DEADLINE
+
+    started = time.perf_counter()
+    # 源/目的为同一 IP 时只查询一次
+    futures = {ip: _ti_executor.submit(_timed_query_ip, ip, providers_cfg) for ip in set(targets.values())}
+    wait(futures.values(), timeout=deadline)
+
+    latency = {}
+    timed_out = []
+    errors = {}
+    for key, ip in targets.items():
+        future = futures[ip]
+        if not future.done():
+            timed_out.append(key)
+            latency[key] = _elapsed_ms(started)
+            continue
+        try:
+            ti, elapsed = future.result()
+        except Exception as e:
+            errors[key] = str(e)
+            latency[key] = _elapsed_ms(started)
+            continue
+        latency[key] = elapsed
+        result[key] = ti
+        if ti:
+            result['sources'].extend(ti.get('sources', []))
+
     result['sources'] = list(set(result['sources']))
+    result['latency_ms'] = latency
+    result['partial'] = bool(timed_out or errors)
+    if timed_out:
+        result['timed_out'] = timed_out
+    if errors:
+        result['errors'] = errors
     return result
 
 
+def active_provider_name(providers_cfg: Dict) -> str:
+    """当前启用的情报提供商标识，未知取值按 _query_ip 的默认分支视为微步。"""
+    provider = (providers_cfg or {}).get('active_provider', 'threatbook')
+    return provider if provider in ('nsfocus', 'qianxin', 'dbapp') else 'threatbook'
+
+
+def _timed_query_ip(ip: str, providers_cfg: Dict):
+    started = time.perf_counter()
+    ti = _query_ip(ip, providers_cfg)
+    return ti, _elapsed_ms(started)
+
+
 def _query_ip(ip: str, providers_cfg: Dict) -> Optional[Dict[str, Any]]:
     if not ip:
         return None
     
     active_provider = providers_cfg.get('active_provider', 'threatbook')
     ti_results = []
+    latency = {}
+    started = time.perf_counter()
     
     if active_provider == 'nsfocus':
         nti_cfg = providers_cfg.get('nsfocus', {}) or {}
@@ -535,7 +708,12 @@ def _query_ip(ip: str, providers_cfg: Dict) -> Optional[Dict[str, Any]]:
         else:
             res = ThreatIntelService.query_threatbook_api(ip, tb_cfg)
         if res: ti_results.append(res)
-    
+    latency[active_provider_name(providers_cfg)] = _elapsed_ms(started)
+    return _aggregate(ip, ti_results, latency)
+
+
+def _aggregate(ip: str, ti_results: list, latency: Dict[str, int]) -> Optional[Dict[str, Any]]:
+    """把各提供商的原始结果合并成统一结构，缺少位置时使用兜底 GeoIP。"""
     if not ti_results:
         return None
     
@@ -562,7 +740,9 @@ def _query_ip(ip: str, providers_cfg: Dict) -> Optional[Dict[str, Any]]:
 
     # 如果当前提供商没有返回位置信息（如绿盟 IOC），则使用兜底 GeoIP
     if not aggregated_location or not any(aggregated_location.values()):
+        started = time.perf_counter()
         fallback = get_fallback_location(ip)
+        latency['geo_fallback'] = _elapsed_ms(started)
         if fallback:
             aggregated_location = fallback
 
@@ -582,5 +762,96 @@ def _query_ip(ip: str, providers_cfg: Dict) -> Optional[Dict[str, Any]]:
         'location_str': location_str,
         'severity': severity,
         'threat_events': threat_events,
+        'latency_ms': latency,
         'raw': raw
     }
+
+
+# 支持一次请求查询多个 IP 的提供商及单批上限，可通过 providers.<provider>.batch_size 调小
+BATCH_LIMITS = {"threatbook": 100, "qianxin": 100}
+
+
+def batch_size_for(providers_cfg: Dict) -> int:
+    """当前提供商单次请求可携带的 IP 数，不支持批量时为 1。"""
+    provider = active_provider_name(providers_cfg)
+    provider_cfg = providers_cfg.get(provider, {}) or {}
+    limit = BATCH_LIMITS.get(provider, 1)
+    if provider == 'threatbook' and provider_cfg.get("mode", "api") == "web":
+        limit = 1
+    try:
+        configured = int(provider_cfg.get("batch_size") or limit)
+    except (TypeError, ValueError):
+        configured = limit
+    return max(1, min(configured, limit))
+
+
+def _batch_deadline(providers_cfg: Dict) -> float:
+    try:
+        return float(providers_cfg.get('batch_deadline_seconds') or TI_BATCH_DEADLINE)
+    except (TypeError, ValueError):
+        return TI_BATCH_DEADLINE
+
+
+def query_ips_batch(ips: list, providers_cfg: Dict) -> tuple:
+    """
+    批量查询多个 IP，返回 ({ip: 聚合结果或 None}, 统计)。
+    支持批量接口的提供商按 batch_size_for 分块、每块一次请求；其余提供商逐 IP 并发查询。
+    整体不超过 batch_deadline_seconds，超时未完成的 IP 结果为 None 并计入 timed_out。
+    统计中的 requests 为实际发往提供商的 HTTP 请求数（即消耗的配额次数），未配置 Key 等未发请求的情况不计入；
+    截止时已在请求中的任务无法中断，返回前会等其结束，使 requests 包含它们消耗的配额。
+    """
+    ips = list(dict.fromkeys(ip for ip in ips if ip))
+    provider = active_provider_name(providers_cfg)
+    size = batch_size_for(providers_cfg)
+    stats = {"provider": provider, "ips": len(ips), "batch_size": size, "requests": 0, "timed_out": 0, "latency_ms": 0}
+    results: Dict[str, Optional[Dict[str, Any]]] = {}
+    if not ips:
+        return results, stats
+
+    started = time.perf_counter()
+    with http_client.count_requests() as counter:
+        # 每个任务在当前上下文的副本中执行，请求计数才能跨线程汇总
+        if size == 1:
+            chunks = [[ip] for ip in ips]
+            futures = [_ti_batch_executor.submit(contextvars.copy_context().run, _query_ip, ip, providers_cfg) for ip in ips]
+        else:
+            provider_cfg = providers_cfg.get(provider, {}) or {}
+            query_batch = ThreatIntelService.query_threatbook_api_batch if provider == 'threatbook' else QiAnXinService.query_qianxin_batch
+            chunks = [ips[start:start + size] for start in range(0, len(ips), size)]
+            futures = [
+                _ti_batch_executor.submit(contextvars.copy_context().run, _timed_batch, query_batch, chunk, provider_cfg)
+                for chunk in chunks
+            ]
+        wait(futures, timeout=_batch_deadline(providers_cfg))
+        late = []
+        for chunk, future in zip(chunks, futures):
+            if not future.done():
+                # 尚未开始的任务直接取消，不再消耗配额；已在请求中的无法中断，稍后等其结束再计数
+                if not future.cancel():
+                    late.append(future)
+                stats["timed_out"] += len(chunk)
+                results.update({ip: None for ip in chunk})
+                continue
+            try:
+                value = future.result()
+            except Exception:
+                results.update({ip: None for ip in chunk})
+                continue
+            if size == 1:
+                results[chunk[0]] = value
+                continue
+            raw_results, elapsed = value
+            for ip in chunk:
+                res = raw_results.get(ip)
+                results[ip] = _aggregate(ip, [res] if res else [], {provider: elapsed})
+        # 超时后仍在执行的请求同样消耗配额，等其结束（受单次请求超时约束）后再统计，结果仍按超时处理
+        wait(late)
+        # 兜底 GeoIP 的 ip-api 请求不消耗情报配额
+        stats["requests"] = counter.total(exclude=("ip-api",))
+    stats["latency_ms"] = _elapsed_ms(started)
+    return results, stats
+
+
+def _timed_batch(query_batch, chunk: list, provider_cfg: Dict):
+    started = time.perf_counter()
+    return query_batch(chunk, provider_cfg), _elapsed_ms(started)
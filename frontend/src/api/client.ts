@@ -1,5 +1,5 @@
 import axios from 'axios';
-import type { ReportFacets, ReportGenerateRequest, ReportGenerateResult, ReportRecord } from './types';
+import type { ReportFacets, ReportGenerateRequest, ReportGenerateResult, ReportRecord, TaskRecord } from './types';
 
 export const api = axios.create({
   baseURL: import.meta.env.VITE_API_BASE_URL || ''
@@ -24,6 +24,31 @@ api.interceptors.response.use(
   }
 );
 
+export interface TaskEnqueued {
+  ok: boolean;
+  task_id: number;
+  status: string;
+  alert_id?: number;
+}
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// 轮询异步任务直到完成；失败时抛出包含任务错误信息的异常，onProgress 在每次轮询到未完成的任务时调用
+export const waitForTask = async (
+  taskId: number,
+  { interval = 1000, timeout = 10 * 60 * 1000, onProgress }: { interval?: number; timeout?: number; onProgress?: (task: TaskRecord) => void } = {}
+) => {
+  const deadline = Date.now() + timeout;
+  while (Date.now() < deadline) {
+    const task = (await api.get<TaskRecord>(`/api/tasks/${taskId}`)).data;
+    if (task.status === 'success') return task;
+    if (task.status === 'failed') throw new Error(task.error || '任务执行失败');
+    onProgress?.(task);
+    await sleep(interval);
+  }
+  throw new Error('任务仍在执行，请稍后在任务记录中查看结果');
+};
+
 export const reportApi = {
   listReports: async (params?: Record<string, unknown>) => (await api.get<ReportRecord[]>('/api/reports', { params })).data,
   getReportFacets: async () => (await api.get<ReportFacets>('/api/reports/facets')).data,
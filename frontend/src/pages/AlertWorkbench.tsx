@@ -6,7 +6,8 @@ import { Brain } from 'lucide-react';
 import { Button, Card, Collapse, DatePicker, Descriptions, Drawer, Form, Input, Modal, Popconfirm, Radio, Select, Space, Switch, Table, Tabs, Tag, Typography, message } from 'antd';
 import dayjs from 'dayjs';
 import type { Dayjs } from 'dayjs';
-import { api } from '../api/client';
+import { api, waitForTask } from '../api/client';
+import type { TaskEnqueued } from '../api/client';
 import type { Alert, Device, Template, User } from '../api/types';
 import HelpTip from '../components/HelpTip';
 import CollapsibleBlock from '../components/CollapsibleBlock';
@@ -535,9 +536,16 @@ export default function AlertWorkbench({
 
   const alertStart = range?.[0]?.format('YYYY-MM-DD HH:mm:ss');
   const alertEnd = range?.[1]?.format('YYYY-MM-DD HH:mm:ss');
+  // 记录每页起始的键集游标（来自上一页的 X-Next-Cursor），顺序翻页不再走 OFFSET；筛选或每页条数变化后清空
+  const cursorScope = JSON.stringify([q, status, currentGroup, assigneeId, alertStart, alertEnd, pageSize]);
+  const pageCursors = useRef<{ scope: string; cursors: Record<number, string> }>({ scope: '', cursors: {} });
   const { data: alertPage = { rows: [], total: 0 }, isLoading, isFetching, refetch } = useQuery({
     queryKey: ['alerts', q, status, currentGroup, assigneeId, alertStart, alertEnd, page, pageSize],
     queryFn: async () => {
+      if (pageCursors.current.scope !== cursorScope) {
+        pageCursors.current = { scope: cursorScope, cursors: {} };
+      }
+      const cursor = pageCursors.current.cursors[page];
       const res = await api.get<Alert[]>('/api/alerts', {
       params: {
         q,
@@ -547,9 +555,14 @@ export default function AlertWorkbench({
         start_date: alertStart,
         end_date: alertEnd,
         limit: pageSize,
-        offset: (page - 1) * pageSize
+        // 跳页时没有游标，退回 offset
+        ...(cursor ? { cursor } : { offset: (page - 1) * pageSize })
       }
     });
+      const nextCursor = res.headers['x-next-cursor'];
+      if (nextCursor && pageCursors.current.scope === cursorScope) {
+        pageCursors.current.cursors[page + 1] = String(nextCursor);
+      }
       return { rows: res.data, total: Number(res.headers['x-total-count'] || res.data.length) };
     },
     placeholderData: keepPreviousData,
@@ -582,20 +595,29 @@ export default function AlertWorkbench({
     staleTime: 5 * 60 * 1000  // 5分钟缓存
   });
   const csvTemplates = templates.filter((item) => item.type === 'csv');
+  // CSV 与 Excel 模板都可用于导出，导出格式跟随所选模板类型
+  const exportTemplates = templates.filter((item) => item.type === 'csv' || item.type === 'excel');
   useEffect(() => {
     if (!csvTemplates.length) return;
-    if (csvTemplateId && csvTemplates.some((item) => item.id === csvTemplateId)) return;
+    if (csvTemplateId && exportTemplates.some((item) => item.id === csvTemplateId)) return;
     const defaultTemplate = csvTemplates.find((item) => item.is_default) || csvTemplates[0];
     setCsvTemplateId(defaultTemplate?.id);
-  }, [csvTemplates, csvTemplateId]);
+  }, [csvTemplates, exportTemplates, csvTemplateId]);
+
+  // 列表只返回精简列，打开详情时再取完整告警（原文、解析字段、情报与研判结果）
+  const openAlert = useCallback(async (row: Pick<Alert, 'id'>) => {
+    const detail = (await api.get<Alert>(`/api/alerts/${row.id}`)).data;
+    setSelected(detail);
+    return detail;
+  }, []);
 
   useEffect(() => {
     if (!initialAlertHash || dismissedAutoHash === initialAlertHash) return;
     const hit = data.find((item) => item.alert_hash === initialAlertHash);
-    if (hit) {
-      setSelected(hit);
+    if (hit && selected?.id !== hit.id) {
+      openAlert(hit);
     }
-  }, [data, dismissedAutoHash, initialAlertHash]);
+  }, [data, dismissedAutoHash, initialAlertHash, openAlert, selected?.id]);
 
   useEffect(() => {
     setPage(1);
@@ -604,17 +626,19 @@ export default function AlertWorkbench({
   useEffect(() => {
     if (!selected) return;
     const latest = data.find((item) => item.id === selected.id);
-    if (latest && latest.updated_at !== selected.updated_at) {
-      setSelected(latest);
-      // 同步更新 transitionState 中的 alert 对象
-      setTransitionState((current) => {
-        if (!current) return null;
-        const updatedAlerts = current.alerts.map((a) => (a.id === latest.id ? latest : a));
-        return { ...current, alerts: updatedAlerts };
+    // 列表行比当前详情新时才重新拉取，避免列表缓存略旧时反复请求
+    if (latest && latest.updated_at > selected.updated_at) {
+      openAlert(latest).then((detail) => {
+        // 同步更新 transitionState 中的 alert 对象
+        setTransitionState((current) => {
+          if (!current) return null;
+          const updatedAlerts = current.alerts.map((a) => (a.id === detail.id ? detail : a));
+          return { ...current, alerts: updatedAlerts };
+        });
       });
       queryClient.invalidateQueries({ queryKey: ['alerts', latest.id, 'history'] });
     }
-  }, [data, queryClient, selected]);
+  }, [data, openAlert, queryClient, selected]);
 
   const refreshAlertState = (alert?: Alert) => {
     if (alert) setSelected((current) => (current?.id === alert.id ? alert : current));
@@ -687,21 +711,31 @@ export default function AlertWorkbench({
   });
 
   const ai = useMutation({
-    mutationFn: async (id: number) => (await api.post(`/api/alerts/${id}/ai-analysis`)).data,
+    mutationFn: async (id: number) => {
+      const queued = (await api.post<TaskEnqueued>(`/api/alerts/${id}/ai-analysis`)).data;
+      await waitForTask(queued.task_id);
+      return (await api.get<Alert>(`/api/alerts/${id}`)).data;
+    },
     onSuccess: (alert) => {
       setSelected(alert);
       refreshAlertState(alert);
       message.success('AI 研判完成');
-    }
+    },
+    onError: (error: any) => message.error(error?.response?.data?.detail || error?.message || 'AI 研判失败')
   });
 
   const ti = useMutation({
-    mutationFn: async (id: number) => (await api.post(`/api/alerts/${id}/ti-query`)).data,
+    mutationFn: async (id: number) => {
+      const queued = (await api.post<TaskEnqueued>(`/api/alerts/${id}/ti-query`)).data;
+      await waitForTask(queued.task_id);
+      return (await api.get<Alert>(`/api/alerts/${id}`)).data;
+    },
     onSuccess: (alert) => {
       setSelected(alert);
       refreshAlertState(alert);
       message.success('威胁情报查询完成');
-    }
+    },
+    onError: (error: any) => message.error(error?.response?.data?.detail || error?.message || '威胁情报查询失败')
   });
 
   const aiExtract = useMutation({
@@ -725,9 +759,12 @@ export default function AlertWorkbench({
   );
 
   const webhook = useMutation({
-    mutationFn: async (id: number) => (await api.post(`/api/alerts/${id}/send-webhook`)).data,
+    mutationFn: async (id: number) => {
+      const queued = (await api.post<TaskEnqueued>(`/api/alerts/${id}/send-webhook`)).data;
+      return waitForTask(queued.task_id);
+    },
     onSuccess: () => message.success('已发送通报消息'),
-    onError: (error: any) => message.error(error?.response?.data?.detail || '发送失败')
+    onError: (error: any) => message.error(error?.response?.data?.detail || error?.message || '发送失败')
   });
 
   const remove = useMutation({
@@ -762,12 +799,13 @@ export default function AlertWorkbench({
     template_id: csvTemplateId
   };
   const exportCsv = async () => {
-    const response = await api.get('/api/exports/alerts.csv', { params: exportParams, responseType: 'blob' });
+    const format = exportTemplates.find((item) => item.id === csvTemplateId)?.type === 'excel' ? 'xlsx' : 'csv';
+    const response = await api.get(`/api/exports/alerts.${format}`, { params: exportParams, responseType: 'blob' });
     const url = window.URL.createObjectURL(new Blob([response.data]));
     const link = document.createElement('a');
     link.href = url;
     const suffix = range ? `_${range[0].format('YYYYMMDD')}_${range[1].format('YYYYMMDD')}` : '';
-    link.download = `alerts_filtered${suffix}.csv`;
+    link.download = `alerts_filtered${suffix}.${format}`;
     link.click();
     window.URL.revokeObjectURL(url);
   };
@@ -916,7 +954,7 @@ export default function AlertWorkbench({
               {!isViewer && canRelease(currentUser, row) && <Button size="small" loading={release.isPending} onClick={() => release.mutate({ alert: row })}>释放</Button>}
               {!isViewer && transitions.length > 0 && <Button size="small" onClick={() => openTransition([row], 'single')}>流转</Button>}
               {isAdmin && !isTerminal(row) && <Button size="small" onClick={() => { setAssignTarget(row); assignForm.resetFields(); }}>指派</Button>}
-              <Button size="small" onClick={() => setSelected(row)}>详情</Button>
+              <Button size="small" onClick={() => openAlert(row)}>详情</Button>
               {isAdmin && (
                 <Popconfirm title="删除该告警？" onConfirm={() => remove.mutate(row.id)}>
                   <Button size="small" danger>删除</Button>
@@ -927,7 +965,7 @@ export default function AlertWorkbench({
         }
       }
     ],
-    [users, currentUser, isViewer, isAdmin, claim.isPending, release.isPending, remove, columnWidths, onResize, resetWidth]
+    [users, currentUser, isViewer, isAdmin, claim.isPending, release.isPending, remove, columnWidths, onResize, resetWidth, openAlert]
   );
 
   const renderHistoryItem = (item: any) => {
@@ -997,8 +1035,8 @@ export default function AlertWorkbench({
           <Select allowClear placeholder="负责人" style={{ width: 150 }} value={assigneeId} onChange={setAssigneeId} options={users.map((item) => ({ value: item.id, label: item.display_name }))} />
           <Select allowClear placeholder="所属组" style={{ width: 150 }} value={currentGroup} onChange={setCurrentGroup} options={Object.entries(groupLabel).map(([value, label]) => ({ value, label }))} />
           <Select allowClear placeholder="状态" style={{ width: 140 }} value={status} onChange={setStatus} options={Object.entries(statusLabel).map(([value, label]) => ({ value, label }))} />
-          <Select allowClear placeholder="CSV 模板" style={{ width: 170 }} value={csvTemplateId} onChange={setCsvTemplateId} options={csvTemplates.map((item) => ({ value: item.id, label: item.name }))} />
-          <Button type="primary" onClick={exportCsv}>导出筛选结果 <HelpTip title="导出内容会复用当前工作台筛选条件，包括关键词、时间、负责人、状态和 CSV 模板。" /></Button>
+          <Select allowClear placeholder="导出模板" style={{ width: 170 }} value={csvTemplateId} onChange={setCsvTemplateId} options={exportTemplates.map((item) => ({ value: item.id, label: `${item.name}（${item.type === 'excel' ? 'Excel' : 'CSV'}）` }))} />
+          <Button type="primary" onClick={exportCsv}>导出筛选结果 <HelpTip title="导出内容会复用当前工作台筛选条件，包括关键词、时间、负责人、状态和导出模板；选择 Excel 模板时导出为 xlsx。" /></Button>
         </Space>
       </div>
       <div className="panel-toolbar">
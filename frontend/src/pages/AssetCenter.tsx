@@ -5,7 +5,7 @@ import { DeleteOutlined, PlusOutlined, UploadOutlined, DownloadOutlined } from '
 import { Alert as AntAlert, Button, Card, Col, Descriptions, Drawer, Form, Input, Modal, Popconfirm, Row, Select, Space, Table, Tag, Tabs, Typography, Upload, message } from 'antd';
 import type { UploadFile } from 'antd';
 import dayjs from 'dayjs';
-import { api } from '../api/client';
+import { api, waitForTask } from '../api/client';
 import type { Asset, User } from '../api/types';
 import HelpTip from '../components/HelpTip';
 import { hasRole } from '../utils/roles';
@@ -57,6 +57,25 @@ const strategyOptions = [
   { value: 'append', label: '始终新增' }
 ];
 
+// 大文件导入转为后台任务（返回 task_id），轮询期间把已处理行数写入结果区
+const importOutcome = async (data: any, onProgress: (result: any) => void) => {
+  if (!data?.task_id) return data;
+  onProgress({ running: true, processed: 0 });
+  const task = await waitForTask(data.task_id, {
+    interval: 2000,
+    timeout: 60 * 60 * 1000,
+    onProgress: (current) => onProgress({ running: true, processed: 0, ...current.output })
+  });
+  return task.output;
+};
+
+const importSummary = (result: any) => {
+  const counts = `新增 ${result.created || 0} 条，更新 ${result.updated || 0} 条，跳过 ${result.skipped || 0} 条`;
+  if (!result.running) return counts;
+  const total = result.total ? ` / ${result.total}` : '';
+  return `导入中：已处理 ${result.processed || 0}${total} 行（${counts}）`;
+};
+
 function AssetsPanel({ isAdmin }: { isAdmin: boolean }) {
   const [q, setQ] = useState('');
   const [area, setArea] = useState<string | undefined>();
@@ -136,7 +155,8 @@ function AssetsPanel({ isAdmin }: { isAdmin: boolean }) {
       if (!file) throw new Error('请选择 Excel 文件');
       const formData = new FormData();
       formData.append('file', file);
-      return (await api.post('/api/assets/import', formData, { params: { strategy }, headers: { 'Content-Type': 'multipart/form-data' } })).data;
+      const data = (await api.post('/api/assets/import', formData, { params: { strategy }, headers: { 'Content-Type': 'multipart/form-data' } })).data;
+      return importOutcome(data, setImportResult);
     },
     onSuccess: (data) => {
       setImportResult(data);
@@ -298,9 +318,9 @@ function AssetsPanel({ isAdmin }: { isAdmin: boolean }) {
           <Button type="primary" loading={importAssets.isPending} disabled={!fileList.length} onClick={() => importAssets.mutate()}>开始导入</Button>
           {importResult && (
             <AntAlert
-              type="success"
               showIcon
-              message={`新增 ${importResult.created || 0} 条，更新 ${importResult.updated || 0} 条，跳过 ${importResult.skipped || 0} 条`}
+              type={importResult.running ? 'info' : 'success'}
+              message={importSummary(importResult)}
               description={<pre>{JSON.stringify(importResult.errors || [], null, 2)}</pre>}
             />
           )}
@@ -370,7 +390,8 @@ function SegmentsPanel({ isAdmin }: { isAdmin: boolean }) {
       if (!file) throw new Error('请选择 Excel 文件');
       const formData = new FormData();
       formData.append('file', file);
-      return (await api.post('/api/assets/segments/import', formData, { params: { strategy }, headers: { 'Content-Type': 'multipart/form-data' } })).data;
+      const data = (await api.post('/api/assets/segments/import', formData, { params: { strategy }, headers: { 'Content-Type': 'multipart/form-data' } })).data;
+      return importOutcome(data, setImportResult);
     },
     onSuccess: (data) => {
       setImportResult(data);
@@ -472,9 +493,9 @@ function SegmentsPanel({ isAdmin }: { isAdmin: boolean }) {
           <Button type="primary" loading={importSegments.isPending} disabled={!fileList.length} onClick={() => importSegments.mutate()}>开始导入</Button>
           {importResult && (
             <AntAlert
-              type="success"
               showIcon
-              message={`新增 ${importResult.created || 0} 条，更新 ${importResult.updated || 0} 条，跳过 ${importResult.skipped || 0} 条`}
+              type={importResult.running ? 'info' : 'success'}
+              message={importSummary(importResult)}
               description={<pre>{JSON.stringify(importResult.errors || [], null, 2)}</pre>}
             />
           )}
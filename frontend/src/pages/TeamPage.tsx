@@ -267,7 +267,7 @@ function BackupRestorePanel() {
     const response = await api.get('/api/backup/export', { responseType: 'blob' });
     const disposition = String(response.headers['content-disposition'] || '');
     const match = disposition.match(/filename="?([^";]+)"?/i);
-    downloadBlob(response.data, match?.[1] || `eff-monitoring-backup-${dayjs().format('YYYYMMDD-HHmmss')}.json`);
+    downloadBlob(response.data, match?.[1] || `eff-monitoring-backup-${dayjs().format('YYYYMMDD-HHmmss')}.zip`);
   };
 
   const inspect = useMutation({
@@ -308,7 +308,7 @@ function BackupRestorePanel() {
       <Card size="small" title="还原备份">
         <Space direction="vertical" size="middle" className="full-width">
           <Upload.Dragger
-            accept=".json,application/json"
+            accept=".zip,.json,application/zip,application/json"
             maxCount={1}
             beforeUpload={(nextFile) => {
               setFile(nextFile as File);
@@ -320,7 +320,7 @@ function BackupRestorePanel() {
               inspect.reset();
             }}
           >
-            <p className="ant-upload-text">点击或拖拽备份 JSON 到这里</p>
+            <p className="ant-upload-text">点击或拖拽备份文件（.zip，或旧版 .json）到这里</p>
             <p className="ant-upload-hint">上传后会先做兼容性预检，不会立即写入数据库。</p>
           </Upload.Dragger>
           {inspect.data && (
@@ -2,7 +2,6 @@
 Webhook 集成模块
 职责: 将处理结果发送到第三方群聊平台（钉钉、企业微信、飞书）
 """
-import requests
 import hmac
 import hashlib
 import base64
@@ -10,6 +9,8 @@ import time
 from typing import Dict, Any
 from urllib.parse import quote
 
+from core import http_client
+
 
 def send_record(data_text: str, cfg: Dict) -> Dict[str, Any]:
     """
@@ -112,7 +113,7 @@ def _send_dingtalk(text: str, config: Dict) -> Dict[str, Any]:
         
         payload = {"msgtype": "text", "text": {"content": text}}
         
-        response = requests.post(url, json=payload, headers=headers, timeout=15)
+        response = http_client.post(url, json=payload, headers=headers, provider="dingtalk")
         
         if response.status_code == 200:
             resp_json = response.json()
@@ -169,7 +170,7 @@ def _send_wecom(text: str, config: Dict) -> Dict[str, Any]:
         if mentioned_mobile_list:
             payload["text"]["mentioned_mobile_list"] = mentioned_mobile_list
         
-        response = requests.post(url, json=payload, headers=headers, timeout=15)
+        response = http_client.post(url, json=payload, headers=headers, provider="wecom")
         
         if response.status_code == 200:
             resp_json = response.json()
@@ -231,7 +232,7 @@ def _send_feishu(text: str, config: Dict) -> Dict[str, Any]:
             payload["timestamp"] = timestamp
             payload["sign"] = sign
         
-        response = requests.post(url, json=payload, headers=headers, timeout=15)
+        response = http_client.post(url, json=payload, headers=headers, provider="feishu")
         
         if response.status_code == 200:
             resp_json = response.json()
@@ -0,0 +1,155 @@
+"""
+告警 CSV 导出基准测试
+
+对比逐行构建完整变量字典并逐列 render_template 的方式 (alert_export_context)
+与预编译列计划 (AlertExportPlan) 在合成告警上的耗时，并校验两种方式输出一致。
+告警、用户、设备与规则均为内存对象，不访问数据库。
+
+用法: python scripts/bench_alert_export.py [--rows 100000]
+"""
+import argparse
+import csv
+import io
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+for path in (ROOT, ROOT / "backend"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from app.models.entities import Alert, Device, ParseRule, Project, User  # noqa: E402
+from app.services.export_service import AlertExportPlan, ExportBatch, alert_export_context  # noqa: E402
+from app.services.template_service import render_template  # noqa: E402
+
+# 与 ops._csv_columns 的默认列一致
+DEFAULT_COLUMNS = [
+    ("创建时间", "created_at"),
+    ("告警ID", "alert_code"),
+    ("告警Hash", "alert_hash"),
+    ("源IP", "source_ip"),
+    ("目的IP", "destination_ip"),
+    ("事件类型", "event_type"),
+    ("状态", "status_label"),
+    ("AI研判", "ai_result"),
+    ("原始日志", "raw_text"),
+]
+# 运营常用的自定义模板：人员、处置、资产、统计、语义化字段混合
+TEMPLATE_COLUMNS = DEFAULT_COLUMNS + [
+    (key, key)
+    for key in (
+        "告警编号", "告警时间", "告警名称", "告警设备", "攻击源IP", "攻击目的IP", "负责人", "研判人员",
+        "封禁人员", "封禁位置", "封禁时间", "处置动作", "闭环动作", "项目名称", "所属组", "是否应急",
+        "源资产名称", "目的资产名称", "目的资产重要性", "当前总数", "请求方法", "攻击载荷", "URL", "未知变量",
+    )
+]
+STATUSES = ["analysis", "disposal", "false_positive", "ignored", "disposed"]
+EVENT_TYPES = ["SQL注入", "XSS跨站脚本", "命令执行", "目录遍历", "WebShell上传", "暴力破解"]
+
+
+def build_fixtures(rng, rows):
+    users = {index: User(id=index, username=f"user{index}", display_name=f"用户{index}") for index in range(1, 21)}
+    projects = {index: Project(id=index, name=f"项目{index}") for index in range(1, 6)}
+    devices = {index: Device(id=index, name=f"WAF-{index}") for index in range(1, 9)}
+    rules = []
+    for index, (name, field_key) in enumerate(
+        [("请求方法", "method"), ("攻击载荷", "payload"), ("URL", "uri"), ("告警名称", "rule_name"), ("源IP", "src_ip")] * 8
+    ):
+        # 一半规则绑定具体设备，其余为通用规则
+        rules.append(ParseRule(id=index + 1, name=name, field_key=field_key, device_id=(index % 8) + 1 if index % 2 else None))
+    assets = [{"name": f"资产{index}", "area": "生产区", "owner": f"运维{index}", "criticality": "high"} for index in range(50)]
+    base_time = datetime(2026, 10, 1)
+    alerts = []
+    fallbacks = {}
+    for index in range(1, rows + 1):
+        created_at = base_time + timedelta(seconds=index * 7)
+        parsed = {
+            "method": rng.choice(["GET", "POST"]),
+            "payload": "' union select 1,2,3-- " * rng.randint(1, 4),
+            "uri": f"/api/v1/item?id={index}",
+            "rule_name": rng.choice(EVENT_TYPES),
+            "告警时间": created_at.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        alert = Alert(
+            id=index,
+            workspace_id=1,
+            alert_code=f"{created_at:%Y%m%d}{index:04d}",
+            alert_hash=f"{rng.getrandbits(64):016x}",
+            source_ip=f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+            destination_ip=f"172.16.{rng.randint(0, 15)}.{rng.randint(1, 254)}",
+            event_type=parsed["rule_name"],
+            status=rng.choice(STATUSES),
+            current_group=rng.choice(["analysis", "disposal", "none"]),
+            device_id=rng.randint(1, 8),
+            project_id=rng.choice([None, 1, 2, 3, 4, 5]),
+            assignee_id=rng.choice([None, *users]),
+            created_by_id=rng.randint(1, 20),
+            analysis_owner_id=rng.randint(1, 20),
+            disposal_owner_id=rng.choice([None, *users]),
+            block_device_ids=rng.sample(list(devices), rng.randint(0, 2)),
+            is_emergency=rng.random() < 0.1,
+            disposal_action=rng.choice(["block", "emergency", ""]),
+            parsed_fields=parsed,
+            raw_text="POST /api/v1/login HTTP/1.1\nHost: portal.example.com\n\n" + "x" * rng.randint(200, 2000),
+            ai_result="研判结论：" + rng.choice(["真实攻击", "误报", "待确认"]),
+            src_asset_context={} if index % 3 else rng.choice(assets),
+            dst_asset_context=rng.choice(assets) if index % 2 else {},
+            created_at=created_at,
+            updated_at=created_at + timedelta(minutes=rng.randint(1, 600)),
+        )
+        alerts.append(alert)
+        if not alert.src_asset_context or not alert.dst_asset_context:
+            fallbacks[index] = (rng.choice(assets), rng.choice(assets))
+    stats = {"当前总数": str(rows), "当前日期": "2026-10-17", "平均处置耗时": "12分30秒"}
+    return alerts, ExportBatch(users, projects, devices, fallbacks), rules, stats
+
+
+def legacy_rows(alerts, batch, rules, stats, columns):
+    for alert in alerts:
+        context = alert_export_context(alert, batch, rules, stats)
+        yield [render_template(f"{{{{{key}}}}}", context) for _, key in columns]
+
+
+def plan_rows(alerts, batch, rules, stats, columns):
+    plan = AlertExportPlan(columns, rules, stats)
+    for alert in alerts:
+        yield plan.row(alert, batch)
+
+
+def timed_csv(rows):
+    # 与导出接口一致：写入 csv.writer 并编码，统计整体耗时
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    started = time.perf_counter()
+    writer.writerows(rows)
+    buffer.getvalue().encode("utf-8")
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    alerts, batch, rules, stats = build_fixtures(rng, args.rows)
+    print(f"合成 {len(alerts)} 条告警 / {len(rules)} 条语义化规则，用时 {time.perf_counter() - started:.1f}s")
+
+    print(f"{'template':>10} {'columns':>8} {'context+render':>16} {'column plan':>13} {'speedup':>9}")
+    for title, columns in (("default", DEFAULT_COLUMNS), ("template", TEMPLATE_COLUMNS)):
+        sample = alerts[:2000]
+        for expected, actual in zip(legacy_rows(sample, batch, rules, stats, columns), plan_rows(sample, batch, rules, stats, columns)):
+            if expected != actual:
+                raise SystemExit(f"结果不一致 ({title}):\n{expected}\n{actual}")
+        legacy_s = timed_csv(legacy_rows(alerts, batch, rules, stats, columns))
+        plan_s = timed_csv(plan_rows(alerts, batch, rules, stats, columns))
+        print(f"{title:>10} {len(columns):>8} {legacy_s:>14.2f} s {plan_s:>11.2f} s {legacy_s / plan_s:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()